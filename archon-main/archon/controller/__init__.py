@@ -13,6 +13,7 @@ __all__ = [
     "ArchonController",
     "TimePeriod",
     "LS4Controller",
+    "LS4_Frame_Ring",
     "LS4_TCPStreamClient",
     "LS4_Device",
     "LS4_Logger",
@@ -25,5 +26,6 @@ __all__ = [
 
 from .command import ArchonCommand, ArchonCommandReply, ArchonCommandStatus
 from .ls4_controller import LS4Controller
+from .ls4_frame_ring import LS4_Frame_Ring
 from .maskbits import ControllerStatus, ModType
 from .ls4_params import *
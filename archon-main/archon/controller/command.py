@@ -11,6 +11,7 @@ from __future__ import annotations
 import asyncio
 import enum
 import re
+import time
 import warnings
 
 from typing import AsyncGenerator, Optional
@@ -21,10 +22,54 @@ from archon.tools import Timer
 from archon.controller.ls4_params import MAX_COMMAND_ID
 
 
-__all__ = ["ArchonCommand", "ArchonCommandStatus", "ArchonCommandReply"]
+__all__ = [
+    "ArchonCommand",
+    "ArchonCommandStatus",
+    "ArchonCommandReply",
+    "parse_reply_header",
+]
 
 REPLY_RE = re.compile(b"^([<|?])([0-9A-F]{2})(:?)(.*)\n?")
 
+# The command type is the leading keyword of the command string, e.g. WCONFIG for
+# WCONFIG0012..., FETCH for FETCH0000...
+COMMAND_TYPE_RE = re.compile(r"^[A-Z]+")
+
+# Value of each byte as an (upper-case) hexadecimal digit, or -1.
+_HEX_VALUES = [-1] * 256
+for _n, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX_VALUES[_c] = _n
+
+_REPLY_OK = ord("<")
+_REPLY_FAILED = ord("?")
+_REPLY_BINARY = ord(":")
+
+
+def parse_reply_header(reply: bytes) -> tuple[str, int, bool] | None:
+    """Parses the header of a reply from the Archon, byte by byte.
+
+    Returns the reply type (``<`` or ``?``), the command id, and whether the
+    reply is binary, or `None` if the reply does not start with a valid header.
+    Only the first four bytes are read, so this is as fast for a binary reply
+    as for a short one.
+    """
+
+    if len(reply) < 3:
+        return None
+
+    rtype = reply[0]
+    if rtype != _REPLY_OK and rtype != _REPLY_FAILED:
+        return None
+
+    high = _HEX_VALUES[reply[1]]
+    low = _HEX_VALUES[reply[2]]
+    if high < 0 or low < 0:
+        return None
+
+    is_binary = rtype == _REPLY_OK and len(reply) > 3 and reply[3] == _REPLY_BINARY
+
+    return ("<" if rtype == _REPLY_OK else "?"), (high << 4) | low, is_binary
+
 
 class ArchonCommandStatus(enum.Enum):
     """Status of an Archon command."""
@@ -54,6 +99,9 @@ class ArchonCommand(asyncio.Future):
     timeout
         Time without receiving a reply after which the command will be timed out.
         `None` disables the timeout.
+    timeouts
+        The `.LS4_Timeouts` scheduler of the controller. If `None`, the timeout
+        is run by a `.Timer` of its own.
     """
 
     def __init__(
@@ -64,6 +112,7 @@ class ArchonCommand(asyncio.Future):
         fake=False,
         expected_replies: Optional[int] = 1,
         timeout: Optional[float] = None,
+        timeouts=None,
     ):
 
         self.fake_controller = fake
@@ -74,6 +123,7 @@ class ArchonCommand(asyncio.Future):
 
         self.command_string = command_string.upper()
         self.command_id = command_id
+        self._command_type: Optional[str] = None
         self.controller = controller
         self._expected_replies = expected_replies
 
@@ -83,6 +133,10 @@ class ArchonCommand(asyncio.Future):
         #: .ArchonCommandStatus: The status of the command.
         self.status = ArchonCommandStatus.RUNNING
 
+        #: float: `time.monotonic` when the command was written and completed.
+        self.t_write: Optional[float] = None
+        self.t_done: Optional[float] = None
+
         if self.command_id < 0 or self.command_id > MAX_COMMAND_ID:
             raise ValueError(
                 f"command_id must be between 0x00 and 0x{MAX_COMMAND_ID:X}"
@@ -93,7 +147,16 @@ class ArchonCommand(asyncio.Future):
         #  self.__event = asyncio.Event()
         if self.fake_controller:
            timeout = 0.001
-        self.timer: Optional[Timer] = Timer(timeout, self._timeout) if timeout else None
+        self.timeouts = timeouts
+        self._deadline: Optional[float] = None
+        self._timeout_period: Optional[float] = None
+        self._timeout_entry: Optional[list] = None
+        self.timer: Optional[Timer] = None
+        if timeout:
+            if self.timeouts is not None:
+                self.timeouts.arm(self, timeout)
+            else:
+                self.timer = Timer(timeout, self._timeout)
         self.__event = asyncio.Event()
 
     @property
@@ -125,6 +188,32 @@ class ArchonCommand(asyncio.Future):
             self._mark_done(self.status.FAILED)
             return
 
+        return self._add_reply(archon_reply)
+
+    def process_parsed_reply(
+        self,
+        reply: bytes,
+        reply_type: str,
+        command_id: int,
+        is_binary: bool,
+    ) -> ArchonCommandReply | None:
+        """Processes a new reply whose header has already been parsed.
+
+        Same as `.process_reply`, for a reply routed to this command by
+        `.parse_reply_header`, so the reply is not parsed again.
+        """
+
+        archon_reply = ArchonCommandReply.from_header(
+            reply, self, reply_type, command_id, is_binary
+        )
+
+        return self._add_reply(archon_reply)
+
+    def _add_reply(self, archon_reply: ArchonCommandReply) -> ArchonCommandReply | None:
+        """Adds a parsed reply and marks the command done if complete."""
+
+        reply = archon_reply.raw_reply
+
         if archon_reply.command_id != self.command_id:
             warnings.warn(
                 f"Received reply to command {self.raw} that does not match "
@@ -138,6 +227,8 @@ class ArchonCommand(asyncio.Future):
         self.__event.set()  # Release the event to indicate a new reply has been added.
         if self.timer:
             self.timer.reset()
+        elif self._deadline is not None:
+            self.timeouts.reset(self)
 
         if archon_reply.type == "?":
             self._mark_done(self.status.FAILED)
@@ -188,6 +279,8 @@ class ArchonCommand(asyncio.Future):
         self.__event.set()
         if self.timer:
             self.timer.cancel()
+        elif self._deadline is not None:
+            self.timeouts.cancel(self)
 
         if self.fake_controller:
            self.status = ArchonCommandStatus.DONE
@@ -195,6 +288,7 @@ class ArchonCommand(asyncio.Future):
            self.status = status
 
         if not self.done():
+            self.t_done = time.monotonic()
             self.set_result(self)
 
         # Return ID to the pool
@@ -206,6 +300,15 @@ class ArchonCommand(asyncio.Future):
 
         self._mark_done(self.status.TIMEDOUT)
 
+    @property
+    def command_type(self) -> str:
+        """The type (leading keyword) of the command, e.g. ``WCONFIG``."""
+
+        if self._command_type is None:
+            match = COMMAND_TYPE_RE.match(self.command_string)
+            self._command_type = match[0] if match else self.command_string
+        return self._command_type
+
     def __repr__(self):
         return f"<ArchonCommand ({self.raw}, status={self.status})>"
 
@@ -253,6 +356,32 @@ class ArchonCommandReply:
         else:
             self.reply = rmessage.decode().strip()
 
+    @classmethod
+    def from_header(
+        cls,
+        raw_reply: bytes,
+        command: ArchonCommand,
+        reply_type: str,
+        command_id: int,
+        is_binary: bool,
+    ) -> ArchonCommandReply:
+        """Creates a reply from a header parsed by `.parse_reply_header`."""
+
+        archon_reply = cls.__new__(cls)
+
+        archon_reply.command = command
+        archon_reply.raw_reply = raw_reply
+        archon_reply.type = reply_type
+        archon_reply.command_id = command_id
+        archon_reply.is_binary = is_binary
+
+        if is_binary:
+            archon_reply.reply = raw_reply[4:]
+        else:
+            archon_reply.reply = raw_reply[3:].decode().strip()
+
+        return archon_reply
+
     def __str__(self) -> str:
         if isinstance(self.reply, bytes):
             raise ArchonError("The reply is binary and cannot be converted to string.")
@@ -0,0 +1,700 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_archon_sim.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Archon_Sim class.
+#
+# LS4_Fake_Control stands in for a controller inside LS4Controller, so in fake
+# mode the TCP connection, the reply parsing, and the binary FETCH path are never
+# used. LS4_Archon_Sim instead is an asyncio TCP server that speaks the Archon
+# wire protocol: commands ">xxCOMMAND\n", replies "<xxREPLY\n" or "?xx\n", and
+# binary replies of 1028-byte blocks ("<xx:" followed by 1024 bytes). An
+# LS4Controller connected to it runs exactly the code it runs with a real
+# controller.
+#
+# The simulator keeps the configuration lines (WCONFIG, RCONFIG, CLEARCONFIG),
+# the timing-code parameters (FASTPREPPARAM, FASTLOADPARAM, APPLYALL, LOADPARAMS),
+# and the three frame buffers. It models the LS4 timing code:
+#
+#    Exposures > 0      integrate for IntCS centiseconds (or until AbortExposure)
+#    ReadOut > 0        read the CCDs into the next free frame buffer at the
+#                       line rate of a full frame read in readout_time sec
+#    DoFlush, DoPurge,  run a main-loop procedure for procedure_time sec, with
+#    DoErase > 0        STATUS_START_BIT set in MOD4/DINPUTS
+#
+# while the timing core is released (RELEASETIMING, HOLDTIMING). Commands on a
+# connection are processed in order, each taking service_time sec, and their
+# replies are delayed by the round-trip time rtt. FETCH replies are streamed at
+# the network bandwidth. Faults can be injected into the next FETCH replies
+# (inject_fetch_fault), to exercise the recovery of the fetch.
+#
+# usage: python ls4_archon_sim.py [--port 4242] [--acf file.acf] [--readout_time 5]
+#
+################################
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import time
+from collections import Counter, deque
+
+import numpy
+
+from archon.controller.ls4_logger import LS4_Logger
+from archon.controller.maskbits import ArchonPower, ModType
+from archon.controller.ls4_params import LS4_BLOCK_SIZE, AMPS_PER_CCD, CCDS_PER_QUAD, \
+              FAKE_LINECOUNT, FAKE_PIXELCOUNT, STATUS_START_BIT, \
+              SIM_READOUT_TIME, SIM_BANDWIDTH, SIM_RTT, SIM_SERVICE_TIME, \
+              SIM_PROCEDURE_TIME
+
+
+__all__ = ["LS4_Archon_Sim", "LS4_Sim_Link"]
+
+
+# address space of each frame buffer
+BUFFER_SPACING = 0x20000000
+
+# number of 1024-byte blocks in the repeating test pattern held by the frame buffers
+PATTERN_BLOCKS = 1024
+
+# number of blocks written to the socket at a time when streaming a FETCH reply
+FETCH_CHUNK_BLOCKS = 64
+
+# module types reported by SYSTEM
+SIM_MODULES = {1: ModType.DRIVER, 2: ModType.DRIVER, 4: ModType.LVXBIAS,
+               5: ModType.ADX, 6: ModType.ADX, 7: ModType.ADX, 8: ModType.ADX,
+               9: ModType.XVBIAS}
+
+# supply voltages reported by STATUS
+SIM_SUPPLIES = {"P5V_V": 5.0, "P6V_V": 6.0, "N6V_V": -6.0, "P17V_V": 17.0,
+                "N17V_V": -17.0, "P35V_V": 35.0, "N35V_V": -35.0,
+                "P100V_V": 50.0, "N100V_V": -50.0}
+
+# main-loop procedures of the timing code
+PROCEDURE_PARAMS = ["DOFLUSH", "DOPURGE", "DOERASE"]
+
+
+class LS4_Sim_Link():
+    """ network interface of the host, shared by the FETCH replies of several
+        simulated controllers
+    """
+
+    def __init__(self, bandwidth: float, slack: float = 0.01):
+        """ bandwidth is the rate (bytes/sec) of the interface. Up to slack sec
+            of idle time are made up for, since the sleeps pacing the replies
+            overshoot.
+        """
+
+        self.bandwidth = bandwidth
+        self.slack = slack
+        self.t_free = 0.0
+
+    def reserve(self, t: float, n_bytes: int) -> float:
+        """ queue n_bytes at time t and return the time they are through """
+
+        self.t_free = max(self.t_free, t - self.slack) + n_bytes / self.bandwidth
+        return self.t_free
+
+
+class LS4_Archon_Sim():
+    """ asyncio TCP server simulating an Archon controller running the LS4 timing code """
+
+    def __init__(self,
+                 readout_time: float = SIM_READOUT_TIME,
+                 bandwidth: float = SIM_BANDWIDTH,
+                 rtt: float = SIM_RTT,
+                 service_time: float = SIM_SERVICE_TIME,
+                 procedure_time: float = SIM_PROCEDURE_TIME,
+                 link: LS4_Sim_Link | None = None,
+                 ls4_logger: LS4_Logger | None = None):
+        """ readout_time is the time (sec) to read out a full frame of FAKE_LINECOUNT
+            lines, bandwidth the rate (bytes/sec) of FETCH replies, rtt the network
+            round-trip time (sec), service_time the time (sec) to process one
+            command, and procedure_time the duration (sec) of a flush, purge, or erase.
+            If link is given, the FETCH replies also share its bandwidth with
+            the other simulators using it.
+        """
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Archon_Sim")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.line_rate = FAKE_LINECOUNT / readout_time
+        self.bandwidth = bandwidth
+        self.rtt = rtt
+        self.service_time = service_time
+        self.procedure_time = procedure_time
+        self.link = link
+
+        # payload of the frame buffers: a repeating pattern of 16-bit pixels
+        rng = numpy.random.default_rng(0)
+        pixels = rng.integers(990, 1010, size=(PATTERN_BLOCKS, LS4_BLOCK_SIZE // 2),
+                              dtype=numpy.uint16)
+        self._pattern = pixels.view(numpy.uint8)
+
+        self._server: asyncio.AbstractServer | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._handlers: set[asyncio.Task] = set()
+        self._timing_task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self.host: str | None = None
+        self.port: int | None = None
+
+        # number of commands received, by command name
+        self.command_counts: Counter = Counter()
+
+        # faults of the next FETCH replies (see inject_fetch_fault)
+        self.fetch_faults: deque = deque()
+
+        self._t0 = time.monotonic()
+        self._reboot()
+
+    def _reboot(self):
+        """ return the simulated controller to its power-up state """
+
+        # configuration lines by line number, and timing-code parameters
+        self.config: dict[int, str] = {}
+        self.params: dict[str, int] = {}
+        self._values: dict[str, str] | None = None
+        self._configured: dict[str, int] | None = None
+
+        self.power = ArchonPower.ON
+        self.held = False
+        self.busy = False
+        self.locked = 0
+        self.wbuf = 1
+        self.rbuf = 1
+        self.n_frame = 0
+        self.n_status = 0
+        self.buffers = {n: {"complete": 0, "width": 0, "height": 0, "t_start": 0.0,
+                            "read_time": 0.0, "timestamp": 0, "frame": 0}
+                        for n in [1, 2, 3]}
+        self._wake.set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        """ start serving on host:port. Port 0 picks a free port (see self.port). """
+
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.host, self.port = self._server.sockets[0].getsockname()[0:2]
+        self._timing_task = asyncio.create_task(self._timing())
+        self.info("simulated Archon listening on %s:%d" % (self.host, self.port))
+
+    async def stop(self):
+        """ stop serving and close the open connections """
+
+        if self._timing_task is not None:
+           self._timing_task.cancel()
+           try:
+             await self._timing_task
+           except asyncio.CancelledError:
+             pass
+           self._timing_task = None
+
+        if self._server is not None:
+           self._server.close()
+           for writer in list(self._writers):
+               writer.close()
+           # the connection handlers return once their connection is closed
+           await asyncio.gather(*self._handlers, return_exceptions=True)
+           await self._server.wait_closed()
+           self._server = None
+
+    def load_acf(self, path: str):
+        """ load the [CONFIG] section of an ACF file, as with WCONFIG and APPLYALL """
+
+        self.config = {}
+        in_config = False
+        for line in open(path):
+            line = line.strip()
+            if line.startswith("["):
+               in_config = line.upper() == "[CONFIG]"
+            elif in_config and "=" in line:
+               key, __, value = line.partition("=")
+               value = value.strip().strip('"')
+               self.config[len(self.config)] = key.strip().upper().replace("\\", "/") + "=" + value
+        self._config_changed()
+        self._load_params()
+
+    def inject_fetch_fault(self, kind: str, n_blocks: int):
+        """ cut short the reply to the next FETCH after n_blocks blocks. If kind is
+            "drop", the connection is closed in the middle of the next block. If
+            kind is "stall", nothing more is sent until the client closes the
+            connection.
+        """
+
+        assert kind in ["drop", "stall"], "invalid fault %s" % kind
+        self.fetch_faults.append((kind, n_blocks))
+
+    def buffer_data(self, buffer_no: int, n_bytes: int) -> numpy.ndarray:
+        """ return the first n_bytes of frame buffer buffer_no as a uint8 array """
+
+        n_blocks = -(-n_bytes // LS4_BLOCK_SIZE)
+        return self._payload(0, n_blocks).reshape(-1)[0:n_bytes]
+
+    def _payload(self, first: int, n_blocks: int) -> numpy.ndarray:
+
+        index = numpy.arange(first, first + n_blocks) % PATTERN_BLOCKS
+        return self._pattern[index]
+
+    def timer(self) -> int:
+        """ return the controller timer, in units of 10 ns """
+
+        return int((time.monotonic() - self._t0) * 1e8)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        loop = asyncio.get_running_loop()
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+
+        # time the controller is done with the previous command, and time the
+        # data of the previous FETCH are all sent
+        t_free = 0.0
+        t_link = 0.0
+
+        # replies scheduled to be written, in order
+        pending: deque = deque()
+
+        # the commands are read as they arrive, with their arrival times, so that
+        # waiting for a reply time does not delay the commands in flight
+        commands: asyncio.Queue = asyncio.Queue()
+        read_task = asyncio.create_task(self._read_commands(reader, commands))
+
+        try:
+          while True:
+             t_arrive, line = await commands.get()
+             if line is None:
+                break
+
+             match = re.match(rb"^>([0-9A-F]{2})(.*)\n$", line)
+             if match is None:
+                self.warn("ignoring invalid command %r" % line)
+                continue
+
+             cid = match[1]
+             command = match[2].decode(errors="replace")
+             self.command_counts[re.match(r"^[A-Z]*", command)[0]] += 1
+
+             t_free = max(t_free, t_arrive) + self.service_time
+
+             if command.startswith("FETCH"):
+                # the binary reply follows the replies already scheduled and the
+                # data of the previous FETCH. Its round trip overlaps with those
+                # of the commands in flight.
+                t_link = await self._fetch(cid, command, writer,
+                                           max(t_free + self.rtt, t_link), pending, read_task)
+                t_free = max(t_free, t_link - self.rtt)
+                continue
+
+             try:
+               reply = self._execute(command)
+             except Exception as e:
+               self.warn("failed executing %s: %s" % (command, e))
+               reply = None
+
+             if reply is None:
+                data = b"?" + cid + b"\n"
+             else:
+                data = b"<" + cid + reply.encode() + b"\n"
+             pending.append((loop.call_at(t_free + self.rtt, self._write, writer, pending),
+                             data))
+
+        except (ConnectionResetError, BrokenPipeError):
+          pass
+        finally:
+          read_task.cancel()
+          self._writers.discard(writer)
+          self._handlers.discard(asyncio.current_task())
+          writer.close()
+
+    async def _read_commands(self, reader: asyncio.StreamReader, commands: asyncio.Queue):
+        """ queue each command line read with its arrival time, then None """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+              line = await reader.readuntil(b"\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionResetError):
+              break
+            commands.put_nowait((loop.time(), line))
+        commands.put_nowait((loop.time(), None))
+
+    def _write(self, writer: asyncio.StreamWriter, pending: deque):
+        """ write the next scheduled reply """
+
+        __, data = pending.popleft()
+        if not writer.is_closing():
+           writer.write(data)
+
+    def _flush(self, writer: asyncio.StreamWriter, pending: deque):
+        """ write the scheduled replies now """
+
+        while len(pending) > 0:
+            handle, data = pending.popleft()
+            handle.cancel()
+            if not writer.is_closing():
+               writer.write(data)
+
+    async def _fetch(self, cid: bytes, command: str, writer: asyncio.StreamWriter,
+                     t_start: float, pending: deque, read_task: asyncio.Task) -> float:
+        """ stream the blocks requested by FETCHaaaaaaaannnnnnnn at the network
+            bandwidth, starting at time t_start, after the replies pending.
+            Return the time the last block is sent. read_task is the task reading
+            the commands of the connection, which ends when it is closed.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        if t_start > loop.time():
+           await asyncio.sleep(t_start - loop.time())
+        self._flush(writer, pending)
+
+        match = re.match(r"^FETCH([0-9A-F]{8})([0-9A-F]{8})$", command)
+        if match is None:
+           writer.write(b"?" + cid + b"\n")
+           return t_start
+
+        address = int(match[1], 16)
+        n_blocks = int(match[2], 16)
+        first = (address % BUFFER_SPACING) // LS4_BLOCK_SIZE
+
+        fault = None
+        if len(self.fetch_faults) > 0:
+           fault, fault_blocks = self.fetch_faults.popleft()
+           n_blocks = min(n_blocks, fault_blocks)
+           self.warn("injecting %s fault after %d blocks of %s" % (fault, n_blocks, command))
+
+        block_size = LS4_BLOCK_SIZE + 4
+        chunk = numpy.empty((FETCH_CHUNK_BLOCKS, block_size), dtype=numpy.uint8)
+        chunk[:, 0] = ord("<")
+        chunk[:, 1] = cid[0]
+        chunk[:, 2] = cid[1]
+        chunk[:, 3] = ord(":")
+
+        n_sent = 0
+        for b0 in range(0, n_blocks, FETCH_CHUNK_BLOCKS):
+            n = min(FETCH_CHUNK_BLOCKS, n_blocks - b0)
+            chunk[0:n, 4:] = self._payload(first + b0, n)
+            writer.write(chunk[0:n].tobytes())
+            n_sent += n * block_size
+            delay = t_start + n_sent / self.bandwidth - loop.time()
+            if self.link is not None:
+               delay = max(delay, self.link.reserve(loop.time(), n * block_size) - loop.time())
+            if delay > 0:
+               await asyncio.sleep(delay)
+            await writer.drain()
+
+        if fault == "drop":
+           writer.write(chunk[0, 0:block_size // 2].tobytes())
+           writer.close()
+        elif fault == "stall":
+           await asyncio.wait([read_task])
+
+        return max(t_start + n_sent / self.bandwidth, loop.time())
+
+    def _execute(self, command: str) -> str | None:
+        """ execute a text command and return its reply, or None if it fails """
+
+        if command == "STATUS":
+           return self._status()
+        elif command == "SYSTEM":
+           return self._system()
+        elif command == "FRAME":
+           return self._frame()
+
+        elif command.startswith("WCONFIG"):
+           n_line = int(command[7:11], 16)
+           self.config[n_line] = command[11:]
+           self._config_changed()
+           return ""
+        elif command.startswith("RCONFIG"):
+           return self.config.get(int(command[7:11], 16), "")
+        elif command == "CLEARCONFIG":
+           self.config = {}
+           self._config_changed()
+           return ""
+
+        elif command in ["APPLYALL", "LOADTIMING"]:
+           self._load_params()
+           self._reset_timing()
+           return ""
+        elif command == "LOADPARAMS":
+           self._load_params()
+           return ""
+        elif command == "RESETTIMING":
+           self._reset_timing()
+           return ""
+        elif command == "HOLDTIMING":
+           self.held = True
+           return ""
+        elif command == "RELEASETIMING":
+           self.held = False
+           self._wake.set()
+           return ""
+
+        elif re.match(r"^(APPLYMOD[0-9A-F]{2}|APPLYCDS|APPLYSYSTEM|POLLON|POLLOFF|PING)$", command):
+           return ""
+        elif command == "POWERON":
+           self.power = ArchonPower.ON
+           return ""
+        elif command == "POWEROFF":
+           self.power = ArchonPower.OFF
+           return ""
+        elif command == "REBOOT":
+           self._reboot()
+           self.power = ArchonPower.OFF
+           return ""
+        elif match := re.match(r"^LOCK([0-3])$", command):
+           self.locked = int(match[1])
+           return ""
+
+        elif match := re.match(r"^(FAST)?(PREP|LOAD)PARAM\s+(\w+)(\s+(-?[0-9]+))?$", command):
+           return self._param(match[2], match[3].upper(), match[5])
+
+        return None
+
+    def _param(self, op: str, param: str, value: str | None) -> str | None:
+        """ prepare or load a parameter. Without a value, load its configured value. """
+
+        # without a configuration, any parameter is accepted
+        configured = self._configured_params()
+        if (len(configured) > 0 or value is None) and param not in configured:
+           return None
+
+        if value is None:
+           value = configured[param]
+        else:
+           value = int(value)
+
+        if op == "LOAD":
+           self.params[param] = value
+           self._wake.set()
+        return ""
+
+    def _configured_params(self) -> dict[str, int]:
+        """ return the parameters defined by the configuration lines """
+
+        if self._configured is None:
+           self._configured = {}
+           for line in self.config.values():
+               if match := re.match(r'^PARAMETER[0-9]+="?(\w+)\s*=\s*(-?[0-9]+)"?$', line, re.IGNORECASE):
+                  self._configured[match[1].upper()] = int(match[2])
+        return self._configured
+
+    def _load_params(self):
+
+        self.params = dict(self._configured_params())
+        self._wake.set()
+
+    def _config_changed(self):
+
+        self._values = None
+        self._configured = None
+
+    def _config_values(self) -> dict[str, str]:
+        """ return the values of the configuration lines by keyword """
+
+        if self._values is None:
+           self._values = {}
+           for line in self.config.values():
+               key, __, value = line.partition("=")
+               self._values[key.upper()] = value.strip('"')
+        return self._values
+
+    def _config_value(self, key: str, default: int) -> int:
+
+        try:
+          return int(self._config_values().get(key, default))
+        except ValueError:
+          return default
+
+    def _bias(self, key: str, enable_key: str) -> float:
+        """ return the voltage of a bias: its configured value if it is enabled
+            and the power is on, 0 otherwise.
+        """
+
+        values = self._config_values()
+        if self.power != ArchonPower.ON or values.get(enable_key) != "1":
+           return 0.0
+        try:
+          return float(values.get(key, 0.0))
+        except ValueError:
+          return 0.0
+
+    def _reset_timing(self):
+        """ restart the timing core: stop any exposure, readout, or procedure """
+
+        if self._timing_task is not None:
+           self._timing_task.cancel()
+           self._timing_task = asyncio.create_task(self._timing())
+        self.busy = False
+
+        # a readout in progress is abandoned with the buffer empty
+        for buf in self.buffers.values():
+            if not buf["complete"]:
+               buf["read_time"] = 0.0
+
+    def _lines(self, n: int, t: float) -> int:
+
+        buf = self.buffers[n]
+        if buf["complete"] or buf["read_time"] <= 0:
+           return buf["height"] if buf["complete"] else 0
+        return min(buf["height"], int(buf["height"] * (t - buf["t_start"]) / buf["read_time"]))
+
+    def _status(self) -> str:
+
+        self.n_status += 1
+        dinputs = STATUS_START_BIT if self.busy else 0
+        keys = ["VALID=1", f"COUNT={self.n_status}", "LOG=0",
+                f"POWER={self.power.value}", "POWERGOOD=1", "OVERHEAT=0",
+                "BACKPLANETEMP=30.000", f"MOD4/DINPUTS={dinputs:08b}"]
+        keys += [f"{key}={value:.3f}" for key, value in SIM_SUPPLIES.items()]
+        for module, bias, n_biases in [("MOD4", "LVHC", 6), ("MOD9", "XVN", 4), ("MOD9", "XVP", 4)]:
+            for n in range(1, n_biases + 1):
+                v = self._bias(f"{module}/{bias}_V{n}", f"{module}/{bias}_ENABLE{n}")
+                keys.append(f"{module}/{bias}_V{n}={v:.3f}")
+        return " ".join(keys)
+
+    def _system(self) -> str:
+
+        keys = ["BACKPLANE_TYPE=1", "BACKPLANE_REV=2", "BACKPLANE_VERSION=1.0.408",
+                "BACKPLANE_ID=0000000000000000", "POWER_ID=0000000000000000"]
+        for n, mod_type in SIM_MODULES.items():
+            keys += [f"MOD{n}_TYPE={mod_type.value}", f"MOD{n}_REV=0",
+                     f"MOD{n}_VERSION=1.0.0", f"MOD{n}_ID=0000000000000000"]
+        return " ".join(keys)
+
+    def _frame(self) -> str:
+
+        t = time.monotonic()
+        keys = [f"TIMER={self.timer():X}", f"RBUF={self.rbuf}", f"WBUF={self.wbuf}"]
+        for n, buf in self.buffers.items():
+            lines = self._lines(n, t)
+            keys += [f"BUF{n}BASE={(n - 1) * BUFFER_SPACING}",
+                     f"BUF{n}FRAME={buf['frame']}",
+                     f"BUF{n}WIDTH={buf['width']}",
+                     f"BUF{n}HEIGHT={buf['height']}",
+                     f"BUF{n}PIXELS={lines * buf['width']}",
+                     f"BUF{n}LINES={lines}",
+                     f"BUF{n}RAWBLOCKS=0", f"BUF{n}RAWLINES=0", f"BUF{n}RAWOFFSET=0",
+                     f"BUF{n}TIMESTAMP={buf['timestamp']:X}",
+                     f"BUF{n}COMPLETE={buf['complete']}",
+                     f"BUF{n}MODE=0", f"BUF{n}SAMPLE=0"]
+        return " ".join(keys)
+
+    async def _timing(self):
+        """ the LS4 timing code: run exposures, readouts and procedures as the
+            parameters request, while the timing core is released.
+        """
+
+        while True:
+           p = self.params
+           if self.held:
+              pass
+           elif p.get("EXPOSURES", 0) > 0:
+              await self._expose()
+              p["EXPOSURES"] = max(0, p.get("EXPOSURES", 0) - 1)
+              continue
+           elif p.get("READOUT", 0) > 0:
+              p["READOUT"] = 0
+              await self._readout()
+              continue
+           elif any(p.get(name, 0) > 0 for name in PROCEDURE_PARAMS):
+              self.busy = True
+              await asyncio.sleep(self.procedure_time)
+              for name in PROCEDURE_PARAMS:
+                  p[name] = 0
+              self.busy = False
+              continue
+           elif p.get("ABORTEXPOSURE", 0) > 0:
+              p["ABORTEXPOSURE"] = 0
+
+           self._wake.clear()
+           await self._wake.wait()
+
+    async def _expose(self):
+
+        t_end = time.monotonic() + 0.01 * self.params.get("INTCS", 0)
+        while time.monotonic() < t_end:
+           if self.params.get("ABORTEXPOSURE", 0) > 0:
+              self.params["ABORTEXPOSURE"] = 0
+              return
+           await asyncio.sleep(min(0.01, t_end - time.monotonic()))
+
+    async def _readout(self):
+        """ read the CCDs into the next frame buffer that is not locked """
+
+        n = self.wbuf
+        for __ in range(3):
+            n = n % 3 + 1
+            if n != self.locked:
+               break
+
+        height = self._config_value("LINECOUNT", FAKE_LINECOUNT)
+        taps = self._config_value("TAPLINES", AMPS_PER_CCD * CCDS_PER_QUAD)
+        width = self._config_value("PIXELCOUNT", FAKE_PIXELCOUNT) * taps
+
+        self.n_frame += 1
+        buf = self.buffers[n]
+        buf.update({"complete": 0, "width": width, "height": height,
+                    "t_start": time.monotonic(), "read_time": height / self.line_rate,
+                    "frame": self.n_frame})
+        self.wbuf = n
+
+        await asyncio.sleep(buf["read_time"])
+
+        buf["complete"] = 1
+        buf["timestamp"] = self.timer()
+        self.rbuf = n
+
+
+async def main(args):
+
+    ls4_logger = LS4_Logger(name="archon_sim")
+    sim = LS4_Archon_Sim(readout_time=args.readout_time,
+                         bandwidth=args.bandwidth * 1e6,
+                         rtt=args.rtt_ms * 1e-3,
+                         service_time=args.service_us * 1e-6,
+                         ls4_logger=ls4_logger)
+    if args.acf is not None:
+       sim.load_acf(args.acf)
+    await sim.start(args.host, args.port)
+    try:
+      await asyncio.Event().wait()
+    finally:
+      await sim.stop()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="simulated Archon controller")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="address to listen on")
+    parser.add_argument("--port", type=int, default=4242,
+                        help="port to listen on")
+    parser.add_argument("--acf", type=str, default=None,
+                        help="ACF file to load at start-up")
+    parser.add_argument("--readout_time", type=float, default=SIM_READOUT_TIME,
+                        help="time to read out a full frame (sec)")
+    parser.add_argument("--bandwidth", type=float, default=SIM_BANDWIDTH / 1e6,
+                        help="network bandwidth for fetched data (MB/sec)")
+    parser.add_argument("--rtt_ms", type=float, default=SIM_RTT * 1e3,
+                        help="network round-trip time (msec)")
+    parser.add_argument("--service_us", type=float, default=SIM_SERVICE_TIME * 1e6,
+                        help="time to process one command (usec)")
+    try:
+      asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+      pass
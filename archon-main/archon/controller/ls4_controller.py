@@ -16,16 +16,20 @@
 from __future__ import annotations
 
 import asyncio
+import bisect
 import configparser
+import functools
+import hashlib
 import io
 import os
 import re
 import warnings
 import time
 import sys
+from collections import Counter
 from collections.abc import AsyncIterator
 
-from typing import Any, Callable, Iterable, Literal, Optional, cast, overload
+from typing import Any, Callable, Iterable, Literal, Optional, overload
 
 import numpy
 import threading
@@ -34,11 +38,17 @@ from archon.controller.ls4_sync_io import LS4_SyncIO
 
 from archon import config as lib_config
 from archon import log
-from archon.controller.command import ArchonCommand, ArchonCommandStatus
+from archon.controller.command import ArchonCommand, ArchonCommandStatus, \
+              parse_reply_header
 from archon.controller.maskbits import ArchonPower, ControllerStatus, ModType
 from archon.controller.ls4_mainloop import Mainloop_Function as ML
 from archon.controller.ls4_mainloop import LS4_Mainloop
 from archon.controller.ls4_fake_controller import LS4_Fake_Control
+from archon.controller.ls4_frame_ring import LS4_Frame_Ring
+from archon.controller.ls4_telemetry import LS4_Telemetry
+from archon.controller.ls4_readout_tracker import LS4_Readout_Tracker
+from archon.controller.ls4_timeouts import LS4_Timeouts
+from archon.controller.ls4_latency import LS4_Latency
 from archon.ls4_exceptions import (
     LS4ControllerError,
     LS4ControllerWarning,
@@ -52,16 +62,60 @@ from archon.controller.ls4_params import\
               CCDS_PER_QUAD, STATUS_LOCK_TIMEOUT, LS4_BLOCK_SIZE, \
               VSUB_ENABLE_KEYWORD, VSUB_MODULE, VSUB_ENABLE_VAL, \
               VSUB_DISABLE_VAL, VSUB_APPLY_COMMAND, MAX_FETCH_TIME, \
-              STATUS_START_BIT,REBOOT_TIME, POST_ERASE_DELAY
+              STATUS_START_BIT,REBOOT_TIME, POST_ERASE_DELAY, FETCH_BAND_LINES, \
+              WRITE_CONFIG_WINDOW, TELEMETRY_INTERVAL, TELEMETRY_SYSTEM_INTERVAL, \
+              SELF_CLEARING_PARAMS, FETCH_REGION_MERGE_BLOCKS, FETCH_REGION_WINDOW, \
+              PROGRESSIVE_FETCH_POLL, FETCH_MAX_RETRIES, FETCH_STALL_TIME, \
+              DATA_CONNECTION_COMMANDS
 
 
-__all__ = ["LS4Controller", "TimePeriod"]
+__all__ = ["LS4Controller", "TimePeriod", "region_block_ranges"]
 
 def check_int(s):
     if s[0] in ("-", "+"):
         return s[1:].isdigit()
     return s.isdigit()
 
+def normalize_config_line(line: str) -> str:
+    """ return a configuration line as sent with WCONFIG: upper-case keyword
+        with / module separators, and the value without surrounding quotes
+    """
+    key, __, value = line.partition("=")
+    return key.strip().upper().replace("\\", "/") + "=" + value.strip().strip('"')
+
+def config_fingerprint(lines: list[str]) -> str:
+    """ return a fingerprint of a list of configuration lines """
+    h = hashlib.sha1()
+    for line in lines:
+        h.update(normalize_config_line(line).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+def region_block_ranges(rects: list[tuple[int, int, int, int]], width: int,
+                        bytes_per_pixel: int,
+                        merge_blocks: int = FETCH_REGION_MERGE_BLOCKS) -> list[tuple[int, int]]:
+    """ return the sorted, disjoint ranges (b0, b1) of the blocks of a frame buffer
+        holding the rectangles (y0, y1, x0, x1) of an image of the given width
+        (pixels). Ranges separated by at most merge_blocks blocks are merged.
+    """
+
+    spans = []
+    for y0, y1, x0, x1 in rects:
+        for y in range(y0, y1):
+            start = (y * width + x0) * bytes_per_pixel
+            end = (y * width + x1) * bytes_per_pixel
+            spans.append((start // LS4_BLOCK_SIZE, -(-end // LS4_BLOCK_SIZE)))
+    spans.sort()
+
+    ranges = []
+    for b0, b1 in spans:
+        if len(ranges) > 0 and b0 <= ranges[-1][1] + merge_blocks:
+            if b1 > ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], b1)
+        else:
+            ranges.append((b0, b1))
+    return ranges
+
 class TimePeriod():
     """ useful for keeping track of time intervals required for processes"""
 
@@ -117,6 +171,9 @@ class LS4Controller(LS4_Device):
     amp_direction: must be in ["both","left","right].
 
     notifier: function to call when logging messages (redundant with ls4_logger)
+
+    data_connection: If true, open a second connection to the controller for the
+         FETCH commands and their binary replies
     """
 
     # auto_functions are the possible operations performed by the controller timing
@@ -141,6 +198,8 @@ class LS4Controller(LS4_Device):
         reboot: bool | None = None,
         amp_direction: str | None = None,
         notifier: Optional[Callable[[str], None]] = None,
+        telemetry_interval: float | None = None,
+        data_connection: bool = False,
     ):
 
         assert param_args is not None, "param_args are not specified"
@@ -179,6 +238,8 @@ class LS4Controller(LS4_Device):
 
         self._status: ControllerStatus = ControllerStatus.UNKNOWN
         self.__status_event = asyncio.Event()
+        # (mask, mode, future) for each task waiting in wait_status
+        self._status_waiters: list[tuple[ControllerStatus, str, asyncio.Future]] = []
         
         self.debug("instantiating state_lock")
         # need a mutex to lock self._status while changing status bits
@@ -188,11 +249,82 @@ class LS4Controller(LS4_Device):
         self.host = host
         self.name = name
 
-        self._binary_reply: Optional[bytearray] = None
+        self._binary_reply: Optional[memoryview] = None
+        self._binary_payload: Optional[numpy.ndarray] = None
+
+        # progress of the binary reply being read by _listen. _binary_event is
+        # set once _binary_blocks reaches _binary_notify_at (see fetch_bands).
+        self._binary_blocks = 0
+        self._binary_notify_at = 0
+        self._binary_event = asyncio.Event()
+
+        # host buffers for the three controller frame buffers, reused for each
+        # exposure (see ls4_frame_ring.py)
+        self.frame_ring = LS4_Frame_Ring(num_buffers=3, ls4_logger=self.ls4_logger)
+
+        # follows the readout of each exposure. readout_tracker.completed is set
+        # when the frame buffer is complete (see ls4_readout_tracker.py)
+        self.readout_tracker = LS4_Readout_Tracker(self._readout_frame,
+                                                   ls4_logger=self.ls4_logger)
+        self._t_readout = 0.0
+
+        # progressive fetch of the buffer being read out (see readout). The task
+        # fetches the lines reported in _prefetch_lines each time _prefetch_event
+        # is set, and returns the filled host buffer.
+        self._prefetch_task: asyncio.Task | None = None
+        self._prefetch_buffer: int | None = None
+        self._prefetch_lines = (0, False)
+        self._prefetch_event = asyncio.Event()
+
+        # retries of the blocks missing from the last fetch, and number of times
+        # the connection was re-opened (see _fetch_resumable)
+        self.fetch_retries = 0
+        self.reconnects = 0
+
+        # True if the last fetch only waited for the fetch made during the readout
+        self.last_fetch_prefetched = False
+
+        # readouts not yet fetched: the number of each readout (counted by
+        # readout_count) by the frame buffer it was read out to. FETCH_PENDING is
+        # set while any is left, and a fetch clears only the readout it fetched.
+        self.readout_count = 0
+        self._fetch_pending: dict[int, int] = {}
+
+        # optional second connection carrying only the bulk data (see
+        # DATA_CONNECTION_COMMANDS), so that STATUS and FRAME queries do not wait
+        # behind the binary replies of a FETCH. Opened by start().
+        self.data_connection = data_connection
+        self._data_client = None
+        self.data_listener: asyncio.Task | None = None
+
+        # exposure staged by arm_exposure: exptime, shutter setting, and time armed
+        self._armed: dict | None = None
+
+        # cache of the STATUS, FRAME, and SYSTEM queries shared by all callers,
+        # polled every telemetry_interval sec (see ls4_telemetry.py)
+        if telemetry_interval is None:
+           telemetry_interval = TELEMETRY_INTERVAL
+        intervals = {}
+        if telemetry_interval > 0:
+           intervals = {"STATUS": telemetry_interval, "FRAME": telemetry_interval,
+                        "SYSTEM": max(telemetry_interval, TELEMETRY_SYSTEM_INTERVAL)}
+        self.telemetry = LS4_Telemetry(
+             queries={"STATUS": self._query_status, "FRAME": self._query_frame,
+                      "SYSTEM": self._query_system},
+             intervals=intervals,
+             paused=lambda: self._data_client is None and \
+                            bool(self.status & ControllerStatus.FETCHING),
+             ls4_logger=self.ls4_logger)
 
 
         self.parameters: dict[str, int] = {}
 
+        # values of the parameters known to be loaded in the controller, written by
+        # set_param. A parameter missing from the cache is dirty (unknown value).
+        self._param_cache: dict[str, int] = {}
+        self.param_cache_hits = 0
+        self.param_cache_misses = 0
+
         self.current_window: dict[str, int] = {}
         self.default_window: dict[str, int] = {}
 
@@ -203,6 +335,11 @@ class LS4Controller(LS4_Device):
 
         self.acf_file = acf_file
 
+        # configuration lines last read from or written to the controller,
+        # and their fingerprint. None when the controller configuration is unknown.
+        self._config_lines: list[str] | None = None
+        self.config_fingerprint: str | None = None
+
         # self.fake_control will be used to simulate controller operations
         self.fake_control = None
         if fake is not None:
@@ -237,6 +374,18 @@ class LS4Controller(LS4_Device):
              
         self.__running_commands: dict[int, ArchonCommand] = {}
         self._id_pool = set(range(MAX_COMMAND_ID))
+
+        # one scheduler for the timeouts of all the commands in flight
+        self.timeouts = LS4_Timeouts(ls4_logger=self.ls4_logger)
+
+        # number of replies received by command type, and of replies that
+        # could not be parsed or matched to a running command
+        self.reply_counts: Counter[str] = Counter()
+        self.invalid_replies = 0
+        self.unmatched_replies = 0
+
+        # latency histograms of the commands written to the controller
+        self.latency = LS4_Latency(name=name, ls4_logger=self.ls4_logger)
         LS4_Device.__init__(self, name=name, host=host, port=port, local_addr=local_addr,
                     ls4_logger=self.ls4_logger,config=self.config)
 
@@ -305,6 +454,8 @@ class LS4Controller(LS4_Device):
                 "filterid": "",\
                 "frame": 0,\
                 "read-per": 0.0,\
+                "arm-lat": 0.0,\
+                "release-lat": 0.0,\
                 "xbinning": 1,\
                 "ybinning": 1,\
                 "gain": 1.0,\
@@ -372,8 +523,12 @@ class LS4Controller(LS4_Device):
 
         if not self.fake_controller:
           await super().start()
+          if self.data_connection:
+            await self._open_data_connection()
         self.debug(f"Controller {self.name} connected at {self.host}.")
 
+        self.telemetry.start()
+
         if read_acf :
             if self.fake_controller and self.acf_file is None:
               error_msg = "cannot retrieve XVS data from acf_file. acf_file is None"
@@ -539,6 +694,40 @@ class LS4Controller(LS4_Device):
 
         return result
 
+    async def wait_status(
+        self,
+        bits: ControllerStatus | list[ControllerStatus],
+        mode="or",
+        max_wait: float | None = None,
+    ) -> bool:
+        """ wait up to max_wait sec (forever if None) until any, none, or all
+            (mode='or', 'nor', or 'and') of the specified status bits are set.
+            Return True if they are, False on timeout. Unlike polling
+            check_status, this returns as soon as update_status changes the bits.
+        """
+
+        if await self.check_status(bits, mode=mode):
+            return True
+
+        if not isinstance(bits, (list, tuple)):
+            bits = [bits]
+        mask = ControllerStatus.NOSTATUS
+        for b in bits:
+           mask |= b
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (mask, mode, future)
+        self._status_waiters.append(waiter)
+        try:
+          await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+          return False
+        finally:
+          if waiter in self._status_waiters:
+             self._status_waiters.remove(waiter)
+
+        return True
+
     async def yield_status(self) -> AsyncIterator[ControllerStatus]:
         """Asynchronous generator yield the status of the controller."""
 
@@ -658,6 +847,15 @@ class LS4Controller(LS4_Device):
             self.debug("new status: %s" % status.get_flags())
             self.__status_event.set()
 
+        # wake up the tasks waiting in wait_status for these status bits
+        for waiter in list(self._status_waiters):
+            mask, wait_mode, future = waiter
+            if future.done():
+                self._status_waiters.remove(waiter)
+            elif self.bitmask_logic(status_bits=status, mode=wait_mode, mask=mask):
+                future.set_result(True)
+                self._status_waiters.remove(waiter)
+
     async def yield_status(self) -> AsyncIterator[ControllerStatus]:
         """Asynchronous generator yield the status of the controller."""
 
@@ -715,6 +913,7 @@ class LS4Controller(LS4_Device):
               command_id,
               controller=self,
               fake=self.fake_controller,
+              timeouts=self.timeouts,
               **kwargs,
         )
 
@@ -724,7 +923,7 @@ class LS4Controller(LS4_Device):
         if not sync_flag:
               self.debug("%s: asynchronously writing command [%s]" % (prefix,command.command_string))
               if not self.fake_controller:
-                self.write(command.raw)
+                self._write_command(command)
 
         # synchronous I/O
         else:
@@ -753,7 +952,7 @@ class LS4Controller(LS4_Device):
             if not self.ls4_sync_io.leader:
               self.debug("%s: synchronously writing command [%s]" % (prefix,command.command_string))
               if not self.fake_controller:
-                 self.write(command.raw)
+                 self._write_command(command)
 
             # The followers wait here for leader to update sync_io. 
             # When the leader begins updating sync_io, it first allows the followers to proceed with their
@@ -769,7 +968,7 @@ class LS4Controller(LS4_Device):
             if self.ls4_sync_io.leader and not error_msg:
               self.debug("%s: synchronously writing command [%s]" % (prefix,command.command_string))
               if not self.fake_controller:
-                self.write(command.raw)
+                self._write_command(command)
 
             if not error_msg:
               self.debug("%s: verifying sync" % prefix)
@@ -820,17 +1019,73 @@ class LS4Controller(LS4_Device):
             command_id,
             controller=self,
             fake=self.fake_controller,
+            timeouts=self.timeouts,
             **kwargs,
         )
         self.__running_commands[command_id] = command
 
          
         if not self.fake_controller:  
-          self.write(command.raw)
+          self._write_command(command)
         #self.debug(f"-> {command.raw}")
          
         return command
 
+    def _write_command(self, command: ArchonCommand):
+        """ write a command to the controller, and time it until it is done """
+
+        command.t_write = time.monotonic()
+        command.add_done_callback(self._record_latency)
+        if self._on_data_connection(command):
+           self._data_client.writer.write(command.raw.encode() + b"\n")
+        else:
+           self.write(command.raw)
+
+    def _on_data_connection(self, command: ArchonCommand) -> bool:
+        """ return True if command is sent on the bulk-data connection """
+
+        return self._data_client is not None and \
+               command.command_type in DATA_CONNECTION_COMMANDS
+
+    async def _open_data_connection(self):
+        """Opens the bulk-data connection and starts its listener.
+
+        The replies on both connections are routed by command id, so the
+        commands share one pool of ids. The connection is not bound to the
+        local port of the control connection, which is already in use.
+        """
+
+        local_addr = None
+        if self.local_addr is not None:
+           local_addr = (self.local_addr[0], 0)
+        self._data_client = await self.ls4_open_connection(local_addr=local_addr)
+        self.data_listener = asyncio.create_task(self._listen(self._data_client))
+        self.info("opened bulk-data connection to controller %s" % self.name)
+
+    async def _close_data_connection(self):
+        """Closes the bulk-data connection, if open, and stops its listener."""
+
+        if self.data_listener is not None and not self.data_listener.done():
+            self.data_listener.cancel()
+            try:
+                await self.data_listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        self.data_listener = None
+
+        if self._data_client is not None and self._data_client.writer is not None:
+            self._data_client.writer.close()
+        self._data_client = None
+
+    def _record_latency(self, command: ArchonCommand):
+        """ add the latency of a completed command to the histograms """
+
+        if command.t_write is None or command.t_done is None or \
+           command.status == ArchonCommandStatus.TIMEDOUT:
+           return
+        self.latency.record(command.command_type, command.t_done - command.t_write,
+                            command=command.raw)
+
     async def send_many(
         self,
         cmd_strs: Iterable[str],
@@ -932,33 +1187,60 @@ class LS4Controller(LS4_Device):
     async def process_message(self, line: bytes) -> None:
         """Processes a message from the Archon and associates it with its command."""
 
-        match = re.match(b"^[<|?]([0-9A-F]{2})", line)
-        if match is None:
+        self.route_reply(line)
+
+    def route_reply(self, line: bytes) -> None:
+        """Routes a reply from the Archon to its running command.
+
+        The reply type and command id are read from the first bytes of the
+        reply, without a regular expression, and the reply is not parsed again
+        by the command. Called by `._listen` for each reply as it is read.
+        """
+
+        header = parse_reply_header(line)
+        if header is None:
+            self.invalid_replies += 1
             warnings.warn(
-                f"Received invalid reply {line.decode()}",
+                f"Received invalid reply {line[0:20]!r}",
                 LS4ControllerWarning,
             )
             return
 
-        command_id = int(match[1], 16)
-        if command_id not in self.__running_commands:
+        reply_type, command_id, is_binary = header
+        command = self.__running_commands.get(command_id)
+        if command is None:
+            self.unmatched_replies += 1
             self.warn("command_id [%d] not in running commands" % command_id)
             warnings.warn(
-                f"Cannot find running command for {line[0-20]}",
+                f"Cannot find running command for {line[0:20]!r}",
                 LS4ControllerWarning,
             )
             return
 
-        self.__running_commands[command_id].process_reply(line)
+        self.reply_counts[command.command_type] += 1
+        command.process_parsed_reply(line, reply_type, command_id, is_binary)
 
     async def stop(self):
-        """Stops the client and cancels the command tracker."""
+        """Stops the client, the telemetry poller, and cancels the command tracker."""
 
+        await self.telemetry.stop()
         self._job.cancel()
+        self.timeouts.stop()
+        self._cancel_prefetch()
+        await self._close_data_connection()
         await super().stop()
 
-    async def get_system(self) -> dict[str, Any]:
-        """Returns a dictionary with the output of the ``SYSTEM`` command."""
+    async def get_system(self, max_age: float | None = None) -> dict[str, Any]:
+        """Returns a dictionary with the output of the ``SYSTEM`` command.
+
+        The result is served from the telemetry cache if it is less than ``max_age``
+        sec old (default: the telemetry polling cadence).
+        """
+
+        return await self.telemetry.get("SYSTEM", max_age=max_age)
+
+    async def _query_system(self) -> dict[str, Any]:
+        """Sends ``SYSTEM`` and returns the parsed reply."""
 
         cmd = await self.send_command("SYSTEM", timeout=5)
         if not cmd.succeeded():
@@ -985,9 +1267,42 @@ class LS4Controller(LS4_Device):
 
     async def get_device_status(self,\
               update_frame: bool = True,\
-              update_power_bits: bool = True) -> dict[str, Any]:
+              update_power_bits: bool = True,\
+              max_age: float | None = None) -> dict[str, Any]:
+
+        """Returns a dictionary with the output of the ``STATUS`` command.
+
+        The ``STATUS`` (and ``FRAME``) results are served from the telemetry cache
+        if they are less than ``max_age`` sec old (default: the telemetry polling
+        cadence). The power bits are updated from the same ``STATUS`` result.
+        """
 
-        """Returns a dictionary with the output of the ``STATUS`` command."""
+        device_status = await self.telemetry.get("STATUS", max_age=max_age)
+
+        if update_power_bits:
+           if self.fake_controller:
+              await self.power()
+           else:
+              self._update_power_bits(device_status)
+
+        if update_frame:
+           if self.fake_controller:
+              frame= self.fake_control.get_frame()
+           else:
+              frame=await self.get_frame(max_age=max_age)
+           device_status['frame']=frame
+
+        device_status['shutter']=self.shutter_enable
+        device_status['param_cache_hits']=self.param_cache_hits
+        device_status['param_cache_misses']=self.param_cache_misses
+        s = self.status
+        sd = s.status_dict
+        device_status.update(sd)
+
+        return device_status
+
+    async def _query_status(self) -> dict[str, Any]:
+        """Sends ``STATUS`` and returns the parsed reply."""
 
         device_status={}   
 
@@ -1030,32 +1345,9 @@ class LS4Controller(LS4_Device):
                  value = float(val)
               device_status[key]=value
                   
-        """
-        keywords = str(cmd.replies[0].reply).split()
-        device_status = {
-            key.lower(): int(value) if check_int(value) else float(value)
-            for (key, value) in map(lambda k: k.split("="), keywords)
-        }
-        """
-
-        if update_power_bits:
-           await self.power()
-
-        if update_frame:
-           if self.fake_controller:
-              frame= self.fake_control.get_frame()
-           else:
-              frame=await self.get_frame()
-           device_status['frame']=frame
-
-        device_status['shutter']=self.shutter_enable
-        s = self.status
-        sd = s.status_dict
-        device_status.update(sd)
-
         return device_status
 
-    async def get_frame(self,max_wait=MAX_FETCH_TIME) -> dict[str, int]:
+    async def get_frame(self,max_wait=MAX_FETCH_TIME, max_age: float = 0.0) -> dict[str, int]:
         """Returns the frame information.
 
         All the returned values in the dictionary are integers in decimal
@@ -1064,10 +1356,26 @@ class LS4Controller(LS4_Device):
         max_wait is the timeout waiting for the return from send_command. 
         When am image is being fetched, the send_command may not return
         until the fetch is complete. Keep max_wait = MAX_FETCH_TIME so
-        that a timeout does not occur waiting for the return.
+        that a timeout does not occur waiting for the return. With the
+        bulk-data connection open (data_connection=True), FRAME does not
+        wait for the fetch.
+
+        The result is served from the telemetry cache if it is less than
+        max_age sec old. With max_age = 0 (the default) a new FRAME query
+        is always sent, but it is shared with concurrent callers.
         """
 
-        ACS = ArchonCommandStatus
+        if max_wait != MAX_FETCH_TIME:
+           frame = await self._query_frame(max_wait=max_wait)
+        else:
+           frame = await self.telemetry.get("FRAME", max_age=max_age)
+
+        self.frame=frame
+        return frame
+
+    async def _query_frame(self, max_wait=MAX_FETCH_TIME) -> dict[str, int]:
+        """Sends ``FRAME`` and returns the parsed reply."""
+
         cmd = await self.send_command("FRAME", timeout=max_wait)
         if not cmd.succeeded():
             raise LS4ControllerError(
@@ -1080,7 +1388,6 @@ class LS4Controller(LS4_Device):
             for (key, value) in map(lambda k: k.split("="), keywords)
         }
 
-        self.frame=frame
         return frame
 
     async def read_config(
@@ -1132,6 +1439,8 @@ class LS4Controller(LS4_Device):
         # Trim possible empty lines at the end.
         config_lines = "\n".join(lines).strip().splitlines()
 
+        self._set_config_lines(config_lines)
+
         # The GUI ACF file includes the system information, so we get it.
         system = await self.get_system()
 
@@ -1172,6 +1481,7 @@ class LS4Controller(LS4_Device):
         #self.debug("command succeeded")
 
     async def release_timing(self):
+        self._armed = None
         cmd_str = "RELEASETIMING"
         cmd = await self.send_command(cmd_str, timeout=1)
         if not cmd.succeeded():
@@ -1180,6 +1490,8 @@ class LS4Controller(LS4_Device):
                f"Failed sending {cmd_str} ({cmd.status.name})")
 
     async def reboot(self):
+        self._set_config_lines(None)
+        self.invalidate_params()
         cmd_str = "REBOOT"
         cmd = await self.send_command(cmd_str, timeout=1)
         if not cmd.succeeded():
@@ -1199,7 +1511,9 @@ class LS4Controller(LS4_Device):
         trigger_opts: dict = {},
         #notifier: Optional[Callable[[str], None]] = None,
         release_timing: bool = True,
-        reset: bool = False
+        reset: bool = False,
+        window: int | None = None,
+        differential: bool = True,
     ):
         """Writes a configuration file to the contoller. Optionally write only trigger options.
 
@@ -1238,10 +1552,24 @@ class LS4Controller(LS4_Device):
             execution of their timing scripts.
         reset
             IF True/False reset after writing configuration
+        window
+            The maximum number of ``WCONFIG`` commands in flight while sending the
+            configuration lines. Defaults to ``WRITE_CONFIG_WINDOW``. With ``1``,
+            the lines are sent one at a time, waiting ``write_config_delay`` between
+            them.
+        differential
+            If True, compare the configuration with the one last read from or
+            written to the controller. If they have the same fingerprint nothing is
+            sent. If only module lines changed, only those lines are sent, followed
+            by ``APPLYMOD`` for the modules they belong to (unless ``applyall``).
+            Otherwise the whole configuration is sent after ``CLEARCONFIG``.
         """
 
         ACS = ArchonCommandStatus
 
+        if window is None:
+            window = WRITE_CONFIG_WINDOW
+
         timeout = timeout or self.config["timeouts"]["write_config_timeout"]
         delay: float = self.config["timeouts"]["write_config_delay"]
 
@@ -1267,40 +1595,71 @@ class LS4Controller(LS4_Device):
           for key in aconfig:
               lines.append(key.upper().replace("\\", "/") + "=" + aconfig[key].strip('"'))
 
-          #self.debug("Clearing previous configuration")
-          await self.send_and_wait("CLEARCONFIG", timeout=timeout)
-          #self.debug("Done clearing previous configuration")
-
-          #self.debug("Sending configuration lines")
-          #DEBUG:
-          #self.info("configuration lines:")
-          #i = 0
-          #for l in lines:
-          #    self.info("line %05d  %s" % (i,l))
-          #    i += 1
-
-          # Stop the controller from polling internally to speed up network response
-          # time. This command is not in the official documentation.
-          await self.send_command("POLLOFF")
-          poll_on = False
-
-          cmd_strs = [f"WCONFIG{n_line:04X}{line}" for n_line, line in enumerate(lines)]
-          n_lines = len(cmd_strs)
-          i=1
-          for line in cmd_strs:
-              #self.debug("line %d/%d: %s" % (i,n_lines,line))
-              cmd = await self.send_command(line, timeout=timeout)
-              if cmd.status == ACS.FAILED or cmd.status == ACS.TIMEDOUT:
-                  self.debug("cmd error status is %s" % str(cmd.status))
-                  self.update_status(ControllerStatus.ERROR)
-                  await self.send_command("POLLON")
-                  poll_on = True
-                  raise LS4ControllerError(
-                      f"Failed sending line {cmd.raw!r} ({cmd.status.name})"
-                  )
-              await asyncio.sleep(delay)
-              i += 1
+          changed_lines = None
+          if differential:
+            changed_lines = await self._changed_config_lines(lines)
+
+          if changed_lines is not None:
+            if len(changed_lines) == 0:
+              self.info("configuration unchanged (fingerprint %s), not sending it" %\
+                        self.config_fingerprint)
+            else:
+              self.info("sending %d changed configuration lines" % len(changed_lines))
+              await self.send_command("POLLOFF")
+              poll_on = False
+              failures = await self._write_config_lines(
+                  [(n_line, lines[n_line]) for n_line in changed_lines],
+                  timeout=timeout, window=window
+              )
+              if len(failures) > 0:
+                  await self._config_write_failed(failures)
+
+              # apply the changes to the modules, unless all is applied later
+              if not applyall:
+                mods = []
+                for n_line in changed_lines:
+                    modn = int(re.match(r"MOD([0-9]+)/", lines[n_line].upper()).group(1))
+                    apply_cmd_str = f"APPLYMOD{modn-1:02X}"
+                    if apply_cmd_str not in mods:
+                        mods.append(apply_cmd_str)
+                applymods = list(applymods) + mods
 
+          else:
+            #self.debug("Clearing previous configuration")
+            self._set_config_lines(None)
+            await self.send_and_wait("CLEARCONFIG", timeout=timeout)
+            #self.debug("Done clearing previous configuration")
+
+            # Stop the controller from polling internally to speed up network response
+            # time. This command is not in the official documentation.
+            await self.send_command("POLLOFF")
+            poll_on = False
+
+            if window > 1:
+              failures = await self._write_config_lines(enumerate(lines),
+                                      timeout=timeout, window=window)
+              if len(failures) > 0:
+                  await self._config_write_failed(failures)
+            else:
+              cmd_strs = [f"WCONFIG{n_line:04X}{line}" for n_line, line in enumerate(lines)]
+              n_lines = len(cmd_strs)
+              i=1
+              for line in cmd_strs:
+                  #self.debug("line %d/%d: %s" % (i,n_lines,line))
+                  cmd = await self.send_command(line, timeout=timeout)
+                  if cmd.status == ACS.FAILED or cmd.status == ACS.TIMEDOUT:
+                      self.debug("cmd error status is %s" % str(cmd.status))
+                      self.update_status(ControllerStatus.ERROR)
+                      await self.send_command("POLLON")
+                      poll_on = True
+                      raise LS4ControllerError(
+                          f"Failed sending line {cmd.raw!r} ({cmd.status.name})"
+                      )
+                  await asyncio.sleep(delay)
+                  i += 1
+
+          self._set_config_lines(lines)
+          self.invalidate_params()
           self.acf_config = cp
           self.acf_file = input if os.path.exists(input) else None
 
@@ -1326,6 +1685,9 @@ class LS4Controller(LS4_Device):
         for mod in applymods:
             #notifier(f"Sending {mod.upper()}")
             await self.send_and_wait(mod.upper(), timeout=5)
+            # loading the parameters resets them to the configuration values
+            if mod.upper() in ["LOADTIMING", "LOADPARAMS"]:
+                self.invalidate_params()
 
         if applysystem:
             #notifier("Sending APPLYSYSTEM")
@@ -1334,6 +1696,7 @@ class LS4Controller(LS4_Device):
         elif applyall:
             #notifier("Sending APPLYALL")
             await self.send_and_wait("APPLYALL", timeout=5)
+            self.invalidate_params()
 
 
             # Reset objects that depend on the configuration file.
@@ -1350,6 +1713,109 @@ class LS4Controller(LS4_Device):
 
         return
 
+    async def _write_config_lines(
+        self,
+        lines: Iterable[tuple[int, str]],
+        timeout: float | None = None,
+        window: int = WRITE_CONFIG_WINDOW,
+    ) -> list[tuple[int, ArchonCommandStatus]]:
+        """Sends ``(line_number, line)`` pairs with ``WCONFIG``, keeping several in flight.
+
+        Up to ``window`` commands are sent ahead of their replies, using ids from
+        the command id pool. After a line fails no more lines are sent, but the
+        commands in flight are still waited for.
+
+        Returns a list of ``(line_number, status)`` for the lines that failed or
+        timed out, sorted by line number.
+        """
+
+        ACS = ArchonCommandStatus
+
+        # Leave enough ids in the pool for other commands.
+        window = max(1, min(window, MAX_COMMAND_ID // 2))
+        slots = asyncio.Semaphore(window)
+        in_flight: set[ArchonCommand] = set()
+        failures: list[tuple[int, ArchonCommandStatus]] = []
+
+        def line_done(n_line: int, cmd: ArchonCommand):
+            in_flight.discard(cmd)
+            if cmd.status == ACS.FAILED or cmd.status == ACS.TIMEDOUT:
+                failures.append((n_line, cmd.status))
+            slots.release()
+
+        for n_line, line in lines:
+            await slots.acquire()
+            if len(failures) > 0:
+                break
+            cmd = self.send_command(f"WCONFIG{n_line:04X}{line}", timeout=timeout)
+            in_flight.add(cmd)
+            cmd.add_done_callback(functools.partial(line_done, n_line))
+
+        if len(in_flight) > 0:
+            await asyncio.wait(list(in_flight))
+
+        return sorted(failures)
+
+    async def _config_write_failed(self, failures: list[tuple[int, ArchonCommandStatus]]):
+        """Restores polling after configuration lines failed, and raises."""
+
+        self._set_config_lines(None)
+        self.update_status(ControllerStatus.ERROR)
+        await self.send_command("POLLON")
+        failed_lines = ", ".join(
+            [f"{n_line} ({status.name})" for n_line, status in failures]
+        )
+        raise LS4ControllerError(f"Failed sending configuration lines {failed_lines}")
+
+    def _set_config_lines(self, lines: list[str] | None):
+        """Caches the configuration lines held by the controller and their fingerprint."""
+
+        if lines is None:
+            self._config_lines = None
+            self.config_fingerprint = None
+        else:
+            self._config_lines = [normalize_config_line(line) for line in lines]
+            self.config_fingerprint = config_fingerprint(self._config_lines)
+
+    async def _changed_config_lines(self, lines: list[str]) -> list[int] | None:
+        """Compares configuration lines with those held by the controller.
+
+        The controller configuration is read with `read_config` if it is not
+        cached. Returns the numbers of the lines that changed, or `None` if the
+        whole configuration must be sent: the controller configuration is unknown,
+        lines were added, removed or reordered, or lines outside the modules
+        changed (these need the timing core to be reloaded).
+        """
+
+        if self._config_lines is None and not self.fake_controller:
+            try:
+                await self.read_config()
+            except Exception as e:
+                self.warn("unable to read controller configuration: %s" % e)
+                self._set_config_lines(None)
+
+        if self._config_lines is None:
+            return None
+
+        new_lines = [normalize_config_line(line) for line in lines]
+        if config_fingerprint(new_lines) == self.config_fingerprint:
+            return []
+
+        if len(new_lines) != len(self._config_lines):
+            return None
+
+        changed_lines = []
+        for n_line, (new, old) in enumerate(zip(new_lines, self._config_lines)):
+            if new == old:
+                continue
+            if new.partition("=")[0] != old.partition("=")[0]:
+                return None
+            if not re.match(r"MOD[0-9]+/", new):
+                return None
+            changed_lines.append(n_line)
+
+        return changed_lines
+
     async def write_line(
         self,
         keyword: str,
@@ -1432,6 +1898,9 @@ class LS4Controller(LS4_Device):
             )
 
         self.acf_config["CONFIG"][keyword] = value_str
+        if self._config_lines is not None and n_line < len(self._config_lines):
+            self._config_lines[n_line] = normalize_config_line(line)
+            self.config_fingerprint = config_fingerprint(self._config_lines)
 
         if apply:
             if isinstance(apply, str):
@@ -1557,31 +2026,39 @@ class LS4Controller(LS4_Device):
               await asyncio.sleep(1)
 
           self.debug("getting device status")
-          status = await self.get_device_status(update_power_bits=False,update_frame=False)
-
-          self.debug("getting power stattus")
-          power_status = ArchonPower(status["power"])
-
-          self.debug("updating power status")
-          if (
-              power_status not in [ArchonPower.ON, ArchonPower.OFF]
-              or status["powergood"] == 0
-          ):
-              if power_status == ArchonPower.INTERMEDIATE:
-                  warnings.warn("Power in INTERMEDIATE state.", LS4UserWarning)
-              self.update_status(ControllerStatus.POWERBAD)
-          else:
-              if power_status == ArchonPower.ON:
-                  self.update_status(ControllerStatus.POWERON)
-              elif power_status == ArchonPower.OFF:
-                  self.update_status(ControllerStatus.POWEROFF)
-
-          self.debug("done updating power status")
+          status = await self.get_device_status(update_power_bits=False,update_frame=False,
+                                                max_age=0.0)
+          power_status = self._update_power_bits(status)
 
         self.debug("ending power command with power_status = %s" % str(power_status))
         return power_status
 
-    async def get_mainloop_status(self):
+    def _update_power_bits(self, status: dict[str, Any]) -> ArchonPower:
+        """ update the power bits of the controller status from a STATUS result.
+            Return the power state.
+        """
+
+        self.debug("getting power stattus")
+        power_status = ArchonPower(status["power"])
+
+        self.debug("updating power status")
+        if (
+            power_status not in [ArchonPower.ON, ArchonPower.OFF]
+            or status["powergood"] == 0
+        ):
+            if power_status == ArchonPower.INTERMEDIATE:
+                warnings.warn("Power in INTERMEDIATE state.", LS4UserWarning)
+            self.update_status(ControllerStatus.POWERBAD)
+        else:
+            if power_status == ArchonPower.ON:
+                self.update_status(ControllerStatus.POWERON)
+            elif power_status == ArchonPower.OFF:
+                self.update_status(ControllerStatus.POWEROFF)
+
+        self.debug("done updating power status")
+        return power_status
+
+    async def get_mainloop_status(self, max_age: float = 0.0):
 
         """
            Returns True if timing code is running through the main loop. 
@@ -1592,30 +2069,17 @@ class LS4Controller(LS4_Device):
            etc). The STATUS_START_BIT is asserted when the procedure is running, and 
            cleared when finished. Set return to to show the status of this bit
            (False when asserted, True otherwise).
+
+           The STATUS query is shared with other callers through the telemetry cache.
         """
 
-        result = False
-        device_status=None
+        # the fake controller runs no timing code, so it is always in its main loop
+        if self.fake_controller:
+           return True
 
-        cmd = await self.send_command("STATUS", timeout=10)
-        if not cmd.succeeded():
-            error = cmd.status == ArchonCommandStatus.TIMEDOUT
-            raise LS4ControllerError(
-                f"Command STATUS finished with status {cmd.status.name!r}",
-                set_error_status=error,
-            )
+        device_status = await self.telemetry.get("STATUS", max_age=max_age)
 
-        for key_val_str in str(cmd.replies[0].reply).split():
-            key_val = key_val_str.split("=")
-            key=key_val[0].lower()
-            val= key_val[1]
-            value = None
-            if "mod4/dinputs" in key:
-               #assert check_int(val), "value for MOD4/DINPUTS [%s] is not an integer" % val
-               value = check_int(val)
-               result = not ( int(val,2)& STATUS_START_BIT)
-                
-        return result
+        return bool(device_status.get('mainloop', False))
 
     async def set_autoclear(self, mode: bool, sample=None):
         """
@@ -1765,6 +2229,7 @@ class LS4Controller(LS4_Device):
            sync_flag = self.ls4_sync_io.sync_flag
 
         self._parse_params()
+        self._armed = None
 
         self.debug("start resetting controller")
 
@@ -1787,9 +2252,8 @@ class LS4Controller(LS4_Device):
         # 2024 09 26  WaitCount does nothing in current timing code. But future
         # versions of timing code might use it
 
-        for p in ["Exposures","Readout","AbortExposure","DoFlush","DoPurge","DoErase", "WaitCount"]:
-          self.debug("disabling %s" % p)
-          await self.set_param(param=p, value=0, sync_flag=sync_flag)
+        self.debug("disabling %s" % ",".join(SELF_CLEARING_PARAMS))
+        await self.set_params({p: 0 for p in SELF_CLEARING_PARAMS}, sync_flag=sync_flag)
 
 
         if self.shutter_enable:
@@ -1968,6 +2432,13 @@ class LS4Controller(LS4_Device):
         if (not sync_test) and (param not in self.parameters) and (force is False):
             error_msg = f"Trying to set unknown parameter {param}"
 
+        # A parameter already loaded with this value is not written again. With
+        # synchronized controllers the sync barriers are still passed, so that the
+        # controllers stay in step even if their caches differ.
+        cached = False
+        if (not sync_test) and (not force) and error_msg is None:
+            cached = self._param_cached(param, value)
+
         if sync_flag and error_msg is None:
           # The leader breezes through sync_prepare without waiting for events.
           # The followers get held up in sync prepare until the leader executes sync_update (below)
@@ -1979,7 +2450,7 @@ class LS4Controller(LS4_Device):
             error_msg = "Exception preparing sync: %s" % e
 
           # The leaders execute FASTPREPARM before the followers because it gets here first
-          if not error_msg and not sync_test:
+          if not error_msg and not sync_test and not cached:
 
             self.debug("%s sending FASTPREPPARAM" % prefix)
             cmd = await self.send_command(f"FASTPREPPARAM {param} {value}",sync_flag=False)
@@ -1997,7 +2468,7 @@ class LS4Controller(LS4_Device):
         # All the controller threads arrive here about the same time. However, if they
         # have been set up for synchronous IO, they will load the parameter at the same 
         # time. If they are not synchronized, the relative timing will be random.
-        if not error_msg and not sync_test:
+        if not error_msg and not sync_test and not cached:
           cmd_string=f"FASTLOADPARAM {param} {value}"
           #self.debug("%s sending command [%s]" % (prefix,cmd_string))
           try:
@@ -2017,15 +2488,142 @@ class LS4Controller(LS4_Device):
             error_msg = "Exception verifying sync: %s" % e
 
         if error_msg is not None:
+           self._param_cache.pop(param, None)
            self.error("%s: %s" % (prefix,error_msg))
            raise LS4ControllerError(f"Failed setting param {param} to value {value}:  %s" % error_msg)
 
+        if not sync_test:
+           self._param_cache[param] = value
         self.parameters[param] = value
         #self.debug("%s: done setting [%s] to [%d] sync_flag: %s sync_test: %s" %\
         #   (prefix,param,value,sync_flag,sync_test))
         
         return cmd
 
+    async def set_params(
+        self,
+        params: dict[str, int],
+        force: bool = False,
+        sync_flag: bool | None = None
+    ) -> list[ArchonCommand]:
+
+        """sets several parameters in one transaction, calling ``FASTPREPPARAM``
+           for all of them, then ``FASTLOADPARAM`` for all of them back-to-back.
+           If self.ls4_sync_io.sync_flag is true, ls4_sync_io synchronizes the
+           transaction across synchronized controllers with one sync_prepare,
+           sync_update, and sync_verify, rather than one of each per parameter.
+
+           As with set_param, parameters already loaded with their values are
+           not written again. Returns the FASTLOADPARAM commands.
+        """
+
+        error_msg = None
+        cmds = []
+        prefix = self.prefix
+
+        if sync_flag is None:
+           sync_flag = self.ls4_sync_io.sync_flag
+
+        if len(self.parameters) == 0:
+            if self.acf_config is None:
+                raise LS4ControllerError("ACF not loaded. Cannot modify parameters.")
+
+        params = {param.upper(): value for param, value in params.items()}
+
+        unknown = [param for param in params if param not in self.parameters]
+        if len(unknown) > 0 and force is False:
+            error_msg = "Trying to set unknown parameters %s" % ",".join(unknown)
+
+        # the parameters this controller must write. With synchronized controllers,
+        # the sync barriers are passed even if there is nothing to write.
+        if error_msg is None and not force:
+            to_write = {param: value for param, value in params.items()
+                        if not self._param_cached(param, value)}
+        else:
+            to_write = dict(params)
+
+        if sync_flag and error_msg is None:
+          # The leader breezes through sync_prepare without waiting for events.
+          # The followers get held up in sync prepare until the leader executes sync_update (below)
+
+          self.debug("%s preparing sync for %d params" % (prefix,len(params)))
+          try:
+            await self.ls4_sync_io.sync_prepare(param_args={'params':params,'force':force},command_args=None)
+          except Exception as e:
+            error_msg = "Exception preparing sync: %s" % e
+
+          # The leaders execute FASTPREPPARAM before the followers because it gets here first
+          if not error_msg and len(to_write) > 0:
+            self.debug("%s sending FASTPREPPARAM for %d params" % (prefix,len(to_write)))
+            prep_cmds = [self.send_command(f"FASTPREPPARAM {param} {value}")
+                         for param, value in to_write.items()]
+            await asyncio.gather(*prep_cmds)
+            failed = [cmd.command_string for cmd in prep_cmds if not cmd.succeeded()]
+            if len(failed) > 0:
+               error_msg = "%s failed preparing parameters: %s" % (prefix,", ".join(failed))
+
+          # Here the leader allows the followers to catch up and send FASTPREPPARAM commands
+          if not error_msg:
+            self.debug("%s updating sync" % prefix)
+            try:
+              await self.ls4_sync_io.sync_update(param_flag=True)
+            except Exception as e:
+              error_msg = "Exception updating sync: %s" % e
+
+        # All the FASTLOADPARAM commands are sent before waiting for their replies
+        if not error_msg and len(to_write) > 0:
+          try:
+            cmds = [self.send_command(f"FASTLOADPARAM {param} {value}")
+                    for param, value in to_write.items()]
+            await asyncio.gather(*cmds)
+            failed = [cmd.command_string for cmd in cmds if not cmd.succeeded()]
+            if len(failed) > 0:
+               error_msg = "Failed sending commands [%s]" % "], [".join(failed)
+          except Exception as e:
+            error_msg = "Exception setting params: %s" % e
+
+        # synchronization house-keeping
+        if not error_msg and sync_flag:
+          try:
+            self.debug("%s verifying sync" % prefix)
+            await self.ls4_sync_io.sync_verify(param_flag=True)
+          except Exception as e:
+            error_msg = "Exception verifying sync: %s" % e
+
+        if error_msg is not None:
+           for param in params:
+               self._param_cache.pop(param, None)
+           self.error("%s: %s" % (prefix,error_msg))
+           raise LS4ControllerError(f"Failed setting params {params}:  %s" % error_msg)
+
+        self._param_cache.update(params)
+        self.parameters.update(params)
+
+        return cmds
+
+    def _param_cached(self, param: str, value: int) -> bool:
+        """Returns True, and counts a hit, if ``param`` is known to be loaded
+           with ``value``. Otherwise counts a miss.
+        """
+
+        if param in self._param_cache and self._param_cache[param] == value and \
+               (param not in SELF_CLEARING_PARAMS or value == 0):
+            self.param_cache_hits += 1
+            return True
+
+        self.param_cache_misses += 1
+        return False
+
+    def invalidate_params(self, param: str | None = None):
+        """Marks ``param`` (or all parameters, if None) as dirty, so that the
+           next set_param writes it to the controller.
+        """
+
+        if param is None:
+            self._param_cache.clear()
+        else:
+            self._param_cache.pop(param.upper(), None)
+
     async def reset_window(self):
         """Resets the exposure window."""
 
@@ -2078,23 +2676,26 @@ class LS4Controller(LS4_Device):
         if hbin is None:
             hbin = self.current_window["hbin"]
 
+        params = {}
         if lines >= 0:
-            await self.set_param("Lines", lines)
+            params["Lines"] = lines
         else:
             warnings.warn("Lines value unknown. Did not set.", LS4UserWarning)
 
         if pixels >= 0:
-            await self.set_param("Pixels", pixels)
+            params["Pixels"] = pixels
         else:
             warnings.warn("Pixels value unknown. Did not set.", LS4UserWarning)
 
-        await self.set_param("Pixels", pixels)
-        await self.set_param("PreSkipLines", preskiplines)
-        await self.set_param("PostSkipLines", postskiplines)
-        await self.set_param("PreSkipPixels", preskippixels)
-        await self.set_param("PostSkipPixels", postskippixels)
-        await self.set_param("VerticalBinning", vbin)
-        await self.set_param("HorizontalBinning", hbin)
+        params.update({
+            "PreSkipLines": preskiplines,
+            "PostSkipLines": postskiplines,
+            "PreSkipPixels": preskippixels,
+            "PostSkipPixels": postskippixels,
+            "VerticalBinning": vbin,
+            "HorizontalBinning": hbin,
+        })
+        await self.set_params(params)
 
         linecount = (lines + overscanlines) // vbin
         pixelcount = (pixels + overscanpixels) // hbin
@@ -2129,11 +2730,41 @@ class LS4Controller(LS4_Device):
 
            Returns after the exposure completes.
            Abort will interrupt long integration with optional readout.
+
+           If the exposure was already staged with `arm_exposure` (same exposure
+           time and shutter setting), it is only triggered.
         """
 
-        #self.notifier(f"%s: preparing for exposure duration exposure {exposure_time} " % get_obsdate())
+        if not self.is_armed(exposure_time):
+            await self.arm_exposure(exposure_time)
 
-        CS = ControllerStatus
+        return await self.trigger()
+
+    def is_armed(self, exposure_time: float | None = None) -> bool:
+        """Returns True if an exposure is armed (of ``exposure_time`` sec, if given)
+           with the current shutter setting.
+        """
+
+        armed = self._armed
+        if armed is None or armed['shutter'] != self.shutter_enable:
+            return False
+        return exposure_time is None or armed['exptime'] == exposure_time
+
+    async def arm_exposure(
+        self,
+        exposure_time: float = 1
+    ):
+
+        """Stages an exposure of ``exposure_time`` seconds, so that `trigger` starts
+           it with a single ``RELEASETIMING``.
+
+           This resets the controller with the timing code held, and sets the
+           exposure parameters. The timing code stays held until the exposure is
+           triggered, so the idle function (clearing or flushing) does not run in
+           the meantime. Any later `reset` disarms the exposure.
+        """
+
+        #self.notifier(f"%s: preparing for exposure duration exposure {exposure_time} " % get_obsdate())
 
         if not await self.is_power_on():
             raise LS4ControllerError("Controller power is off.")
@@ -2159,15 +2790,44 @@ class LS4Controller(LS4_Device):
         self.debug(f"setting Exposures to 1")
         await self.set_param("Exposures", 1)
 
+        self._armed = {'exptime': exposure_time, 'shutter': self.shutter_enable,
+                       't_arm': time.time()}
+
+    async def trigger(self):
+
+        """Starts the armed exposure with ``RELEASETIMING``, sent at the same time
+           to all the synchronized controllers, and returns when it completes.
+
+           The time from arming to triggering is saved to the ``arm-lat`` header
+           keyword, and the time from triggering to the reply to ``RELEASETIMING``,
+           including the wait for the other synchronized controllers, to the
+           ``release-lat`` header keyword. Neither includes the opening of the
+           shutter, which the timing code starts after ``RELEASETIMING``.
+        """
+
+        CS = ControllerStatus
+
+        if self._armed is None:
+            raise LS4ControllerError("No exposure is armed.")
+
+        armed = self._armed
+        self._armed = None
+        exposure_time = armed['exptime']
+
         self.config['expose_params']['actexpt']=0.0
         self.config['expose_params']['read-per']=0.0
+        t_trigger = time.time()
         self.timing['expose'].start()
 
         self.debug(f"sending RELEASETIMING")
-        await self.send_command("RELEASETIMING")
+        await self._sync_release_timing()
+        t_released = time.time()
         self.debug(f"updating status to EXPOSING and READOUT_PENDING")
         self.update_status([CS.EXPOSING, CS.READOUT_PENDING])
 
+        self.config['expose_params']['arm-lat']=t_trigger - armed['t_arm']
+        self.config['expose_params']['release-lat']=t_released - t_trigger
+
         tm = time.gmtime()
         self.config['expose_params']['date-obs']=get_obsdate(tm)
         self.config['expose_params']['startobs']=get_obsdate(tm)
@@ -2221,6 +2881,39 @@ class LS4Controller(LS4_Device):
 
         return await update_state()
 
+    async def _sync_release_timing(self):
+        """Sends ``RELEASETIMING``. With synchronized controllers, the followers
+           write the command as soon as the leader is ready, and the leader writes
+           it right after them, so that all the timing codes start together.
+        """
+
+        cmd_str = "RELEASETIMING"
+        error_msg = None
+        cmd = None
+
+        if not self.ls4_sync_io.sync_flag:
+           cmd = self.send_command(cmd_str, timeout=1)
+        else:
+           try:
+             await self.ls4_sync_io.sync_prepare(command_args={'command_string':cmd_str})
+             if not self.ls4_sync_io.leader:
+                cmd = self.send_command(cmd_str, timeout=1)
+             await self.ls4_sync_io.sync_update(command_flag=True)
+             if self.ls4_sync_io.leader:
+                cmd = self.send_command(cmd_str, timeout=1)
+             await self.ls4_sync_io.sync_verify(command_flag=True)
+           except Exception as e:
+             error_msg = "Exception synchronizing %s: %s" % (cmd_str, e)
+
+        if cmd is not None:
+           await cmd
+           if error_msg is None and not cmd.succeeded():
+              error_msg = f"Failed sending {cmd_str} ({cmd.status.name})"
+
+        if error_msg is not None:
+           self.update_status(ControllerStatus.ERROR)
+           raise LS4ControllerError(error_msg)
+
     async def abort(self, readout: bool = True):
         """Aborts the current exposure.
 
@@ -2256,6 +2949,7 @@ class LS4Controller(LS4_Device):
         #delay: int = 0,
         wait_for: float | None = None,
         idle_after: bool = True,
+        progressive: bool = False,
     ):
         """Reads the detector into a buffer.
 
@@ -2263,6 +2957,11 @@ class LS4Controller(LS4_Device):
         state. If ``block``, blocks until the buffer has been fully written. Otherwise
         returns immediately. 
 
+        If ``progressive`` (and ``block``), the lines are fetched while they are
+        written, in bands of `FETCH_BAND_LINES` lines, and the last lines once the
+        buffer is complete. The next `.fetch` of the buffer waits for that fetch to
+        finish instead of fetching the buffer again.
+
         # not implemented in LS4 timing code
         A ``delay`` can be passed to slow down the readout by as
         many seconds (useful for creating photon transfer frames).
@@ -2292,6 +2991,7 @@ class LS4Controller(LS4_Device):
         await self.send_command("RELEASETIMING")
 
         self.timing['readout'].start()
+        self._t_readout = time.time()
         self.debug(f"update_status READING")
 
         if self.fake_controller:
@@ -2311,6 +3011,7 @@ class LS4Controller(LS4_Device):
 
         #self.update_status(ControllerStatus.READING, notify=False)
         self.update_status(ControllerStatus.READING)
+        self.readout_tracker.completed.clear()
 
         self.debug(f"update_status READOUT_PENDING")
 
@@ -2322,75 +3023,46 @@ class LS4Controller(LS4_Device):
         #max_wait = self.config["timeouts"]["readout_max"] + delay
         max_wait = self.config["timeouts"]["readout_max"] 
 
-        wait_for = wait_for or 3  # sec delay to ensure the new frame starts filling.
-        self.debug(f"sleeping {wait_for} sec to make sure readout has started")
-
-        await asyncio.sleep(wait_for)
-        waited = wait_for
-
-        t = time.time()
-        if self.fake_controller:
-          self.debug("updating read")
-          self.fake_control.update_read(t=t,waited = wait_for)
-          self.debug("getting frame")
-          frame= self.fake_control.get_frame()
-          self.debug("done getting frame")
-        else:
-          frame = await self.get_frame()
+        wait_for = wait_for or 3  # max time (sec) for the new frame to start filling.
 
-          #frame = await self.get_frame()
+        # Wait for the frame buffer to start filling, then follow the readout,
+        # polling FRAME densely only close to the predicted end (see
+        # ls4_readout_tracker.py).
+        t_start = time.time()
+        frame = await self.readout_tracker.wait_start(max_wait=wait_for)
        
         wbuf = frame["wbuf"]
         self.debug("reading out exposure to buffer %d" % wbuf)
         self.info("reading out exposure to buffer %d" % wbuf)
 
-
-        dt = 0.0
-        status_interval = 1.0
-        update_interval = 0.1
-
-        done = False
-        timeout = False
-        lines_read_prev = -1
-        t_start = time.time()
-        status_start = time.time()
-        while (not done) and (not timeout):
-           if waited > max_wait:
-              timeout = True
-           else:
-              # During readout, get_frame will timeout after max_wait sec and
-              # return None. Keep checking periodically to see when readout is complete.
-              if self.fake_controller:
-                frame = self.fake_control.get_frame()
-              else:
-                frame = await self.get_frame()
-
-              if frame[f"buf{wbuf}complete"] == 1:
-                 done=True
-           if not done:
-              if dt > status_interval:
-                 status_start = time.time()
-                 dt = 0.0
-                 pixels_read=frame[f"buf{wbuf}pixels"]
-                 lines_read=frame[f"buf{wbuf}lines"]
-                 w= int(waited)
-                 self.info(f"{w}: frame is not complete: {pixels_read} pixel {lines_read} lines")
-                 if lines_read <= lines_read_prev:
-                    self.error("ERROR reading out at lines_read = %d" % lines_read)
-                    timeout=True
-                 else:
-                    lines_read_prev = lines_read
-              await asyncio.sleep(update_interval)
-              t=time.time()
-              dt  = t - status_start
-              waited = t - t_start
-              if self.fake_controller:
-                 self.fake_control.update_read(t=t,waited=waited)
+        total_lines = frame.get(f"buf{wbuf}height") or self.current_window.get('linecount')
+
+        on_progress = None
+        progress_interval = None
+        if progressive and self.fake_controller:
+           self.debug("no progressive fetch from a fake controller")
+        elif progressive and frame[f"buf{wbuf}complete"] == 0:
+           self._start_prefetch(wbuf, frame)
+           on_progress = functools.partial(self._prefetch_progress, wbuf)
+           progress_interval = PROGRESSIVE_FETCH_POLL
+
+        frame, done = await self.readout_tracker.track(wbuf, total_lines,
+                                       max_wait=max_wait - (time.time() - t_start),
+                                       on_progress=on_progress,
+                                       progress_interval=progress_interval)
+        timeout = not done
+        if timeout and on_progress is not None:
+           self._cancel_prefetch()
+        self.debug("readout tracked with %d FRAME polls at %s lines/sec" %\
+                   (self.readout_tracker.polls, str(self.readout_tracker.rate)))
+
+        t=time.time()
+        waited = t - self._t_readout
 
         self.timing['readout'].end()
         self.config['expose_params']['read-per']=self.timing['readout'].period
         self.update_status(ControllerStatus.READING,'off')
-        self.update_status(ControllerStatus.FETCH_PENDING)
+        self._set_fetch_pending(wbuf)
 
         if done:
            self.debug("done reading out controller in %7.3f sec to buf %d" %\
@@ -2413,6 +3085,116 @@ class LS4Controller(LS4_Device):
 
         return wbuf
 
+    def _start_prefetch(self, buffer_no: int, frame_info: dict):
+        """Starts fetching buffer ``buffer_no`` while it is read out."""
+
+        self._cancel_prefetch()
+        self._prefetch_buffer = buffer_no
+        self._prefetch_lines = (0, False)
+        self._prefetch_event.clear()
+        self._prefetch_task = asyncio.create_task(self._prefetch(buffer_no, frame_info))
+
+    def _cancel_prefetch(self):
+        """Stops the progressive fetch, if any. Its host buffer is reclaimed by
+        the next fetch of the same controller buffer."""
+
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+        self._prefetch_task = None
+        self._prefetch_buffer = None
+
+    def _prefetch_progress(self, buffer_no: int, frame: dict):
+        """Passes the lines written to buffer ``buffer_no`` to the progressive fetch."""
+
+        self._prefetch_lines = (frame[f"buf{buffer_no}lines"],
+                                frame[f"buf{buffer_no}complete"] == 1)
+        self._prefetch_event.set()
+
+    async def _prefetch(self, buffer_no: int, frame_info: dict, band_lines: int = FETCH_BAND_LINES):
+        """Fetches the lines of buffer ``buffer_no`` as they are written.
+
+        Each time the readout reports at least ``band_lines`` new lines, the
+        blocks they fill are fetched. Once the buffer is complete, it is locked
+        and the remaining blocks are fetched. Returns the filled host buffer.
+
+        Each band is read by one ``FETCH`` into the binary reply buffer (see
+        `.set_binary_reply_size`), as by `.fetch`, and its payload is copied to
+        the host buffer, so no reply object is created per block. A band that
+        fails is not fetched again: the caller fetches the whole buffer.
+        """
+
+        width = frame_info[f"buf{buffer_no}width"]
+        height = frame_info[f"buf{buffer_no}height"]
+        bytes_per_pixel = 2 if frame_info[f"buf{buffer_no}sample"] == 0 else 4
+        line_bytes = width * bytes_per_pixel
+        n_blocks: int = int(numpy.ceil(height * line_bytes / LS4_BLOCK_SIZE))
+        band_blocks = max(1, (band_lines * line_bytes) // LS4_BLOCK_SIZE)
+        start_address = frame_info[f"buf{buffer_no}base"]
+
+        frame_buffer = await self._acquire_frame(buffer_no, n_blocks)
+
+        n_fetched = 0
+        n_fetches = 0
+        locked = False
+        try:
+            while n_fetched < n_blocks:
+                await self._prefetch_event.wait()
+                self._prefetch_event.clear()
+                lines, complete = self._prefetch_lines
+
+                # only the blocks holding lines already written are complete
+                if complete:
+                    n_ready = n_blocks
+                else:
+                    n_ready = min(n_blocks, (lines * line_bytes) // LS4_BLOCK_SIZE)
+                if n_ready - n_fetched < band_blocks and not complete:
+                    continue
+
+                if complete:
+                    await self.send_command(f"LOCK{buffer_no}", sync_flag=False)
+                    locked = True
+
+                await self._fetch_resumable(buffer_no, start_address + n_fetched * LS4_BLOCK_SIZE,
+                                            n_ready - n_fetched,
+                                            frame_buffer.data[n_fetched * LS4_BLOCK_SIZE:],
+                                            max_retries=0)
+                n_fetched = n_ready
+                n_fetches += 1
+        finally:
+            if locked:
+                await self.send_command("LOCK0", sync_flag=False)
+
+        self.debug("fetched buffer %d in %d steps during readout" % (buffer_no, n_fetches))
+        return frame_buffer
+
+    async def _take_prefetch(self, buffer_no: int):
+        """Returns the host buffer filled by the progressive fetch of buffer
+        ``buffer_no``, once it is done, or `None` if there is none or it failed."""
+
+        if self._prefetch_task is None or self._prefetch_buffer != buffer_no:
+            return None
+
+        task = self._prefetch_task
+        self._prefetch_task = None
+        self._prefetch_buffer = None
+
+        try:
+            return await asyncio.wait_for(task, MAX_FETCH_TIME)
+        except Exception as e:
+            self.warn("progressive fetch of buffer %d failed (%s). Fetching it again" %\
+                      (buffer_no, e))
+            return None
+
+    async def _readout_frame(self) -> dict[str, int]:
+        """Returns a fresh FRAME result while tracking a readout."""
+
+        if self.fake_controller:
+           t = time.time()
+           self.fake_control.update_read(t=t, waited=t - self._t_readout)
+           return self.fake_control.get_frame()
+
+        return await self.get_frame()
+
     @overload
     async def fetch(
         self,
@@ -2469,12 +3251,531 @@ class LS4Controller(LS4_Device):
             If ``return_buffer=True`` returns a tuple with the Numpy array and
             the buffer number.
 
+        The array is a view of the host buffer in `.frame_ring` for the fetched
+        controller buffer. Ownership of that buffer is handed off to the caller,
+        which must call `.release_frame` with the buffer number once the data
+        have been saved. Until then, the next fetch from the same controller
+        buffer waits.
+
         """
 
         self.timing['fetch'].start()
 
         #self.notifier("start fetching data from buffer %d" % buffer_no)
 
+        buffer_no, frame_info = await self._select_fetch_buffer(buffer_no, frame_info)
+        readout_no = self._fetch_pending.get(buffer_no)
+        self.fetch_retries = 0
+
+        width = frame_info[f"buf{buffer_no}width"]
+        height = frame_info[f"buf{buffer_no}height"]
+        bytes_per_pixel = 2 if frame_info[f"buf{buffer_no}sample"] == 0 else 4
+        n_bytes = width * height * bytes_per_pixel
+        n_blocks: int = int(numpy.ceil(n_bytes / LS4_BLOCK_SIZE))
+
+        # If the buffer was fetched while it was read out (readout with
+        # progressive=True), take the host buffer filled then.
+        frame_buffer = await self._take_prefetch(buffer_no)
+        prefetched = frame_buffer is not None
+        self.last_fetch_prefetched = prefetched
+        if prefetched:
+          self.info("exposure in buffer %d was fetched during readout" % buffer_no)
+        else:
+          # Take the host buffer for this controller buffer from the ring. This
+          # waits if the save stage still holds the previous frame.
+          frame_buffer = await self._acquire_frame(buffer_no, n_blocks)
+
+          self.update_status(ControllerStatus.FETCHING)
+          self.info("fetching exposure from  buffer %d" % buffer_no)
+
+          # Lock for reading
+          await self.send_command(f"LOCK{buffer_no}",sync_flag=False)
+
+          start_address = frame_info[f"buf{buffer_no}base"]
+
+          #self.info("buffer: %d  start_address: %x n_bytes: %d n_blocks: %d " % (buffer_no,start_address,n_bytes,n_blocks))
+
+          raw_offset = frame_info[f"buf{buffer_no}rawoffset"]
+          raw_blocks_per_line = frame_info[f"buf{buffer_no}rawblocks"]
+          raw_lines = frame_info[f"buf{buffer_no}rawlines"]
+          raw_n_bytes = raw_lines*raw_blocks_per_line*LS4_BLOCK_SIZE
+          raw_start_address = start_address+ raw_offset
+
+
+          if self.fake_controller:
+             cmd_string = f"FETCH{start_address:08X}{n_blocks:08X}"
+             self.debug("cmd_string = %s" % cmd_string)
+             await self.send_command(command_string=cmd_string, timeout=None,sync_flag=False)
+             # Unlock all
+             await self.send_command("LOCK0",sync_flag=False)
+          else:
+             # Read the blocks into the host buffer, fetching again the blocks
+             # still missing if the reply is cut short. If that fails, leave the
+             # buffer unlocked and the status as after a fetch: the readout is no
+             # longer pending, and the error goes to the caller.
+             try:
+                self.fetch_retries = await self._fetch_resumable(buffer_no, start_address,
+                                                                 n_blocks, frame_buffer.data)
+             except Exception:
+                self.update_status(ControllerStatus.FETCHING, mode = 'off')
+                self.timing['fetch'].end()
+                self._clear_fetch_pending(buffer_no, readout_no)
+                raise
+             finally:
+                # Unlock all
+                await self.send_command("LOCK0",sync_flag=False)
+
+          # The full read buffer probably contains some extra bytes to complete the 1024
+          # reply. We get only the bytes we know are part of the buffer.
+
+          if self.fake_controller:
+             fetch_time = self.fake_control.conf['fetch_time']
+             await asyncio.sleep(fetch_time)
+             fake_data = self.fake_control.buffers[buffer_no-1].view(numpy.uint8)
+             frame_buffer.data[0:n_bytes] = fake_data[0:n_bytes]
+
+        # Convert to uint16 array and reshape.
+        dtype = f"<u{bytes_per_pixel}"  # Buffer is little-endian
+        arr = frame_buffer.view(n_bytes, dtype=dtype, shape=(height, width))
+        self.frame_ring.hand_off(buffer_no)
+
+        # Turn off FETCHING bit
+        #self.update_status(ControllerStatus.IDLE)
+        self.update_status(ControllerStatus.FETCHING, mode = 'off')
+
+        self.timing['fetch'].end()
+        #self.info("time to fetch data : %7.3f sec" % self.timing['fetch'].period)
+
+        self._clear_fetch_pending(buffer_no, readout_no)
+
+        if self.fake_controller:
+          # Mark the buffer as fetched by setting completeness to False (i.e. empty)     
+          #self.info("setting current buffer (%d) to empty" % buffer_no)
+          self.fake_control.update_frame(buf_index=buffer_no,complete = False)
+
+        if return_buffer:
+            return (arr, buffer_no)
+
+        return arr
+
+    async def _fetch_resumable(self, buffer_no: int, start_address: int, n_blocks: int,
+                               data: numpy.ndarray, max_retries: int = FETCH_MAX_RETRIES,
+                               stall_time: float = FETCH_STALL_TIME) -> int:
+        """Reads ``n_blocks`` blocks from ``start_address`` into ``data``.
+
+        The blocks of a binary reply arrive in order, so the blocks received
+        when a reply is cut short are the first ones requested. If no block
+        arrives for ``stall_time`` sec, or the connection drops, the blocks
+        received are kept, the connection is re-opened, and a ``FETCH`` is
+        sent for the remaining blocks only. Raises `LS4ControllerError` after
+        ``max_retries`` retries, with the connection re-opened. Returns the
+        number of retries.
+        """
+
+        n_received = 0
+        retries = 0
+        while True:
+            n_missing = n_blocks - n_received
+            address = start_address + n_received * LS4_BLOCK_SIZE
+
+            # Set the expected length of binary buffer to read, including the prefixes.
+            self.set_binary_reply_size((LS4_BLOCK_SIZE + 4) * n_missing)
+            payload = self._binary_payload
+
+            cmd_string = f"FETCH{address:08X}{n_missing:08X}"
+            self.debug("cmd_string = %s" % cmd_string)
+            cmd = self.send_command(command_string=cmd_string, timeout=None, sync_flag=False)
+            error = await self._wait_binary_reply(cmd, stall_time)
+
+            # Copy the payload of the complete blocks, without their prefixes, to
+            # the host buffer.
+            n_new = n_missing if error is None else min(self._binary_blocks, n_missing)
+            blocks = data[n_received * LS4_BLOCK_SIZE : (n_received + n_new) * LS4_BLOCK_SIZE]
+            blocks.reshape(n_new, LS4_BLOCK_SIZE)[:] = payload[0:n_new]
+            n_received += n_new
+
+            if error is None:
+                return retries
+
+            retries += 1
+            if retries > max_retries:
+                # leave a connection without the rest of the reply, to unlock the
+                # buffer and query the controller
+                await self.reconnect()
+                raise LS4ControllerError(
+                    f"Failed fetching buffer {buffer_no} after {max_retries} retries: {error}"
+                )
+            self.warn("fetch of buffer %d: %s after %d of %d blocks. Fetching the rest again" %\
+                      (buffer_no, error, n_received, n_blocks))
+
+            await self.reconnect()
+            await self.send_command(f"LOCK{buffer_no}",sync_flag=False)
+
+    async def _wait_binary_reply(self, cmd: ArchonCommand, stall_time: float) -> str | None:
+        """Waits for the binary reply to ``cmd``.
+
+        Returns `None` once the reply is complete, or else the reason it is not:
+        the command failed, the connection closed, or no block arrived for
+        ``stall_time`` sec.
+        """
+
+        listener = self.data_listener if self._on_data_connection(cmd) else self.listener
+        n_blocks = 0
+        while True:
+            await asyncio.wait([cmd, listener], timeout=stall_time,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if cmd.done():
+                return None if cmd.succeeded() else f"FETCH {cmd.status.name}"
+            if listener.done():
+                return "connection closed"
+            if self._binary_blocks == n_blocks:
+                return f"no data for {stall_time} sec"
+            n_blocks = self._binary_blocks
+
+    async def reconnect(self):
+        """Closes the connection to the controller and opens a new one.
+
+        The replies to the commands still running are lost with the old
+        connection, so these commands are marked as failed. If the bulk-data
+        connection is open, only that connection, which carries the fetches,
+        is re-opened.
+        """
+
+        self.warn("reconnecting to controller %s" % self.name)
+        self.reconnects += 1
+
+        if self._data_client is not None:
+            commands = [command for command in self.__running_commands.values()
+                        if self._on_data_connection(command)]
+            await self._close_data_connection()
+            self._binary_reply = None
+            for command in commands:
+                if not command.done():
+                    command._mark_done(ArchonCommandStatus.FAILED)
+            await self._open_data_connection()
+            return
+
+        if self.listener is not None and not self.listener.done():
+            self.listener.cancel()
+            try:
+                await self.listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._binary_reply = None
+
+        for command in list(self.__running_commands.values()):
+            if not command.done():
+                command._mark_done(ArchonCommandStatus.FAILED)
+
+        if self._client is not None and self._client.writer is not None:
+            self._client.writer.close()
+
+        self._client = await self.ls4_open_connection()
+        self.listener = asyncio.create_task(self._listen())
+
+    async def fetch_bands(
+        self,
+        buffer_no: int = -1,
+        frame_info: dict | None = None,
+        band_lines: int = FETCH_BAND_LINES,
+    ) -> AsyncIterator[tuple[int, int, numpy.ndarray]]:
+        """Fetches a frame buffer, yielding bands of image lines as they arrive.
+
+        Unlike `.fetch`, which returns only once the full binary reply has been
+        read, this asynchronous generator yields each band of ``band_lines``
+        lines as soon as the 1028-byte blocks that hold it have been read by
+        `._listen`, so the caller can process the start of the frame while the
+        rest is still being transferred.
+
+        Parameters
+        ----------
+        buffer_no
+            The frame buffer number to read. Use ``-1`` to read the most recently
+            complete frame.
+        frame_info
+            The frame info used to choose the buffer. If `None`, it is queried.
+        band_lines
+            The number of lines in each band. The last band may be shorter.
+
+        Yields
+        ------
+        band
+            A tuple ``(y0, y1, data)`` where ``data`` is a Numpy array with the
+            lines ``y0`` to ``y1-1`` of the frame.
+
+        """
+
+        if band_lines < 1:
+            raise LS4ControllerError(f"Invalid number of band lines {band_lines}")
+
+        self.timing['fetch'].start()
+
+        buffer_no, frame_info = await self._select_fetch_buffer(buffer_no, frame_info)
+        readout_no = self._fetch_pending.get(buffer_no)
+
+        width = frame_info[f"buf{buffer_no}width"]
+        height = frame_info[f"buf{buffer_no}height"]
+        bytes_per_pixel = 2 if frame_info[f"buf{buffer_no}sample"] == 0 else 4
+        line_bytes = width * bytes_per_pixel
+        n_bytes = height * line_bytes
+        n_blocks: int = int(numpy.ceil(n_bytes / LS4_BLOCK_SIZE))
+        start_address = frame_info[f"buf{buffer_no}base"]
+        dtype = f"<u{bytes_per_pixel}"  # Buffer is little-endian
+
+        frame_buffer = await self._acquire_frame(buffer_no, n_blocks)
+
+        self.update_status(ControllerStatus.FETCHING)
+        self.info("streaming exposure from buffer %d" % buffer_no)
+
+        # Lock for reading
+        await self.send_command(f"LOCK{buffer_no}",sync_flag=False)
+
+        try:
+            if self.fake_controller:
+                fetch_time = self.fake_control.conf['fetch_time']
+                fake_data = self.fake_control.buffers[buffer_no-1].view(numpy.uint8)
+                for y0 in range(0, height, band_lines):
+                    y1 = min(y0 + band_lines, height)
+                    await asyncio.sleep(fetch_time * (y1 - y0) / height)
+                    band = slice(y0 * line_bytes, y1 * line_bytes)
+                    frame_buffer.data[band] = fake_data[band]
+                    yield (y0, y1, frame_buffer.data[band].view(dtype).reshape(y1 - y0, width))
+                self.frame_ring.hand_off(buffer_no)
+                return
+
+            # Set the expected length of binary buffer to read, including the
+            # prefixes.
+            self.set_binary_reply_size((LS4_BLOCK_SIZE + 4) * n_blocks)
+            payload = self._binary_payload
+            blocks = frame_buffer.data[0:n_blocks*LS4_BLOCK_SIZE].reshape(n_blocks, LS4_BLOCK_SIZE)
+
+            cmd_string = f"FETCH{start_address:08X}{n_blocks:08X}"
+            self.debug("cmd_string = %s" % cmd_string)
+            cmd: ArchonCommand = self.send_command(command_string=cmd_string, \
+                                   timeout=None,sync_flag=False)
+
+            # wake up if the command fails before all the blocks arrive
+            cmd.add_done_callback(lambda _: self._binary_event.set())
+
+            y0 = 0
+            while y0 < height:
+                y1 = min(y0 + band_lines, height)
+                self._binary_notify_at = int(numpy.ceil(y1 * line_bytes / LS4_BLOCK_SIZE))
+                while self._binary_blocks < self._binary_notify_at:
+                    if cmd.done():
+                        raise LS4ControllerError(
+                            f"Failed fetching buffer {buffer_no} ({cmd.status.name})"
+                        )
+                    try:
+                        await asyncio.wait_for(self._binary_event.wait(), MAX_FETCH_TIME)
+                    except asyncio.TimeoutError:
+                        raise LS4ControllerError(
+                            f"Timed out fetching lines {y0} to {y1} of buffer {buffer_no}"
+                        )
+                    self._binary_event.clear()
+
+                # copy the payload of the blocks holding this band, without
+                # prefixes, to the host buffer
+                b0 = (y0 * line_bytes) // LS4_BLOCK_SIZE
+                b1 = self._binary_notify_at
+                blocks[b0:b1] = payload[b0:b1]
+                band = frame_buffer.data[y0 * line_bytes : y1 * line_bytes].view(dtype)
+                yield (y0, y1, band.reshape(y1 - y0, width))
+                y0 = y1
+
+            await cmd
+            self.frame_ring.hand_off(buffer_no)
+
+        finally:
+            self._binary_notify_at = 0
+
+            # Unlock all
+            await self.send_command("LOCK0",sync_flag=False)
+
+            self.update_status(ControllerStatus.FETCHING, mode = 'off')
+            self.timing['fetch'].end()
+            self._clear_fetch_pending(buffer_no, readout_no)
+
+            if self.fake_controller:
+                self.fake_control.update_frame(buf_index=buffer_no,complete = False)
+
+    async def fetch_rects(
+        self,
+        rects: list[tuple[int, int, int, int]],
+        buffer_no: int = -1,
+        frame_info: dict | None = None,
+        window: int = FETCH_REGION_WINDOW,
+        merge_blocks: int = FETCH_REGION_MERGE_BLOCKS,
+    ) -> list[numpy.ndarray]:
+        """Fetches rectangular regions of a frame buffer.
+
+        Only the blocks holding the regions are transferred: each range of
+        blocks (see `.region_block_ranges`) is read by its own ``FETCH``, with
+        up to ``window`` of them in flight. This is much faster than `.fetch`
+        when only a few taps or lines are wanted, e.g. for focus or quick-look.
+
+        Parameters
+        ----------
+        rects
+            A list of ``(y0, y1, x0, x1)`` rectangles, in pixels of the frame
+            buffer image (lines ``y0`` to ``y1-1``, columns ``x0`` to ``x1-1``).
+        buffer_no
+            The frame buffer number to read. Use ``-1`` to read the most recently
+            complete frame.
+        frame_info
+            The frame info used to choose the buffer. If `None`, it is queried.
+
+        Returns
+        -------
+        data
+            A list with a Numpy array for each rectangle. The arrays are copies,
+            and the frame ring is not used.
+
+        """
+
+        buffer_no, frame_info = await self._select_fetch_buffer(buffer_no, frame_info)
+
+        width = frame_info[f"buf{buffer_no}width"]
+        height = frame_info[f"buf{buffer_no}height"]
+        bytes_per_pixel = 2 if frame_info[f"buf{buffer_no}sample"] == 0 else 4
+        start_address = frame_info[f"buf{buffer_no}base"]
+        dtype = f"<u{bytes_per_pixel}"  # Buffer is little-endian
+
+        for y0, y1, x0, x1 in rects:
+            if not (0 <= y0 < y1 <= height and 0 <= x0 < x1 <= width):
+                raise LS4ControllerError(
+                    f"Region {(y0, y1, x0, x1)} is outside the {height}x{width} frame"
+                )
+
+        ranges = region_block_ranges(rects, width, bytes_per_pixel, merge_blocks)
+
+        # the blocks of all the ranges are stored one range after the other
+        offsets = [0]
+        for b0, b1 in ranges:
+            offsets.append(offsets[-1] + (b1 - b0) * LS4_BLOCK_SIZE)
+        data = numpy.empty(offsets[-1], dtype=numpy.uint8)
+
+        self.update_status(ControllerStatus.FETCHING)
+        self.info("fetching %d regions of buffer %d: %d FETCH commands, %d of %d blocks" %\
+                  (len(rects), buffer_no, len(ranges), offsets[-1] // LS4_BLOCK_SIZE,
+                   -(-width * height * bytes_per_pixel // LS4_BLOCK_SIZE)))
+
+        # Lock for reading
+        await self.send_command(f"LOCK{buffer_no}",sync_flag=False)
+
+        try:
+            if self.fake_controller:
+                fake_data = self.fake_control.buffers[buffer_no-1].view(numpy.uint8)
+                for (b0, b1), offset in zip(ranges, offsets):
+                    n_bytes = min((b1 - b0) * LS4_BLOCK_SIZE, len(fake_data) - b0 * LS4_BLOCK_SIZE)
+                    data[offset : offset + n_bytes] = \
+                        fake_data[b0 * LS4_BLOCK_SIZE : b0 * LS4_BLOCK_SIZE + n_bytes]
+            else:
+                await self._fetch_ranges(start_address, ranges, offsets, data, window)
+        finally:
+            # Unlock all
+            await self.send_command("LOCK0",sync_flag=False)
+            self.update_status(ControllerStatus.FETCHING, mode = 'off')
+
+        # copy each line of each rectangle out of the range holding it
+        starts = [b0 * LS4_BLOCK_SIZE for b0, __ in ranges]
+        regions = []
+        for y0, y1, x0, x1 in rects:
+            region = numpy.empty((y1 - y0, x1 - x0), dtype=dtype)
+            line = region.view(numpy.uint8).reshape(y1 - y0, -1)
+            for y in range(y0, y1):
+                start = (y * width + x0) * bytes_per_pixel
+                index = bisect.bisect_right(starts, start) - 1
+                offset = offsets[index] + start - starts[index]
+                line[y - y0] = data[offset : offset + line.shape[1]]
+            regions.append(region)
+
+        return regions
+
+    async def _fetch_ranges(self, start_address: int, ranges: list[tuple[int, int]],
+                            offsets: list[int], data: numpy.ndarray, window: int):
+        """Reads ranges of blocks with one ``FETCH`` each, into ``data`` at ``offsets``."""
+
+        window = max(1, min(window, MAX_COMMAND_ID // 2))
+        slots = asyncio.Semaphore(window)
+        in_flight: set[ArchonCommand] = set()
+        failures: list[ArchonCommand] = []
+
+        def range_done(offset: int, cmd: ArchonCommand):
+            in_flight.discard(cmd)
+            if cmd.succeeded():
+                for n, reply in enumerate(cmd.replies):
+                    block = offset + n * LS4_BLOCK_SIZE
+                    data[block : block + LS4_BLOCK_SIZE] = \
+                        numpy.frombuffer(reply.reply, dtype=numpy.uint8)
+            else:
+                failures.append(cmd)
+            slots.release()
+
+        for (b0, b1), offset in zip(ranges, offsets):
+            await slots.acquire()
+            if len(failures) > 0:
+                break
+            address = start_address + b0 * LS4_BLOCK_SIZE
+            cmd = self.send_command(f"FETCH{address:08X}{b1 - b0:08X}",
+                                    expected_replies=b1 - b0, timeout=MAX_FETCH_TIME)
+            in_flight.add(cmd)
+            cmd.add_done_callback(functools.partial(range_done, offset))
+
+        if len(in_flight) > 0:
+            await asyncio.wait(list(in_flight))
+
+        if len(failures) > 0:
+            raise LS4ControllerError(
+                f"Failed fetching region: {failures[0].raw} ({failures[0].status.name})"
+            )
+
+    async def _acquire_frame(self, buffer_no: int, n_blocks: int):
+        """Takes the host buffer for ``buffer_no`` from the frame ring."""
+
+        try:
+            return await self.frame_ring.acquire(buffer_no, n_blocks * LS4_BLOCK_SIZE,
+                                                 timeout=MAX_FETCH_TIME)
+        except RuntimeError as e:
+            raise LS4ControllerError(f"Cannot fetch buffer {buffer_no}: {e}")
+
+    def release_frame(self, buffer_no: int):
+        """Returns the host buffer of a fetched frame to the frame ring.
+
+        Must be called by the save stage once it is done with the data returned
+        by `.fetch` or `.fetch_bands` for controller buffer ``buffer_no``.
+        """
+
+        self.frame_ring.release(buffer_no)
+
+    def _set_fetch_pending(self, buffer_no: int):
+        """Records a readout to ``buffer_no`` waiting to be fetched."""
+
+        self.readout_count += 1
+        self._fetch_pending[buffer_no] = self.readout_count
+        self.update_status(ControllerStatus.FETCH_PENDING)
+
+    def _clear_fetch_pending(self, buffer_no: int, readout_no: int | None):
+        """Clears the pending fetch of readout ``readout_no`` to ``buffer_no``.
+
+        A later readout to the same buffer stays pending. FETCH_PENDING is
+        turned off only once no readout is left to fetch.
+        """
+
+        if readout_no is not None and self._fetch_pending.get(buffer_no) == readout_no:
+            del self._fetch_pending[buffer_no]
+
+        if len(self._fetch_pending) == 0:
+            self.update_status(ControllerStatus.FETCH_PENDING,'off')
+
+    async def _select_fetch_buffer(self, buffer_no: int = -1, frame_info: dict | None = None):
+        """Checks that a fetch can start and chooses the frame buffer to read.
+
+        Returns a tuple with the buffer number and the frame info used to
+        choose it. A ``buffer_no`` of ``-1`` selects the most recently
+        completed buffer.
+        """
+
         if await self.is_fetching():
             raise LS4ControllerError("Controller is already fetching")
 
@@ -2510,98 +3811,72 @@ class LS4Controller(LS4_Device):
             if frame_info[f"buf{buffer_no}complete"] == 0:
                 raise LS4ControllerError(f"Buffer frame {buffer_no} cannot be read")
 
-        self.update_status(ControllerStatus.FETCHING)
-        self.info("fetching exposure from  buffer %d" % buffer_no)
-
-        # Lock for reading
-        await self.send_command(f"LOCK{buffer_no}",sync_flag=False)
-
-        width = frame_info[f"buf{buffer_no}width"]
-        height = frame_info[f"buf{buffer_no}height"]
-        bytes_per_pixel = 2 if frame_info[f"buf{buffer_no}sample"] == 0 else 4
-        n_bytes = width * height * bytes_per_pixel
-        n_blocks: int = int(numpy.ceil(n_bytes / LS4_BLOCK_SIZE))
+        return buffer_no, frame_info
 
-        start_address = frame_info[f"buf{buffer_no}base"]
-
-        #self.info("buffer: %d  start_address: %x n_bytes: %d n_blocks: %d " % (buffer_no,start_address,n_bytes,n_blocks))
-
-        raw_offset = frame_info[f"buf{buffer_no}rawoffset"]
-        raw_blocks_per_line = frame_info[f"buf{buffer_no}rawblocks"]
-        raw_lines = frame_info[f"buf{buffer_no}rawlines"]
-        raw_n_bytes = raw_lines*raw_blocks_per_line*LS4_BLOCK_SIZE
-        raw_start_address = start_address+ raw_offset
-
-
-        # Set the expected length of binary buffer to read, including the prefixes.
-        self.set_binary_reply_size((LS4_BLOCK_SIZE + 4) * n_blocks)
-
-        cmd_string = f"FETCH{start_address:08X}{n_blocks:08X}"
-        #self.notifier ("sending command [%s] with timout=None and sync_flag=False" % cmd_string)
-        #cmd: ArchonCommand = await self.send_command(
-        #   f"FETCH{start_address:08X}{n_blocks:08X}",
-        #   timeout=None,sync_flag=False
-        #
-        self.debug("cmd_string = %s" % cmd_string)
-        self.debug("fake = %s" % self.fake_controller)
-        #cmd: ArchonCommand = await self.send_command(command_string=cmd_string, \
-        #                           fake=self.fake_controller,timeout=None,sync_flag=False)
-        cmd: ArchonCommand = await self.send_command(command_string=cmd_string, \
-                                   timeout=None,sync_flag=False)
-        #self.notifier ("done sending command [%s] with timout=None and sync_flag=False" % cmd_string)
-
-        # Unlock all
-        await self.send_command("LOCK0",sync_flag=False)
-
-        # The full read buffer probably contains some extra bytes to complete the 1024
-        # reply. We get only the bytes we know are part of the buffer.
-
-        if self.fake_controller:
-           fetch_time = self.fake_control.conf['fetch_time']
-           await asyncio.sleep(fetch_time)
-           frame = cast(bytes, self.fake_control.buffers[buffer_no-1][0:n_bytes])
-        else:
-           frame = cast(bytes, cmd.replies[0].reply[0:n_bytes])
-
-
-        # Convert to uint16 array and reshape.
-        dtype = f"<u{bytes_per_pixel}"  # Buffer is little-endian
-        arr = numpy.frombuffer(frame, dtype=dtype)
-        arr = arr.reshape(height, width)
-
-        # Turn off FETCHING bit
-        #self.update_status(ControllerStatus.IDLE)
-        self.update_status(ControllerStatus.FETCHING, mode = 'off')
-
-        self.timing['fetch'].end()
-        #self.info("time to fetch data : %7.3f sec" % self.timing['fetch'].period)
+    def set_binary_reply_size(self, size: int):
+        """Sets the size of the binary buffers.
 
-        self.update_status(ControllerStatus.FETCH_PENDING,'off')
+        The binary reply is received in the reusable buffer of `.frame_ring`.
+        Also sets ``_binary_payload``, a (n_blocks, 1024) Numpy view of the
+        binary buffer that skips the ``<xx:`` prefix of each block.
+        """
 
-        if self.fake_controller:
-          # Mark the buffer as fetched by setting completeness to False (i.e. empty)     
-          #self.info("setting current buffer (%d) to empty" % buffer_no)
-          self.fake_control.update_frame(buf_index=buffer_no,complete = False)
+        self._binary_reply = self.frame_ring.receive_buffer(size)
+        self._binary_blocks = 0
 
-        if return_buffer:
-            return (arr, buffer_no)
+        blocks = numpy.frombuffer(self._binary_reply, dtype=numpy.uint8)
+        blocks = blocks.reshape(-1, LS4_BLOCK_SIZE + 4)
+        self._binary_payload = blocks[:, 4:]
 
-        return arr
+    async def _read_binary_reply(self, prefix: bytes, reader: asyncio.StreamReader):
+        """Reads the rest of a binary reply into the preallocated binary buffer.
 
-    def set_binary_reply_size(self, size: int):
-        """Sets the size of the binary buffers."""
+        ``prefix`` is the ``<xx:`` prefix of the first block, already read
+        by `._listen` from ``reader``. The stream is read in chunks as large as
+        the remaining reply, each one copied into place, so no object is
+        created per block.
+        """
 
-        self._binary_reply = bytearray(size)
+        block_size = LS4_BLOCK_SIZE + 4
+        size = len(self._binary_reply)
+
+        with memoryview(self._binary_reply) as view:
+            view[0:4] = prefix
+            n_binary = 4  # How many bytes of the binary reply have we read.
+            while n_binary < size:
+                chunk = await reader.read(size - n_binary)
+                if not chunk:
+                    raise asyncio.IncompleteReadError(bytes(view[:n_binary]), size)
+                view[n_binary : n_binary + len(chunk)] = chunk
+                n_binary += len(chunk)
+
+                # Let a streaming fetch know once the blocks it waits for are in.
+                self._binary_blocks = n_binary // block_size
+                if self._binary_notify_at and \
+                   self._binary_blocks >= self._binary_notify_at:
+                    self._binary_event.set()
+
+        blocks = numpy.frombuffer(self._binary_reply, dtype=numpy.uint8)
+        blocks = blocks.reshape(-1, block_size)
+        if not (numpy.all(blocks[:, 0] == ord(b"<")) and numpy.all(blocks[:, 3] == ord(b":"))):
+            self.warn("binary reply has corrupted block prefixes")
+
+    async def _listen(self, client=None):
+        """Listens to the reader stream and callbacks on message received.
+
+        ``client`` is the connection to listen to, by default the control
+        connection.
+        """
 
-    async def _listen(self):
-        """Listens to the reader stream and callbacks on message received."""
+        if client is None:
+            client = self._client
 
-        if not self._client:  # pragma: no cover
+        if not client:  # pragma: no cover
             raise RuntimeError("Connection is not open.")
 
-        assert self._client and self._client.reader
+        assert client and client.reader
+        reader = client.reader
 
-        n_binary = 0
         while True:
             # Max length of a reply is 1024 bytes for the message preceded by <xx:
             # We read the first four characters (the maximum length of a complete
@@ -2611,23 +3886,20 @@ class LS4Controller(LS4_Device):
             # marks the end of this message. In binary, if the response is < 1024
             # bytes, the remaining bytes are filled with NULL (0x00).
             try:
-                line = await self._client.reader.readexactly(4)
+                line = await reader.readexactly(4)
             except asyncio.IncompleteReadError:
                 return
 
             if line[-1] == ord(b"\n"):
                 pass
             elif line[-1] == ord(b":"):
-                line += await self._client.reader.readexactly(1024)
-                # If we know the length of the binary reply to expect, we set that
-                # slice of the bytearray and continue. We wait until all the buffer
-                # has been read before sending the notification. This is significantly
-                # more efficient because we don't create an ArchonCommandReply for each
-                # chunk of the binary reply. It is, however, necessary to know the
-                # exact size of the reply because there is nothing that we can parse
-                # to know a reply is the last one. Also, we don't want to keep appending
-                # to a bytes string. We need to allocate all the memory first with
-                # a bytearray or it's very inefficient.
+                # If we know the length of the binary reply to expect, we read the
+                # whole reply straight into the preallocated bytearray before sending
+                # the notification. This is significantly more efficient because we
+                # don't create an ArchonCommandReply, or even a bytes object, for each
+                # 1028-byte block of the binary reply. It is, however, necessary to
+                # know the exact size of the reply because there is nothing that we
+                # can parse to know a reply is the last one.
                 #
                 # NOTE: this assumes that once the binary reply begins, no other
                 # reply is going to arrive in the middle of it. I think that's unlikely,
@@ -2635,21 +3907,23 @@ class LS4Controller(LS4_Device):
                 # mind.
                 #
                 if self._binary_reply:
-                    self._binary_reply[n_binary : n_binary + 1028] = line
-                    n_binary += 1028  # How many bytes of the binary reply have we read.
-                    if n_binary == len(self._binary_reply):
-                        # This was the last chunk. Set line to the full reply and
-                        # reset the binary reply and counter.
-                        line = self._binary_reply
-                        self._binary_reply = None
-                        n_binary = 0
-                    else:
-                        # Skip notifying because the binary reply is still incomplete.
-                        continue
+                    try:
+                        await self._read_binary_reply(line, reader)
+                    except asyncio.IncompleteReadError:
+                        return
+
+                    # The data stay in the receive buffer of the frame ring, so
+                    # only the prefix is passed on to mark the command done.
+                    line = bytes(self._binary_reply[0:4])
+                    self._binary_reply = None
+                else:
+                    line += await reader.readexactly(1024)
             else:
-                line += await self._client.reader.readuntil(b"\n")
+                line += await reader.readuntil(b"\n")
 
-            self.notify(line)
+            # Route the reply here rather than through notify(), which would
+            # schedule a process_message task for each reply.
+            self.route_reply(line)
 
     def _get_id(self) -> int:
         """Returns an identifier from the pool."""
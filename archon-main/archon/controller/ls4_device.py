@@ -210,10 +210,15 @@ class LS4_Device(Device):
         await self._client.close()
 
 
-    async def ls4_open_connection(self, test = False, timeout_sec = None):
-        """Returns a TCP stream connection with a writer and reader """
+    async def ls4_open_connection(self, test = False, timeout_sec = None, local_addr = None):
+        """Returns a TCP stream connection with a writer and reader.
+           The connection is bound to local_addr (default: self.local_addr).
+        """
+
+        if local_addr is None:
+           local_addr = self.local_addr
 
-        client = LS4_TCPStreamClient(name=self.name,host=self.host, port=self.port, local_addr=self.local_addr)
+        client = LS4_TCPStreamClient(name=self.name,host=self.host, port=self.port, local_addr=local_addr)
 
         result = await client.open_connection(test = test, timeout_sec = timeout_sec)
         
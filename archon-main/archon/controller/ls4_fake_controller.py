@@ -185,15 +185,18 @@ class LS4_Fake_Control():
         #self.set_frame(frame_info=frame_info)
 
     def init_bufs(self,low=990,high=1010,size=1):
-        """ initialize each data buffer to random 8-bit integers i
-            in range low to high, length size 
+        """ initialize each data buffer to random 16-bit integers
+            in range low to high, length size bytes.
+
+            The fake buffers are only ever read, so the three of them share
+            one array of random data.
         """
 
-        
+        data = numpy.random.randint(low=low,high=high,\
+                                 size=int(size/2),dtype=numpy.uint16)
 
         for index in range(0,self.num_buffers):
-           self.buffers[index] = numpy.random.randint(low=low,high=high,\
-                                 size=int(size/2),dtype=numpy.uint16)
+           self.buffers[index] = data
 
     def update(self,bytes_per_pixel=None,amps_per_ccd=None,ccds_per_quad=None,data_type=None,\
                          pixelcount=None,linecount=None):
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_frame_ring.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Frame_Ring class.
+#
+# Each Archon controller has three frame buffers. An instance of LS4_Frame_Ring
+# keeps one preallocated, page-aligned Numpy buffer on the host for each of them,
+# plus one buffer to receive the raw binary FETCH replies. The buffers are
+# allocated on the first fetch and then reused for every exposure, rather than
+# allocating new arrays for each frame.
+#
+# A host buffer is owned by the fetch that fills it, and is then handed off to
+# whoever saves the data (usually LS4_Camera.save_image). It can not be filled
+# again until the save stage releases it.
+#
+################################
+
+from __future__ import annotations
+
+import asyncio
+import mmap
+
+import numpy
+
+from archon.controller.ls4_logger import LS4_Logger
+
+
+__all__ = ["LS4_Frame_Ring", "LS4_Frame_Buffer", "aligned_empty"]
+
+PAGE_SIZE = mmap.PAGESIZE
+
+# ownership states of a frame buffer
+FRAME_FREE = "free"
+FRAME_FETCH = "fetch"
+FRAME_SAVE = "save"
+
+
+def aligned_empty(n_bytes: int, alignment: int = PAGE_SIZE) -> numpy.ndarray:
+    """ return an uninitialized uint8 array of n_bytes starting on an alignment boundary """
+
+    raw = numpy.empty(n_bytes + alignment, dtype=numpy.uint8)
+    offset = (-raw.ctypes.data) % alignment
+    return raw[offset : offset + n_bytes]
+
+
+class LS4_Frame_Buffer():
+    """ host copy of one of the controller frame buffers """
+
+    def __init__(self, index: int):
+
+        self.index = index
+        self.data: numpy.ndarray | None = None
+        self.owner = FRAME_FREE
+        self.released = asyncio.Event()
+        self.released.set()
+
+    @property
+    def capacity(self):
+        return 0 if self.data is None else len(self.data)
+
+    def view(self, n_bytes: int, dtype: str = "<u2", shape: tuple | None = None):
+        """ return the first n_bytes of the buffer as an array of given dtype and shape """
+
+        arr = self.data[0:n_bytes].view(dtype)
+        if shape is not None:
+            arr = arr.reshape(shape)
+        return arr
+
+
+class LS4_Frame_Ring():
+    """ ring of preallocated host buffers mirroring the controller frame buffers """
+
+    def __init__(self, num_buffers: int = 3, ls4_logger: LS4_Logger | None = None):
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Frame_Ring")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.num_buffers = num_buffers
+        self.buffers = {n: LS4_Frame_Buffer(n) for n in range(1, num_buffers + 1)}
+
+        # buffer receiving the raw binary replies (with the block prefixes)
+        self._receive: numpy.ndarray | None = None
+
+        # number of (re)allocations, for diagnostics
+        self.allocations = 0
+
+    def receive_buffer(self, n_bytes: int) -> memoryview:
+        """ return a writable memoryview of n_bytes to receive a binary reply.
+            The underlying buffer only grows, so it is allocated once for a
+            given frame size.
+        """
+
+        if self._receive is None or len(self._receive) < n_bytes:
+           self.debug("allocating %d bytes for binary replies" % n_bytes)
+           self._receive = aligned_empty(n_bytes)
+           self.allocations += 1
+
+        return memoryview(self._receive)[0:n_bytes]
+
+    async def acquire(self, buffer_no: int, n_bytes: int, timeout: float | None = None):
+        """ take ownership of the host buffer for controller buffer buffer_no,
+            making sure it holds at least n_bytes. Wait up to timeout sec for the
+            save stage to release it. Raise RuntimeError on timeout.
+        """
+
+        assert buffer_no in self.buffers, "invalid frame buffer %s" % str(buffer_no)
+        frame_buffer = self.buffers[buffer_no]
+
+        # Only one fetch runs at a time on a controller, so a buffer still owned
+        # by the fetch stage was left behind by a failed fetch and is reclaimed.
+        if frame_buffer.owner == FRAME_SAVE:
+           self.debug("waiting for frame buffer %d to be released by %s stage" %\
+                      (buffer_no, frame_buffer.owner))
+           try:
+             await asyncio.wait_for(frame_buffer.released.wait(), timeout)
+           except asyncio.TimeoutError:
+             raise RuntimeError("frame buffer %d is still held by the %s stage" %\
+                      (buffer_no, frame_buffer.owner))
+
+        if frame_buffer.capacity < n_bytes:
+           self.debug("allocating %d bytes for frame buffer %d" % (n_bytes, buffer_no))
+           frame_buffer.data = aligned_empty(n_bytes)
+           self.allocations += 1
+
+        frame_buffer.owner = FRAME_FETCH
+        frame_buffer.released.clear()
+
+        return frame_buffer
+
+    def hand_off(self, buffer_no: int):
+        """ pass ownership of a filled buffer from the fetch to the save stage """
+
+        self.buffers[buffer_no].owner = FRAME_SAVE
+
+    def release(self, buffer_no: int):
+        """ return a buffer to the ring so it can be filled again """
+
+        frame_buffer = self.buffers[buffer_no]
+        frame_buffer.owner = FRAME_FREE
+        frame_buffer.released.set()
+
+    def owners(self):
+        """ return a dictionary with the owner of each buffer """
+
+        return {n: self.buffers[n].owner for n in self.buffers}
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_latency.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Latency class.
+#
+# Every ArchonCommand written to a controller is timestamped when it is
+# written and when it completes. An instance of LS4_Latency accumulates these
+# latencies in histograms with fixed buckets (LATENCY_BUCKETS), one for each
+# command type (FASTLOADPARAM, STATUS, FRAME, WCONFIG, FETCH...), and warns
+# of any command slower than the threshold for its type.
+#
+################################
+
+from __future__ import annotations
+
+import bisect
+
+from archon.controller.ls4_logger import LS4_Logger
+from archon.controller.ls4_params import LATENCY_BUCKETS, SLOW_COMMAND_TIME, \
+              SLOW_COMMAND_TIMES
+
+
+__all__ = ["LS4_Latency"]
+
+
+class LS4_Latency():
+    """ latency histograms of the commands of a controller, by command type """
+
+    def __init__(self,
+                 name: str = "",
+                 buckets: list[float] = LATENCY_BUCKETS,
+                 slow_time: float = SLOW_COMMAND_TIME,
+                 slow_times: dict[str, float] = SLOW_COMMAND_TIMES,
+                 ls4_logger: LS4_Logger | None = None):
+        """ buckets are the upper edges (sec) of the histogram buckets. A command
+            is slow if it takes longer than slow_times[command type], or
+            slow_time for the other types.
+        """
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Latency")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.name = name
+        self.buckets = list(buckets)
+        self.slow_time = slow_time
+        self.slow_times = dict(slow_times)
+        self.histograms: dict[str, dict] = {}
+
+    def reset(self):
+        """ clear the histograms """
+
+        self.histograms = {}
+
+    def record(self, command_type: str, latency: float, command: str | None = None):
+        """ add the latency (sec) of a command of the given type """
+
+        hist = self.histograms.get(command_type)
+        if hist is None:
+           hist = {"counts": [0] * (len(self.buckets) + 1), "n": 0, "total": 0.0,
+                   "max": 0.0, "slow": 0}
+           self.histograms[command_type] = hist
+
+        hist["counts"][bisect.bisect_left(self.buckets, latency)] += 1
+        hist["n"] += 1
+        hist["total"] += latency
+        if latency > hist["max"]:
+           hist["max"] = latency
+
+        if latency > self.slow_times.get(command_type, self.slow_time):
+           hist["slow"] += 1
+           self.warn("%s: slow command %s took %7.3f sec" %\
+                     (self.name, command or command_type, latency))
+
+    def percentile(self, command_type: str, q: float) -> float | None:
+        """ return an upper bound for the q-th percentile (0 to 100) of the
+            latencies of the command type: the upper edge of the bucket holding
+            it, or the maximum latency for the last bucket.
+        """
+
+        hist = self.histograms.get(command_type)
+        if hist is None or hist["n"] == 0:
+           return None
+
+        rank = q * hist["n"] / 100.0
+        count = 0
+        for index, n in enumerate(hist["counts"]):
+            count += n
+            if count >= rank and n > 0:
+               if index < len(self.buckets):
+                  return min(self.buckets[index], hist["max"])
+               break
+        return hist["max"]
+
+    def summary(self) -> dict:
+        """ return the histograms and statistics of each command type """
+
+        summary = {}
+        for command_type, hist in sorted(self.histograms.items()):
+            summary[command_type] = {
+               "n": hist["n"],
+               "mean": hist["total"] / hist["n"],
+               "p50": self.percentile(command_type, 50),
+               "p99": self.percentile(command_type, 99),
+               "max": hist["max"],
+               "slow": hist["slow"],
+               "counts": list(hist["counts"]),
+            }
+        return summary
@@ -49,3 +49,71 @@ REBOOT_TIME = 10
 
 #time (sec) for Vsub to stabalize after erase procedure completes
 POST_ERASE_DELAY = 1.0 
+
+# default number of image lines in each band yielded by a streaming fetch
+FETCH_BAND_LINES = 256
+
+# maximum number of WCONFIG commands in flight when writing a configuration file
+WRITE_CONFIG_WINDOW = 32
+
+# fetch of a region of a frame buffer (fetch_rects): ranges of blocks separated by
+# at most this many blocks are read by one FETCH, since sending a FETCH costs
+# about as much as transferring a few blocks
+FETCH_REGION_MERGE_BLOCKS = 2
+
+# maximum number of FETCH commands in flight when fetching a region of a frame buffer
+FETCH_REGION_WINDOW = 32
+
+# a fetch of a frame buffer is retried, for the blocks not yet received, if no block
+# arrives for FETCH_STALL_TIME sec or the connection drops, up to FETCH_MAX_RETRIES times
+FETCH_STALL_TIME = 2.0
+FETCH_MAX_RETRIES = 3
+
+# progressive fetch during a readout: longest interval (sec) between FRAME polls,
+# so that the lines written are fetched soon after the controller writes them
+PROGRESSIVE_FETCH_POLL = 0.1
+
+# commands sent on the bulk-data connection of a controller, when it is open. LOCK
+# goes with FETCH, so that a buffer is locked before it is fetched and unlocked after.
+DATA_CONNECTION_COMMANDS = ("FETCH", "LOCK")
+
+# cadence (sec) of the STATUS and FRAME telemetry polls. 0 disables polling.
+TELEMETRY_INTERVAL = 1.0
+
+# cadence (sec) of the SYSTEM telemetry poll
+TELEMETRY_SYSTEM_INTERVAL = 10.0
+
+# shortest and longest intervals (sec) between FRAME polls while tracking a readout
+READOUT_MIN_POLL = 0.01
+READOUT_MAX_POLL = 0.5
+
+# a readout is stalled if no lines are read for this long (sec)
+READOUT_STALL_TIME = 1.0
+
+# upper edges (sec) of the buckets of the command latency histograms. A last
+# bucket counts the latencies above the largest edge.
+LATENCY_BUCKETS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+                   1.0, 2.0, 5.0, 10.0, 30.0]
+
+# a command taking longer than this (sec) from write to completion is reported as slow
+SLOW_COMMAND_TIME = 1.0
+
+# slow-command thresholds (sec) of the command types expected to take longer
+SLOW_COMMAND_TIMES = {"FETCH": MAX_FETCH_TIME}
+
+# parameters the timing code clears (counts down to 0) by itself. A cached value
+# of one of these is only trusted when it is 0.
+SELF_CLEARING_PARAMS = ["EXPOSURES", "READOUT", "ABORTEXPOSURE", "DOFLUSH", "DOPURGE",
+                        "DOERASE", "WAITCOUNT"]
+
+# simulated Archon controller (ls4_archon_sim.py): time (sec) to read out a full frame
+SIM_READOUT_TIME = 5.0
+
+# simulated Archon controller: network bandwidth (bytes/sec) for fetched data,
+# network round-trip time (sec), and time (sec) to process one command
+SIM_BANDWIDTH = 100.0e6
+SIM_RTT = 0.0002
+SIM_SERVICE_TIME = 20.0e-6
+
+# simulated Archon controller: duration (sec) of a main-loop procedure (flush, purge, erase)
+SIM_PROCEDURE_TIME = 0.5
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_readout_tracker.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Readout_Tracker class.
+#
+# While the CCDs are read out to a controller frame buffer, the FRAME query
+# reports the number of lines written so far (buf{n}lines) and whether the
+# buffer is complete (buf{n}complete). Rather than polling FRAME at a fixed
+# rate, an instance of LS4_Readout_Tracker measures the line rate, predicts
+# when the readout will end, and sleeps until shortly before then. It polls
+# at a short interval only near the predicted end, and sets an asyncio Event
+# as soon as the buffer is complete.
+#
+# A caller following the lines as they are written (e.g. to fetch them during
+# the readout) passes an on_progress callback, called with each FRAME result,
+# and a progress_interval bounding the time between polls.
+#
+################################
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from archon.controller.ls4_logger import LS4_Logger
+from archon.controller.ls4_params import READOUT_MIN_POLL, READOUT_MAX_POLL, \
+              READOUT_STALL_TIME
+
+
+__all__ = ["LS4_Readout_Tracker"]
+
+
+class LS4_Readout_Tracker():
+    """ follow the readout of a frame buffer and predict its completion """
+
+    def __init__(self,
+                 get_frame: Callable[[], Awaitable[dict]],
+                 ls4_logger: LS4_Logger | None = None,
+                 min_interval: float = READOUT_MIN_POLL,
+                 max_interval: float = READOUT_MAX_POLL,
+                 stall_time: float = READOUT_STALL_TIME):
+        """ get_frame is a coroutine function returning a fresh FRAME result.
+            Polls are at least min_interval and at most max_interval sec apart.
+            The readout is stalled if no lines are read for stall_time sec.
+        """
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Readout_Tracker")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.get_frame = get_frame
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stall_time = stall_time
+
+        # set when the tracked buffer is complete, cleared when tracking starts
+        self.completed = asyncio.Event()
+
+        # measured line rate (lines/sec) and predicted end time (time.time())
+        # of the last readout, and the number of FRAME polls it took
+        self.rate: float | None = None
+        self.t_end: float | None = None
+        self.polls = 0
+
+    async def wait_start(self, max_wait: float) -> dict:
+        """ poll FRAME until the write buffer is filling (buf{wbuf}complete == 0),
+            for up to max_wait sec. Return the last FRAME result.
+        """
+
+        t_start = time.time()
+        while True:
+           frame = await self.get_frame()
+           wbuf = frame["wbuf"]
+           if frame[f"buf{wbuf}complete"] == 0:
+              self.debug("readout to buffer %d started after %7.3f sec" %\
+                         (wbuf, time.time() - t_start))
+              return frame
+           if time.time() - t_start > max_wait:
+              self.warn("buffer %d not filling after %7.3f sec" % (wbuf, max_wait))
+              return frame
+           await asyncio.sleep(self.min_interval * 5)
+
+    def next_interval(self, lines: int, total_lines: int | None, t: float) -> float:
+        """ return the time to sleep before the next poll, given the lines read
+            so far at time t.
+        """
+
+        if self.rate is None or self.rate <= 0 or not total_lines or lines >= total_lines:
+           return self.min_interval * 5
+
+        self.t_end = t + (total_lines - lines) / self.rate
+        remaining = self.t_end - time.time()
+
+        # wake up before the predicted end by a margin that allows for changes in
+        # the rate, then poll densely
+        margin = self.min_interval + 0.05 * remaining
+        return min(self.max_interval, max(self.min_interval, remaining - margin))
+
+    async def track(self, wbuf: int, total_lines: int | None, max_wait: float,
+                    status_interval: float = 1.0,
+                    on_progress: Callable[[dict], None] | None = None,
+                    progress_interval: float | None = None) -> tuple[dict | None, bool]:
+        """ follow the readout to buffer wbuf, which has total_lines lines (None if
+            unknown), for up to max_wait sec. Report progress every status_interval
+            sec. If on_progress is given, it is called with each FRAME result, and
+            polls are at most progress_interval sec apart. Return the last FRAME
+            result and True if the buffer is complete, False on timeout or if the
+            readout stalls once lines are being read.
+        """
+
+        self.completed.clear()
+        self.rate = None
+        self.t_end = None
+        self.polls = 0
+
+        t_start = time.time()
+        t_status = t_start
+        t_first = None
+        lines_first = 0
+        t_progress = t_start
+        lines_prev = -1
+        frame = None
+
+        while time.time() - t_start <= max_wait:
+           t_poll = time.time()
+           frame = await self.get_frame()
+           self.polls += 1
+           # the FRAME reply was generated between the request and the reply
+           t = 0.5 * (t_poll + time.time())
+
+           if on_progress is not None:
+              on_progress(frame)
+
+           if frame[f"buf{wbuf}complete"] == 1:
+              self.completed.set()
+              return frame, True
+
+           lines = frame[f"buf{wbuf}lines"]
+           if lines > lines_prev:
+              t_progress = t
+              if t_first is None and lines > 0:
+                 t_first = t
+                 lines_first = lines
+              elif t_first is not None and t > t_first:
+                 self.rate = (lines - lines_first) / (t - t_first)
+              lines_prev = lines
+           elif self.rate is not None and t - t_progress > self.stall_time:
+              # the stall clock runs from the first measured line rate, so the
+              # time before the first lines are written is not a stall
+              self.error("ERROR reading out at lines_read = %d" % lines)
+              return frame, False
+
+           if t - t_status > status_interval:
+              t_status = t
+              pixels = frame[f"buf{wbuf}pixels"]
+              self.info(f"{int(t - t_start)}: frame is not complete: {pixels} pixel {lines} lines")
+
+           interval = self.next_interval(lines, total_lines, t)
+           if progress_interval is not None:
+              interval = min(interval, progress_interval)
+           await asyncio.sleep(interval)
+
+        return frame, False
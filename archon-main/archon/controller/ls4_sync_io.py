@@ -151,7 +151,7 @@ class LS4_SyncIO():
            if param_flag:
              self.param_args[0]={}
              self.param_args[0].update(param_args)
-             if param_args['param'] in ["SYNCTEST","synctest","SYNC_TEST","sync_test"]:
+             if param_args.get('param') in ["SYNCTEST","synctest","SYNC_TEST","sync_test"]:
                 self.sync_test = True
            else:
              self.command_args[0]={}
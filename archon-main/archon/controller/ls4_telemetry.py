@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_telemetry.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Telemetry class.
+#
+# The STATUS, FRAME, and SYSTEM queries of an Archon controller are requested
+# by many callers (status requests, readout, fetch, exposure setup). An
+# instance of LS4_Telemetry issues each query on behalf of all of them, and
+# caches the parsed result with the time the query was sent. A caller asks
+# for a result no older than max_age sec. If the cached result is older, a
+# new query is sent, and concurrent callers share that one query.
+#
+# Optionally, a polling task keeps the cache fresh by sending each query at
+# its own cadence, so that most callers are served without a round trip to
+# the controller.
+#
+################################
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from archon.controller.ls4_logger import LS4_Logger
+
+
+__all__ = ["LS4_Telemetry"]
+
+
+class LS4_Telemetry():
+    """ cache of controller queries, with optional periodic polling """
+
+    def __init__(self,
+                 queries: dict[str, Callable[[], Awaitable[dict]]],
+                 intervals: dict[str, float] | None = None,
+                 paused: Callable[[], bool] | None = None,
+                 ls4_logger: LS4_Logger | None = None):
+        """ queries maps each query name to a coroutine function returning its
+            parsed result. intervals maps query names to their polling cadence
+            (sec). Queries with no cadence, or a cadence <= 0, are not polled.
+            The poller skips its queries while paused() is True.
+        """
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Telemetry")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.queries = queries
+        self.intervals = {name: t for name, t in (intervals or {}).items()
+                          if name in queries and t is not None and t > 0}
+        self.paused = paused
+
+        # name : (time the query was sent, parsed result)
+        self._cache: dict[str, tuple[float, dict]] = {}
+
+        # name : (time the query was sent, task) for queries awaiting a reply
+        self._pending: dict[str, tuple[float, asyncio.Task]] = {}
+
+        self._poll_task: asyncio.Task | None = None
+
+        # number of results served from the cache and from new queries
+        self.hits = {name: 0 for name in queries}
+        self.misses = {name: 0 for name in queries}
+
+    def max_age(self, name: str) -> float:
+        """ return the default max_age for a query: its polling cadence, or 0 """
+
+        return self.intervals.get(name, 0.0)
+
+    async def get(self, name: str, max_age: float | None = None) -> dict[str, Any]:
+        """ return a copy of the result of query name, sent no more than max_age
+            sec ago. If max_age is None, the polling cadence of the query is used.
+        """
+
+        if max_age is None:
+           max_age = self.max_age(name)
+
+        t_now = time.monotonic()
+
+        if name in self._cache:
+           t_sent, result = self._cache[name]
+           if t_now - t_sent <= max_age:
+              self.hits[name] += 1
+              return dict(result)
+
+        # share a query already in flight if it is recent enough
+        if name in self._pending and t_now - self._pending[name][0] <= max_age:
+           task = self._pending[name][1]
+        else:
+           task = self._send(name)
+
+        self.misses[name] += 1
+        return dict(await asyncio.shield(task))
+
+    def invalidate(self, name: str | None = None):
+        """ drop the cached result of query name, or of all queries if None """
+
+        if name is None:
+           self._cache.clear()
+        else:
+           self._cache.pop(name, None)
+
+    def age(self, name: str) -> float | None:
+        """ return the age (sec) of the cached result of query name, or None """
+
+        if name not in self._cache:
+           return None
+        return time.monotonic() - self._cache[name][0]
+
+    def _send(self, name: str) -> asyncio.Task:
+        """ start query name and return its task """
+
+        t_sent = time.monotonic()
+        task = asyncio.ensure_future(self._query(name, t_sent))
+        self._pending[name] = (t_sent, task)
+        return task
+
+    async def _query(self, name: str, t_sent: float) -> dict:
+
+        try:
+          result = await self.queries[name]()
+          if name not in self._cache or self._cache[name][0] < t_sent:
+             self._cache[name] = (t_sent, result)
+          return result
+        finally:
+          if name in self._pending and self._pending[name][0] == t_sent:
+             del self._pending[name]
+
+    def start(self):
+        """ start polling the queries that have a cadence """
+
+        if self._poll_task is None and len(self.intervals) > 0:
+           self.debug("polling telemetry %s" % str(self.intervals))
+           self._poll_task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        """ stop polling """
+
+        if self._poll_task is not None:
+           self._poll_task.cancel()
+           try:
+             await self._poll_task
+           except asyncio.CancelledError:
+             pass
+           self._poll_task = None
+
+    async def _poll(self):
+
+        # check several times per cadence so that polls are not late by a whole cadence
+        tick = min(self.intervals.values()) / 4
+        while True:
+           if self.paused is None or not self.paused():
+              for name, interval in self.intervals.items():
+                  age = self.age(name)
+                  if name in self._pending or (age is not None and age < interval):
+                     continue
+                  task = self._send(name)
+                  task.add_done_callback(self._poll_done)
+           await asyncio.sleep(tick)
+
+    def _poll_done(self, task: asyncio.Task):
+
+        if not task.cancelled() and task.exception() is not None:
+           self.warn("telemetry poll failed: %s" % task.exception())
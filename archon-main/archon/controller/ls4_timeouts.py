@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_timeouts.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Timeouts class.
+#
+# Each ArchonCommand sent with a timeout is timed out if no reply arrives
+# within the timeout, and the timeout restarts with each reply. Rather than
+# running one timer task per command, an instance of LS4_Timeouts keeps the
+# deadlines of all the commands in flight on a controller in a heap, with a
+# single loop.call_at callback scheduled at the earliest deadline.
+#
+# The current deadline of each command is kept on the command itself, so that
+# restarting a timeout on a reply, or cancelling it when the command is done,
+# is O(1): the heap entry is left in place, and when it comes due it is
+# dropped (cancelled) or pushed back at the new deadline (restarted). A
+# cancelled entry no longer references its command, so a done command and its
+# replies are not kept alive until its deadline would have passed.
+#
+################################
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+
+from archon.controller.ls4_logger import LS4_Logger
+
+
+__all__ = ["LS4_Timeouts"]
+
+
+class LS4_Timeouts():
+    """ deadlines of the in-flight commands of a controller """
+
+    def __init__(self, ls4_logger: LS4_Logger | None = None):
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Timeouts")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        # heap of [deadline, sequence number, command] entries. The deadline of an
+        # entry may be earlier than the current deadline of its command, and the
+        # command of a cancelled entry is None.
+        self._heap: list[list] = []
+        self._seq = itertools.count()
+
+        # the callback scheduled at the earliest deadline in the heap
+        self._handle: asyncio.TimerHandle | None = None
+        self._handle_time: float | None = None
+
+        # number of timed out commands by command type
+        self.counts: Counter[str] = Counter()
+
+    def arm(self, command, timeout: float):
+        """ start timing out command after timeout sec. When its deadline passes,
+            command._timeout() is called.
+        """
+
+        loop = asyncio.get_event_loop()
+        command._timeout_period = timeout
+        command._deadline = loop.time() + timeout
+        self._push(command)
+        self._schedule(loop)
+
+    def reset(self, command):
+        """ restart the timeout of command, after a reply """
+
+        if command._deadline is not None:
+           command._deadline = asyncio.get_event_loop().time() + command._timeout_period
+
+    def cancel(self, command):
+        """ stop timing out command, and drop the reference of its heap entry """
+
+        command._deadline = None
+        entry = command._timeout_entry
+        if entry is not None:
+           entry[2] = None
+           command._timeout_entry = None
+
+    def stop(self):
+        """ cancel the scheduled callback and forget all deadlines """
+
+        if self._handle is not None:
+           self._handle.cancel()
+        self._handle = None
+        self._handle_time = None
+        for __, __, command in self._heap:
+            if command is not None:
+               self.cancel(command)
+        self._heap.clear()
+
+    def pending(self) -> int:
+        """ return the number of commands being timed out """
+
+        return sum(1 for __, __, command in self._heap if command is not None)
+
+    def _push(self, command):
+        """ add an entry at the current deadline of command to the heap """
+
+        entry = [command._deadline, next(self._seq), command]
+        command._timeout_entry = entry
+        heapq.heappush(self._heap, entry)
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop):
+        """ schedule the callback at the earliest deadline in the heap """
+
+        if len(self._heap) == 0:
+           return
+
+        deadline = self._heap[0][0]
+        if self._handle_time is not None and self._handle_time <= deadline:
+           return
+
+        if self._handle is not None:
+           self._handle.cancel()
+        self._handle = loop.call_at(deadline, self._expire)
+        self._handle_time = deadline
+
+    def _expire(self):
+        """ time out the commands whose deadlines have passed """
+
+        loop = asyncio.get_event_loop()
+        self._handle = None
+        self._handle_time = None
+
+        now = loop.time()
+        expired = []
+        while len(self._heap) > 0 and self._heap[0][0] <= now:
+           __, __, command = heapq.heappop(self._heap)
+           if command is None:
+              continue
+           if command._deadline > now:
+              self._push(command)
+           else:
+              self.cancel(command)
+              expired.append(command)
+
+        self._schedule(loop)
+
+        for command in expired:
+            # the commands of fake controllers complete by timing out
+            if not command.fake_controller:
+               self.counts[command.command_type] += 1
+               self.debug("command %s timed out after %7.3f sec" %\
+                          (command.raw, command._timeout_period))
+            command._timeout()
@@ -1,5 +1,14 @@
 VOLTAGE_TOLERANCE = 0.20
 MAX_FETCH_TIME = 10.0
+MAX_FETCHES = 2 # fetches from different controllers running at once (0: no limit)
+FETCH_RATE_SMOOTHING = 0.3 # weight of each new measurement of a controller fetch rate
+FETCH_DEADLINE_MARGIN = 1.5 # safety factor on predicted fetch times
+FETCH_OVERWRITE_CYCLES = 2 # exposures read out before a fetched buffer may be overwritten
+FITS_WRITERS = 2 # threads writing FITS files, shared by all controllers
+SAVE_QUEUE_BYTES = 320*1024*1024 # bytes of fetched images waiting to be saved, per controller (about 2 images)
+FITS_MODE = "amp" # FITS files written: "amp" (one per amp), "controller" or "exposure" (one multi-extension file each)
+FITS_MODES = ["amp","controller","exposure"]
+MEF_PART_TIMEOUT = 60.0 # sec to wait for the other controllers to add their amps to an exposure file
 AMPS_PER_CCD = 2
 MAX_CCDS = 8
 DEFAULT_COMMAND_PORT = 6000 # socket port for all commands
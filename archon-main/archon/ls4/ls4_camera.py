@@ -22,24 +22,30 @@
 import numpy as np
 import sys
 import asyncio
+import copy
+import functools
+import os
 import archon
 #from archon import log
 #import logging
 from archon.controller.ls4_logger import LS4_Logger
 from archon.controller.ls4_controller import LS4Controller
 from archon.controller.ls4_controller import TimePeriod
-from archon.controller.maskbits import ArchonPower
+from archon.controller.maskbits import ArchonPower, ControllerStatus
 from archon.ls4.ls4_sync import LS4_Sync
 from archon.ls4.ls4_voltages import LS4_Voltages 
 from archon.ls4.ls4_header import LS4_Header 
 from archon.ls4.ls4_ccd_map import LS4_CCD_Map
-from astropy.io import fits
+from archon.ls4.ls4_fetch_scheduler import LS4_Fetch_Scheduler
+from archon.ls4.ls4_fits_writer import LS4_FITS_Writer
+from archon.ls4.ls4_save_queue import LS4_Save_Queue
 from archon.tools import get_obsdate
 import json
 import time
 import argparse
 
-from . import VOLTAGE_TOLERANCE, MAX_FETCH_TIME, AMPS_PER_CCD, MAX_CCDS, VSUB_BIAS_NAME
+from . import VOLTAGE_TOLERANCE, MAX_FETCH_TIME, AMPS_PER_CCD, MAX_CCDS, VSUB_BIAS_NAME, \
+              FETCH_OVERWRITE_CYCLES, FITS_WRITERS, SAVE_QUEUE_BYTES, FITS_MODE, FITS_MODES
 
 """
     Three header dictionaries (extra_info_header, acquire_header, fetch_header)
@@ -102,6 +108,8 @@ class LS4_Camera():
         param_args: list[dict] | None = None,
         command_args: list[dict] | None = None,
         fake: bool | None = None,
+        fetch_scheduler: LS4_Fetch_Scheduler | None = None,
+        fits_writer: LS4_FITS_Writer | None = None,
     ):
        
         """ ls4_conf is a dictionary with configuration variables for the instance of LS4_Camera.
@@ -115,6 +123,13 @@ class LS4_Camera():
             command_args is  also a list with one entry -- a dictionary to hold command arguments 
             for sync_send_command. It is set up as a list so that any changes to the dictionary
             contents are inherited by all threads sharing command_args
+
+            fetch_scheduler grants the fetches of all the cameras sharing the network
+            interface (see ls4_fetch_scheduler.py). If None, the fetches of this
+            camera are not limited.
+
+            fits_writer writes the FITS files of all the cameras in a pool of threads
+            (see ls4_fits_writer.py). If None, this camera has its own pool.
         """
 
         self.ls4_controller = None
@@ -227,6 +242,27 @@ class LS4_Camera():
         self.fetch_status={}
         self.fetch_system={}
 
+        # number of times blocks missing from the last fetch were fetched again
+        # (FETCHRTY in the image headers)
+        self.fetch_retries = 0
+
+        if fetch_scheduler is None:
+           fetch_scheduler = LS4_Fetch_Scheduler(max_fetches=0, ls4_logger=self.ls4_logger)
+        self.fetch_scheduler = fetch_scheduler
+
+        if fits_writer is None:
+           fits_writer = LS4_FITS_Writer(max_workers=self.ls4_conf.get('fits_writers',FITS_WRITERS),\
+                                         ls4_logger=self.ls4_logger)
+        self.fits_writer = fits_writer
+
+        # with write_behind, fetch_and_save queues the save of each fetched image
+        # here and returns (see ls4_save_queue.py)
+        self.save_queue = None
+        if self.ls4_conf.get('write_behind', False):
+           self.save_queue = LS4_Save_Queue(\
+                max_bytes=self.ls4_conf.get('save_queue_bytes',SAVE_QUEUE_BYTES),\
+                ls4_logger=self.ls4_logger)
+
     def set_lead(self, lead_flag: bool = False):
         self.leader = lead_flag
         self.prefix = "leader %s:" % self.name
@@ -518,6 +554,8 @@ class LS4_Camera():
                  idle_function =  self.ls4_conf['idle_function'],
                  acf_file = self.acf_conf_file,
                  amp_direction = self.ls4_conf['amp_direction'],
+                 telemetry_interval = self.ls4_conf.get('telemetry_interval'),
+                 data_connection = self.ls4_conf.get('data_connection', False),
                  notifier=self.notifier)
             self.debug("awaiting ac.start")
             await self.ls4_controller.start(reset=False)
@@ -682,36 +720,56 @@ class LS4_Camera():
 
         self.ls4_controller = None 
 
-    async def save_image(self,output_image=None, status=None, controller_config = None, system=None, ls4_conf = None, header = None):
+    async def save_image(self,output_image=None, status=None, controller_config = None, system=None, ls4_conf = None, header = None,\
+                         image_data = None, fetch_retries = None):
 
         """ save image data to fits files, updating fits headers with key/value pairs from status, 
             controller_config, status, ls4_conf, and header_info.
 
+            image_data and fetch_retries default to those of the last fetch.
+
+            With fits_mode "amp" (ls4_conf), each amp is saved to a file of its own
+            (output_image with the amp index appended). With "controller", the amps
+            are saved to the extensions of multi-extension file output_image, and
+            with "exposure", to the extensions of the file of the exposure, shared
+            with the other controllers (see exposure_image).
         """
 
+        fits_mode = self.ls4_conf.get('fits_mode',FITS_MODE)
+        if fits_mode not in FITS_MODES:
+           raise RuntimeError("fits_mode %s is not one of %s" % (fits_mode,FITS_MODES))
+
         self.timing['save'].start()
 
+        if image_data is None:
+          image_data = self.image_data
+
+        if fetch_retries is None:
+          fetch_retries = self.fetch_retries
+
+        # the header info saved for the fetch is used once. A queued save passes
+        # its own, and leaves that of the next fetch in place.
         if status is None:
           status={}
           status.update(self.fetch_status)
+          self.fetch_status={}
 
         if system is None:
           system={}
           system.update(self.fetch_system)
+          self.fetch_system={}
 
         if controller_config is None:
           config = {}
           config.update(self.fetch_config)
+          self.fetch_config={}
+        else:
+          config = controller_config
 
         if ls4_conf is None:
           ls4_conf={}
           ls4_conf.update(self.fetch_ls4_conf)
-
-
-        self.fetch_status={}
-        self.fetch_system={}
-        self.fetch_config={}
-        self.fetch_ls4_conf={}
+          self.fetch_ls4_conf={}
 
         # initialize header info common to all CCD sub-images
         image_index = 0
@@ -721,6 +779,7 @@ class LS4_Camera():
         await self.ls4_header.set_header_info(conf = config['archon'])
         await self.ls4_header.set_header_info(conf = status)
         await self.ls4_header.set_header_info(conf = system)
+        await self.ls4_header.set_header_info(conf = {'fetchrty': fetch_retries})
         if header is not None:
           self.debug("updating ls4_header with header_info")
           await self.ls4_header.set_header_info(conf = header)
@@ -735,45 +794,88 @@ class LS4_Camera():
           raise RuntimeError(error_msg)
 
         # for each amplifier of each ccd,  set info0 specific to the
-        # respective image data
+        # respective image data, and write it in the pool of the fits writer.
+        # The info common to all the amps is the primary header of a
+        # multi-extension file, or is rendered once to FITS cards shared by the
+        # amp files. Each amp adds the info of its amp only.
+
+        writes = []
+        primary_info = await self.ls4_header.get_header()
+        if fits_mode == "amp":
+          shared_cards = await self.fits_writer.render(primary_info)
+        else:
+          extensions = []
+
+        # the data of all the amps, as views of the frame buffer
+        try:
+          amp_data = self.ls4_ccd_map.get_amp_data(image_data)
+        except Exception as e:
+          raise RuntimeError("error extracting the amps from the image data: %s" % e)
 
         for ccd_location in self.ls4_ccd_map.ccd_map:
           for amp_index in range(0,amps_per_ccd):
             amp_selection = self.ls4_ccd_map.get_amp_selection(amp_index)
             if amp_selection is not None:
-                ccd_data_list = self._get_ccd_data(ccd_location=ccd_location,amp_selection=amp_selection)
-                ccd_data = ccd_data_list[0]
+                if (ccd_location,amp_selection) not in amp_data:
+                  raise RuntimeError("amp %s of ccd at location [%s] is not read out" %\
+                                     (amp_selection, ccd_location))
+                ccd_data = amp_data[(ccd_location,amp_selection)]
+
+                amp_info = self.ls4_header.get_amp_info(ls4_ccd_map = self.ls4_ccd_map,\
+                      ccd_location=ccd_location, amp_index = amp_index)
+                if amp_info is None:
+                  raise RuntimeError("no header info for ccd %s amp %d" % (ccd_location, amp_index))
+
+                if fits_mode != "amp":
+                  extname = "%s_%s" % (amp_info['CCD_LOC'].upper(),amp_info['AMP_NAME'])
+                  extensions.append((extname, ccd_data, amp_info))
+                  continue
+
                 image_name =  output_image.replace(".fits","")
                 image_name = image_name + "_%02d"%image_index + ".fits"
 
-                try:
-                  header_info= await self.ls4_header.set_header_info(ls4_ccd_map = self.ls4_ccd_map,\
-                        ccd_location=ccd_location, amp_index = amp_index)
-                  hdu = fits.PrimaryHDU(ccd_data)
-                  fits_header = hdu.header
-                  for k in header_info:
-                    key = k
-                    if len(key.rstrip())>8:
-                       key = "HIERARCH "+ key
-                   
-                    if isinstance(header_info[k],(float,)) and k in ["actexpt","read_per"]:
-                       header_info[k] = round(header_info[k],3)
-                    fits_header[key] = header_info[k]
-                except Exception as e:
-                    error_msg = "WARNING: Exception setting header info: %s" % e 
-                    raise RuntimeError(error_msg)
-
-                hdul = fits.HDUList([hdu])
-                hdul.writeto(image_name,overwrite=True)
-                hdul.close()
-                try:
-                  del hdu
-                except:
-                  pass
+                writes.append(self.fits_writer.write_cards(image_name, ccd_data, shared_cards, amp_info))
                 image_index += 1
 
+        if fits_mode == "exposure":
+          exposure_image = self.exposure_image(output_image)
+          if exposure_image != output_image:
+            writes.append(self.fits_writer.write_part(exposure_image,\
+                          self.ls4_conf.get('fits_part',0), self.ls4_conf.get('fits_parts',1),\
+                          primary_info, extensions))
+          else:
+            fits_mode = "controller"
+
+        if fits_mode == "controller":
+          writes.append(self.fits_writer.write_mef(output_image, primary_info, extensions))
+
+        # wait for all the files, even if one fails, since the data are views of
+        # the host frame buffer, which is released once saved
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        errors = [e for e in results if isinstance(e, Exception)]
+        if len(errors) > 0:
+           raise RuntimeError("%d of %d files not written: %s" % (len(errors), len(writes), errors[0]))
+
         self.timing['save'].end()
     
+    def exposure_image(self, output_image):
+        """ return the name of the file of the exposure saved by this controller to
+            output_image, with fits_mode "exposure": output_image with the image
+            prefix of the controller replaced by that of the exposure (fits_root in
+            ls4_conf, set by LS4_Control). Return output_image if it does not start
+            with the image prefix of the controller.
+        """
+
+        image_dir, image_file = os.path.split(output_image)
+        image_prefix = self.ls4_conf.get('image_prefix')
+        fits_root = self.ls4_conf.get('fits_root')
+        if image_prefix and fits_root is not None and image_file.startswith(image_prefix):
+           return os.path.join(image_dir, fits_root + image_file[len(image_prefix):])
+
+        self.warn("image %s is not named after image prefix %s, saving it to a file of its own" %\
+                  (output_image, image_prefix))
+        return output_image
+
     async def acquire(self,output_image=None,exptime=0.0, acquire=True, fetch=True, \
                         concurrent=False, save=True, enable_shutter=True, header=None):
 
@@ -866,19 +968,33 @@ class LS4_Camera():
               self.debug("%s: reading out CCD to controller memory" % get_obsdate())
               #0.1 sec is too short. causes timing errors
               wait_for = 1.0 # time (sec) to wait to allow buffer to start filling
+              # fetch the lines during the readout, unless a concurrent fetch of
+              # the previous exposure may be running
+              progressive = self.ls4_conf.get('progressive_fetch', False) and not concurrent
               try:
-                await self.ls4_controller.readout(wait_for=wait_for)
+                await self.ls4_controller.readout(wait_for=wait_for, progressive=progressive)
                 self.debug("%s: waited %7.3f sec for readout" %\
                      (get_obsdate(),self.ls4_controller.config['expose_params']['read-per']))
                 self.info("time to readout image: %7.3f sec" % self.timing['readout'].period)
               except Exception as e:
                 error_msg = "exception reading image to controller memory: %s" % e
 
+            # Stage the next exposure while the controller is idle, so that the next
+            # expose only has to trigger it. The idle function does not run until then.
+            if error_msg is None and self.ls4_conf.get('pre_arm', False):
+              try:
+                await self.ls4_controller.arm_exposure(exptime)
+                self.debug("armed next exposure of %7.3f sec" % exptime)
+              except Exception as e:
+                self.warn("unable to arm next exposure: %s" % e)
+
             # save current ls4_conf, config, system, and header info o be used for 
             # header when data are fetched
 
             self.fetch_ls4_conf.update(self.ls4_conf)
-            self.fetch_config.update(self.ls4_controller.config)
+            # the next exposure updates the nested expose_params of the controller
+            # config, possibly before these data are saved
+            self.fetch_config.update(copy.deepcopy(self.ls4_controller.config))
             self.fetch_system.update(system)
 
         if error_msg is None and fetch and await self.ls4_controller.is_fetch_pending():
@@ -896,10 +1012,16 @@ class LS4_Camera():
           # readout of the exposure has begun (wait_readout = True). Choose the wait option
           # depending on the exposure time. Fetching can occur during the exposure if the
           # exposure time is longer than the fetch time. Otherwise it can occur during
-          # the readout, which is always longer than the fetch time.
+          # the readout, which is always longer than the fetch time. The fetch time is
+          # predicted from the measured fetch rate, or MAX_FETCH_TIME until measured.
 
           elif not acquire:
-             if exptime > MAX_FETCH_TIME:
+             fetch_time = self.fetch_scheduler.predict(self.name)
+             if fetch_time is None:
+               fetch_time = MAX_FETCH_TIME
+             else:
+               fetch_time *= self.fetch_scheduler.margin
+             if exptime > fetch_time:
                wait_expose=True
                wait_readout=False
              else:
@@ -909,10 +1031,17 @@ class LS4_Camera():
 
           self.debug("%s: fetching previously acquired image with wait_expose, wait_readout = %d,%d" %\
                  (get_obsdate(),wait_expose,wait_readout))
+          # while concurrent exposures continue, the fetched buffer may be overwritten
+          # once FETCH_OVERWRITE_CYCLES more exposures have been read out
+          deadline = None
+          cycle = exptime + self.timing['readout'].period
+          if concurrent and self.timing['readout'].period > 0:
+            deadline = time.time() + FETCH_OVERWRITE_CYCLES * cycle
+
           try:
             await self.fetch_and_save(output_image=output_image,\
                         save=save,wait_expose=wait_expose,\
-                        wait_readout=wait_readout,header=header)
+                        wait_readout=wait_readout,header=header,deadline=deadline)
           except Exception as e:
             error_msg = "Exception fetching and saving data: %s" %e
 
@@ -924,7 +1053,7 @@ class LS4_Camera():
           
     async def fetch_and_save(self,output_image=None, status=None, config=None,system=None,\
               ls4_conf=None,save=True,wait_expose=False, wait_readout=False,\
-              max_wait = MAX_FETCH_TIME, header = None):
+              max_wait = MAX_FETCH_TIME, header = None, deadline = None):
 
         """
            Fetch data from last-written controller buffer and write to disk (if save = True).
@@ -932,14 +1061,30 @@ class LS4_Camera():
            If wait_expose is True, wait up to max_wait sec for next exposure to begin before
            reading out buffer. This is to make sure the the fetch occurs as a separate thread.
            The assumption here is that the fetch time is less than the exposure time.
+
+           The fetch waits for a slot from the fetch scheduler, which starts it by
+           deadline (time.time() value) at the latest.
         """      
 
         error_msg = None
         self.image_data = None
         wait_timeout = False
+        buffer_no = None
 
+        # take the header info of the exposure to fetch now. The readout of a
+        # concurrent exposure replaces it with its own before this one is saved.
         if status is None:
-           status = self.fetch_status
+           status = dict(self.fetch_status)
+           self.fetch_status={}
+        if system is None:
+           system = dict(self.fetch_system)
+           self.fetch_system={}
+        if config is None:
+           config = dict(self.fetch_config)
+           self.fetch_config={}
+        if ls4_conf is None:
+           ls4_conf = dict(self.fetch_ls4_conf)
+           self.fetch_ls4_conf={}
 
         if error_msg is None:
           try:
@@ -953,15 +1098,9 @@ class LS4_Camera():
           self.info("%s: waiting up to %7.3f sec for exposure to begin before fetching previous exposure" %\
                    (get_obsdate(),max_wait))
           t_start = time.time()
-          wait_timeout = False
-          dt = 0.0
-          while (not wait_timeout) and (not await self.ls4_controller.is_exposing()):
-          
-             if dt  > max_wait:
-                wait_timeout = True
-             else:
-                await asyncio.sleep(0.1)
-                dt += 0.1
+          wait_timeout = not await self.ls4_controller.wait_status(ControllerStatus.EXPOSING,\
+                                                                   max_wait=max_wait)
+          dt = time.time() - t_start
 
           if wait_timeout :
             self.warn("timeout waiting %7.3f sec for exposure to begin before fetching previous buffer" % max_wait)
@@ -974,15 +1113,9 @@ class LS4_Camera():
           self.debug("%s: waiting up to %7.3f sec for readout to begin before fetching previous exposure" %\
                    (get_obsdate(),max_wait))
           t_start = time.time()
-          wait_timeout = False
-          dt = 0.0
-          while (not wait_timeout) and (not await self.ls4_controller.is_reading()):
-          
-             if dt  > max_wait:
-                wait_timeout = True
-             else:
-                await asyncio.sleep(0.1)
-                dt += 0.1
+          wait_timeout = not await self.ls4_controller.wait_status(ControllerStatus.READING,\
+                                                                   max_wait=max_wait)
+          dt = time.time() - t_start
 
           if wait_timeout :
             self.warn("timeout waiting %7.3f sec for readout to begin before fetching previous buffer" % max_wait)
@@ -993,28 +1126,126 @@ class LS4_Camera():
         if error_msg is None:
           try:
             frame_info = status['frame']
-            self.image_data,buffer_no = await self.ls4_controller.fetch(return_buffer=True, frame_info=frame_info)
+            async with self.fetch_scheduler.slot(self.name, deadline=deadline):
+              self.image_data,buffer_no = await self.ls4_controller.fetch(return_buffer=True, frame_info=frame_info)
+            if not self.ls4_controller.last_fetch_prefetched:
+              self.fetch_scheduler.record_fetch(self.name, self.image_data.nbytes,\
+                                                self.timing['fetch'].period)
+            self.fetch_retries = self.ls4_controller.fetch_retries
             self.debug("image fetched from buffer %d" % buffer_no)
             self.info("time to fetch image: %7.3f sec" % self.timing['fetch'].period)
           except Exception as e:
             error_msg = "Exception fetching data: %s" %e
 
         
-        if error_msg is None and save:
+        if error_msg is None and save and self.save_queue is not None:
+          # queue the save with the header info of this exposure, and return. The
+          # host frame buffer is handed back once the image is saved.
+          self.info("queuing save of exposure to %s" % output_image)
+          save_image = functools.partial(self._save_queued, output_image=output_image,\
+                status=status, system=system, controller_config=config, ls4_conf=ls4_conf,\
+                header=header, image_data=self.image_data, fetch_retries=self.fetch_retries,\
+                buffer_no=buffer_no)
+          try:
+            await self.save_queue.put(output_image, self.image_data.nbytes, save_image)
+            buffer_no = None
+          except Exception as e:
+            error_msg = "Exception queuing save of exposure to %s: %s" % (output_image,e)
+
+        elif error_msg is None and save:
           self.info("saving exposure to %s" % output_image)
           try:
-            await self.save_image(output_image=output_image, header = header)
+            await self.save_image(output_image=output_image, status=status, system=system,\
+                     controller_config=config, ls4_conf=ls4_conf, header = header)
+            self.fetch_scheduler.record_save(self.name, self.timing['save'].period)
             self.debug("time to save exposure : %7.3f sec" % self.timing['save'].period)
           except Exception as e:
             error_msg = "Exception saving exposure to %s: %s" % (output_image,e)
 
+        # hand the host frame buffer back to the controller for the next fetch
+        if buffer_no is not None:
+          self.ls4_controller.release_frame(buffer_no)
         
         assert error_msg is None, error_msg
 
-    def _get_ccd_data(self,ccd_location=None,ccd_name=None,amp_selection=None):
+    async def _save_queued(self, output_image=None, buffer_no=None, **kwargs):
+        """ save an image queued by fetch_and_save, then release its frame buffer """
+
+        try:
+          await self.save_image(output_image=output_image, **kwargs)
+          self.fetch_scheduler.record_save(self.name, self.timing['save'].period)
+          self.debug("time to save exposure : %7.3f sec" % self.timing['save'].period)
+        finally:
+          self.ls4_controller.release_frame(buffer_no)
+
+    async def wait_saved(self, output_image):
+        """ wait for the queued save of output_image, if any. Raise an exception if
+            it failed.
+        """
+
+        if self.save_queue is not None:
+          await self.save_queue.wait_saved(output_image)
+
+    async def flush_saves(self):
+        """ wait for all the queued saves. Raise an exception if any of them failed. """
+
+        if self.save_queue is not None:
+          await self.save_queue.flush()
+
+    async def stop_saves(self):
+        """ wait for all the queued saves, then stop the save queue. Raise an
+            exception if any of them failed.
+        """
+
+        if self.save_queue is not None:
+          await self.save_queue.stop()
+
+    async def fetch_region(self,ccd_location=None,ccd_name=None,amp="BOTH",lines=None,\
+              buffer_no=-1):
+
+        """ fetch only the image data of one CCD, given its location ("A",...,"H") or
+            name, from the last-written (buffer_no=-1) or specified controller buffer.
+
+            amp is "LEFT", "RIGHT", or "BOTH". lines = (y0, y1) selects the image
+            lines y0 to y1-1 (default: all the lines).
+
+            Only the blocks of the frame buffer holding these data are transferred
+            (see LS4Controller.fetch_rects), so this is much faster than a full
+            fetch for focus, tap-offset tuning, or quick-look.
+
+            Return a numpy array of dimensions [lines:pixels], or [lines:2*pixels]
+            for both amps, with the taps side by side as in _get_ccd_data.
+        """      
+
+        error_msg = None
+        data = None
+
+        try:
+          assert self.ls4_controller is not None,"ERROR: controller has not been started"
+          assert self.ls4_ccd_map is not None,"ls4_ccd_map is not instantiated"
+          assert amp is not None and amp.upper() in ["LEFT","RIGHT","BOTH"],\
+                  "amp must be LEFT, RIGHT, or BOTH"
+          rects = self.ls4_ccd_map.get_region_rects(ccd_location=ccd_location,\
+                          ccd_name=ccd_name,amp_name=amp.upper(),lines=lines)
+        except Exception as e:
+          error_msg = "failed to get region for ccd_location %s ccd_name %s amp %s: %s" %\
+                      (ccd_location,ccd_name,amp,e)
+
+        if error_msg is None:
+          try:
+            regions = await self.ls4_controller.fetch_rects(rects,buffer_no=buffer_no)
+            data = np.concatenate(regions,axis=1)
+          except Exception as e:
+            error_msg = "Exception fetching region: %s" %e
+
+        assert error_msg is None, error_msg
+        return data
+
+    def _get_ccd_data(self,ccd_location=None,ccd_name=None,amp_selection=None,image_data=None):
 
         """ return a list of 2-D numpy arrays with image data for a specifed ccd name or location.
-            The data are extracted from the data buffer fetched from the controller.
+            The data are extracted from the data buffer fetched from the controller
+            (image_data, by default the last one fetched).
 
             ccd_name is the serial number of the ccd (e.g."S-196")
             ccd_location is the slot in the LS4 mother board ("A","B",...,"H")
@@ -1022,123 +1253,48 @@ class LS4_Camera():
 
             For a given ccd, the location of the corresponding image data within the 
             frame buffer depends on the corresponding tap_indices recorded
-            in ccd_map and the data storage mode ("top", "bottom" or "split") 
+            in ccd_map and the data storage mode ("top" or "split"). LS4_CCD_Map
+            computes it once, when the ccd map is updated (see LS4_CCD_Map.get_layout).
 
             Each amp of each CCD yields a sub-image with row length = "pixels" and
-            number of rows = "lines".
-
-            If only one tap is selected, then the returned data is a numpy array of
-            dimensions [lines:pixels].
-            If 2/2 taps are selected, the dimension is [lines:2*pixels].
+            number of rows = "lines", which is a view of the data buffer.
 
-            Large number of taps per ccd are not supported.
+            One array is returned for each selected amp, in the order of the taps.
         """
 
-        ccd_data = None
-
+        if image_data is None:
+          image_data = self.image_data
 
         try:
-
           assert self.ls4_ccd_map is not None,\
                   "ls4_ccd_map is not instantiated"
-          assert self.ls4_ccd_map.image_info is not None,\
-                  "ls4_ccd_map.image_info is not instantiated"
-          assert 'num_ccds' in self.ls4_ccd_map.image_info,\
-                  "num_ccds not a member of ls4_ccd_map.image_info"
-          assert 'num_taps' in self.ls4_ccd_map.image_info,\
-                  "num_taps not a member of ls4_ccd_map.image_info"
-          assert 'num_lines' in self.ls4_ccd_map.image_info,\
-                  "lines not a member of ls4_ccd_map.image_info"
-          assert 'num_pixels' in self.ls4_ccd_map.image_info,\
-                  "pixels not a member of ls4_ccd_map.image_info"
-          assert 'amps_per_ccd' in self.ls4_ccd_map.image_info,\
-                  "amps_per_ccd  not a member of ls4_ccd_map.image_info"
-        except Exception as e:
-          raise ValueError(e)
-
-        num_taps = self.ls4_ccd_map.image_info['num_taps']
-        num_ccds = self.ls4_ccd_map.image_info['num_ccds']
-        num_pixels = self.ls4_ccd_map.image_info['num_pixels']
-        num_lines = self.ls4_ccd_map.image_info['num_lines']
-        amps_per_ccd = self.ls4_ccd_map.image_info['amps_per_ccd']
-
-        try:
+          assert self.ls4_ccd_map.layout is not None,\
+                  "layout of frame buffer is not known (frame mode %s)" %\
+                  self.ls4_ccd_map.image_info.get('frame_mode')
           assert  (ccd_location is not None) or (ccd_name is not None),\
                   "unspecified values for ccd_location and ccd_name"
           assert  amp_selection is not None, "unspecified amp selection"
-
           assert  amp_selection.upper() in ["LEFT","RIGHT","BOTH"],\
                   "tap number must be in LEFT, RIGHT, or BOTH"
-
-          assert  num_ccds in range(1,9),\
-                    "number of taps must be 1 to 8, not %d" % num_ccds
-
-          self.debug("num_ccds: %d  amps_per_ccd: %d" % (num_ccds,amps_per_ccd))
-
-          exp_num_taps = num_ccds*amps_per_ccd
-          assert  num_taps == num_ccds * amps_per_ccd,\
-            "number of taps expected to be %d, not %d" % (exp_num_taps,num_taps)
         except Exception as e:
           raise ValueError(e)
 
-        # retrieve the tap indices for this ccd.
-        tap_indices =  None
-        try:
-           tap_indices = self.ls4_ccd_map.get_tap_indices(ccd_location=ccd_location,\
-                   ccd_name = ccd_name, amp_name = amp_selection)
-        except Exception as e:
-           self.error("exception getting  tap indices for ccd_name %s or ccd_location %s: %s" %\
-                   (ccd_name, ccd_location,e))
-           raise RuntimeError(e)
-         
-        if tap_indices is None:
+        if ccd_location is None:
+           for location in self.ls4_ccd_map.ccd_map:
+              if self.ls4_ccd_map.ccd_map[location].get("CCD_NAME") == ccd_name.upper():
+                 ccd_location = location
+
+        if ccd_location not in self.ls4_ccd_map.ccd_map:
            raise RuntimeError("tap indices for ccd at location [%s] with name [%s] are unknown" %\
                        (ccd_location, ccd_name))
 
-        framemode_int = int(self.ls4_ccd_map.acf_conf["CONFIG"]["FRAMEMODE"])
-        if framemode_int == 0:
-            framemode = "top"
-        elif framemode_int == 1:
-            framemode = "bottom"
-        else:
-            framemode = "split"
-
-
-        if framemode == "top":
-            # Each row of the image corresponds is one long row composed of the corresponding rows of 
-            # the sub-images, all stacked together (the total row length is num_ccds*num_taps*num_pixels).
-            # The number of rows is the same as the number of rows of each sub image.
-
-            ccd_data = []
-            for tap_index in tap_indices:
-              x0 = tap_index * num_pixels
-              x1 = x0 +  num_pixels
-              y0 = 0
-              y1 = y0 + num_lines
-              ccd_data.append(self.image_data[y0:y1, x0:x1])
-
-
-        elif framemode == "split":
-            # The image is constructed of n blocks, where n is the number of amps per ccd.
-            # Each block, i, is constructed like a "top-mode" image, but only from the 
-            # i-th amplifier of each CCD (with only 2 amps per ccd, there two blocks -- one for
-            # the left amp, the other for the right amp).
-            # These blocks are stacked on top of each other.
-            # Each row has length num_ccds * pixels and the number of rows is num_ccds * num_taps
-
-
-            ccd_data = []
-            j = 0
-            for  tap_index in tap_indices:
-              x0 = (tap_index // num_taps) * num_pixels
-              x1 = x0 +  num_pixels
-              y0 + num_lines * j
-              y1 = y0 + num_lines
-              ccd_data.append(self.image_data[y0:y1, x0:x1])
-              j += 1
-
-
-        else:
-            raise ValueError(f"Framemode {framemode} is not supported at this time.")
+        amp_names = self.ls4_ccd_map.ccd_map[ccd_location].get("AMP_NAMES",[])
+        if amp_selection.upper() != "BOTH":
+           amp_names = [amp_name for amp_name in amp_names if amp_name == amp_selection.upper()]
+        if len(amp_names) == 0:
+           raise RuntimeError("amp %s of ccd at location [%s] is not read out" %\
+                       (amp_selection, ccd_location))
 
-        return ccd_data
+        keys = [(ccd_location,amp_name) for amp_name in amp_names]
+        amp_data = self.ls4_ccd_map.get_amp_data(image_data,keys=keys)
+        return [amp_data[key] for key in keys]
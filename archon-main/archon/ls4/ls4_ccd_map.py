@@ -172,6 +172,10 @@ class LS4_CCD_Map():
         # filled in by update_ccd_map()
         self.image_info={}
 
+        # where the data of each amp are in the frame buffer, filled in by update()
+        # (see get_layout)
+        self.layout=None
+
         self.debug("loading ccd map file %s" % ls4_conf['map_file'])
         try: 
            self.load_ccd_map(upper_flag=True)
@@ -396,6 +400,10 @@ class LS4_CCD_Map():
  
         self.image_info['num_ccds'] = len(self.ccd_map)
 
+        # precompute where the data of each amp are in the frame buffer, so that
+        # the amps of each fetched image are views found by look up.
+        self.layout = self.get_layout()
+
     def get_image_info(self):
         return self.image_info
 
@@ -510,6 +518,146 @@ class LS4_CCD_Map():
            return [data[1]]
 
 
+    def get_region_rects(self,ccd_name=None,ccd_location=None,amp_name=None,lines=None):
+
+        """ given ccd name or location, return the rectangles (y0, y1, x0, x1) of the
+            frame buffer image holding the image lines lines[0] to lines[1]-1 (all the
+            lines if lines is None) of the specified amps (LEFT, RIGHT, or BOTH).
+
+            In "top" mode, tap i fills columns i*num_pixels to (i+1)*num_pixels-1 of
+            every line, so the taps of a CCD, which are read out one after the
+            other, give one rectangle. In "split" mode, amp j of CCD i fills
+            columns i*num_pixels to (i+1)*num_pixels-1 of the j-th block of
+            num_lines lines.
+        """
+
+        num_lines = self.image_info['num_lines']
+        frame_mode = self.image_info['frame_mode']
+
+        if lines is None:
+           lines = (0, num_lines)
+        y0, y1 = lines
+        assert 0 <= y0 < y1 <= num_lines, \
+           "lines %s out of range 0 to %d" % (str(lines),num_lines)
+
+        assert frame_mode in [0,2], "frame mode %d is not supported" % frame_mode
+
+        tap_indices = self.get_tap_indices(ccd_name=ccd_name,ccd_location=ccd_location,\
+                          amp_name=amp_name)
+
+        rects = []
+        for tap_index in sorted(tap_indices):
+           rect = self._tap_rect(tap_index, lines)
+           if frame_mode == 0 and len(rects) > 0 and rects[-1][3] == rect[2]:
+              rects[-1] = (y0, y1, rects[-1][2], rect[3])
+           else:
+              rects.append(rect)
+
+        return rects
+
+    def _tap_rect(self,tap_index,lines):
+
+        """ return the rectangle (y0, y1, x0, x1) of the frame buffer holding image
+            lines lines[0] to lines[1]-1 of tap tap_index (see get_region_rects)
+        """
+
+        num_pixels = self.image_info['num_pixels']
+        num_lines = self.image_info['num_lines']
+        y0, y1 = lines
+
+        if self.image_info['frame_mode'] == 0:
+           x0 = tap_index * num_pixels
+           return (y0, y1, x0, x0 + num_pixels)
+
+        x0 = (tap_index // self.amps_per_ccd) * num_pixels
+        line0 = (tap_index % self.amps_per_ccd) * num_lines
+        return (line0 + y0, line0 + y1, x0, x0 + num_pixels)
+
+    def get_layout(self):
+
+        """ return the plan of the frame buffer, computed from image_info and
+            ccd_map once they are updated, or None if the frame mode is not
+            supported:
+
+              {"FRAME_MODE":frame_mode, "SHAPE":(lines,columns) of the frame buffer,
+               "TAP_SHAPE":shape, "TAP_AXES":axes,
+               "AMPS":{(ccd_location,amp_name):{"TAP_INDEX":tap_index,
+                                                "RECT":(y0,y1,x0,x1),"INDEX":index}}}
+
+            The frame buffer reshaped to TAP_SHAPE and transposed to TAP_AXES is
+            an array of the taps, with no copy, in which INDEX selects the data of
+            an amp (see get_amp_data).
+
+            In "top" mode, the taps are side by side, so the buffer is split into
+            [tap][line][pixel]. In "split" mode, amp j of CCD i is in columns
+            i*num_pixels to (i+1)*num_pixels-1 of the j-th block of lines, so the
+            buffer is split into [ccd][amp][line][pixel].
+        """
+
+        frame_mode = self.image_info['frame_mode']
+        if frame_mode not in [0,2]:
+           self.warn("frame mode %d is not supported, the amps can not be extracted" % frame_mode)
+           return None
+
+        num_taps = self.image_info['num_taps']
+        num_pixels = self.image_info['num_pixels']
+        num_lines = self.image_info['num_lines']
+        amps_per_ccd = self.amps_per_ccd
+
+        if frame_mode == 0:
+           shape = (num_lines, num_taps * num_pixels)
+           tap_shape = (num_lines, num_taps, num_pixels)
+           tap_axes = (1, 0, 2)
+        else:
+           num_blocks = num_taps // amps_per_ccd
+           shape = (amps_per_ccd * num_lines, num_blocks * num_pixels)
+           tap_shape = (amps_per_ccd, num_lines, num_blocks, num_pixels)
+           tap_axes = (2, 0, 1, 3)
+
+        amps = {}
+        for location in self.ccd_map:
+           ccd_info = self.ccd_map[location]
+           for amp_name, tap_index in zip(ccd_info["AMP_NAMES"],ccd_info["TAP_INDICES"]):
+              if frame_mode == 0:
+                 index = (tap_index,)
+              else:
+                 index = (tap_index // amps_per_ccd, tap_index % amps_per_ccd)
+              amps[(location,amp_name)] = {"TAP_INDEX":tap_index,\
+                   "RECT":self._tap_rect(tap_index,(0,num_lines)),"INDEX":index}
+
+        return {"FRAME_MODE":frame_mode, "SHAPE":shape, "TAP_SHAPE":tap_shape,\
+                "TAP_AXES":tap_axes, "AMPS":amps}
+
+    def get_amp_data(self,image_data,keys=None):
+
+        """ return a dictionary of the data of each amp in frame buffer image_data,
+            by (ccd_location, amp_name), as views of image_data. If keys is given,
+            return the data of those amps only.
+
+            If image_data has the shape of the layout plan, all the taps are split
+            at once by reshaping image_data. If not (e.g. a partial frame), each
+            amp is sliced from the rectangle of the plan.
+        """
+
+        layout = self.layout
+        if layout is None:
+           raise ValueError("frame mode %s is not supported at this time" %\
+                            self.image_info.get('frame_mode'))
+
+        amps = layout["AMPS"]
+        if keys is None:
+           keys = amps
+
+        if image_data.shape == layout["SHAPE"] and image_data.flags.c_contiguous:
+           taps = image_data.reshape(layout["TAP_SHAPE"]).transpose(layout["TAP_AXES"])
+           return {key: taps[amps[key]["INDEX"]] for key in keys}
+
+        amp_data = {}
+        for key in keys:
+           y0, y1, x0, x1 = amps[key]["RECT"]
+           amp_data[key] = image_data[y0:y1, x0:x1]
+        return amp_data
+
     def get_tap_indices(self,ccd_name=None,ccd_location=None, amp_name=None):
 
         """ given ccd name or location, return tap indices"""
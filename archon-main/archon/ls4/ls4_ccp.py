@@ -301,6 +301,7 @@ class LS4_CCP():
            command_dict = ls4_commands.command_dict
            status_dict = {}
            status_dict['status'] = ls4_commands.command_dict['status']
+           status_dict['stats'] = ls4_commands.command_dict['stats']
            error_reply = ls4_commands.error_reply
            done_reply = ls4_commands.done_reply
          except Exception as e:
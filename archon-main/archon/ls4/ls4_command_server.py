@@ -397,7 +397,7 @@ class LS4_Command_Server():
             {'error':error_flag,'restart':restart_flag,'reboot':reboot_flag,\
              'shutdown':shutdown_flag,'error_msg':error_msg})
 
-          if command in ["status","help"]  :
+          if command in ["status","stats","help"]  :
             self.server_status.update({'command':self.command_prev,'arg_value_list':self.arg_value_list_prev,\
                 'reply':self.reply_prev,'error':self.error_prev,'error_msg':self.error_msg_prev})
           else:
@@ -436,7 +436,7 @@ class LS4_Command_Server():
         #   if successful, append the reply with the server status.
         #   otherwise, do nothing and do not record the reply in reply_prev.
 
-        if command not in ['status','help']:
+        if command not in ['status','stats','help']:
           if reply_list[0] is None:
             error_msg="command_fnc reply is None"
             reply_list[0]=self.error_reply + " " + error_msg
@@ -51,6 +51,7 @@ class LS4_Commands():
         'open_shutter':{'arg_name_list':[],'comment':'open the camera shutter'},\
         'close_shutter':{'arg_name_list':[],'comment':'close the camera shutter'},\
         'status':{'arg_name_list':[],'comment':'return camera status'},\
+        'stats':{'arg_name_list':[],'comment':'return command latency histograms (JSON) of each controller'},\
         'expose':{'arg_name_list':['shutter','exptime','fileroot','exp_mode'],\
             'comment':'expose for exptime sec with shutter open (True,False) using exp_mode and saved to fileroot'},\
         'clear':{'arg_name_list':['clear_time'],'comment':'clear the camera for specified time'},\
@@ -144,6 +145,9 @@ class LS4_Commands():
            reply_list[0] = self.done_reply + " " + str(self.ls4_ctrl.status)
            reply_list[0] = reply_list[0].replace(",",",\n") 
 
+        elif command == 'stats':
+           reply_list[0] = self.done_reply + " " + json.dumps(self.ls4_ctrl.command_stats())
+
         elif command == 'expose':
            self.debug("awaiting expose with arg_dict : %s" % str(arg_dict))
            error_msg = await self.expose(arg_dict)
@@ -24,6 +24,7 @@ import time
 import argparse
 import platform
 from archon.controller.ls4_logger import LS4_Logger
+from archon.ls4 import MAX_FETCHES, FITS_WRITERS, SAVE_QUEUE_BYTES, FITS_MODE
 
    
 def namelist(s):
@@ -144,6 +145,33 @@ class LS4_Conf():
        # default is to read CCD out through both amps
        conf['amp_direction']="both"
 
+       # poll controller STATUS and FRAME every second (0 to disable polling)
+       conf['telemetry_interval']=1.0
+
+       # do not stage the next exposure after each readout
+       conf['pre_arm']=False
+
+       # do not fetch the images during the readout
+       conf['progressive_fetch']=False
+
+       # number of controllers fetching at once (0: no limit)
+       conf['max_fetches']=MAX_FETCHES
+
+       # number of threads writing the FITS files of all the controllers
+       conf['fits_writers']=FITS_WRITERS
+
+       # write one FITS file per amp ("amp"), or one multi-extension file per
+       # controller ("controller") or per exposure ("exposure")
+       conf['fits_mode']=FITS_MODE
+
+       # save each image before fetching the next (no write-behind queue), and the
+       # memory budget of the write-behind queue of each controller
+       conf['write_behind']=False
+       conf['save_queue_bytes']=SAVE_QUEUE_BYTES
+
+       # fetch on the control connection of each controller (no second connection)
+       conf['data_connection']=False
+
        return conf
 
     def read_conf_file(self,input=None):
@@ -262,6 +290,24 @@ class LS4_Conf():
                       help='initially reboot controllers before configuring')
        parser.add_argument('--amp_direction', type=str, default="both",
                        help='choose both, left, or right')
+       parser.add_argument('--telemetry_interval', type=float, default=1.0,
+                       help='cadence (sec) of controller status polling, 0 to disable')
+       parser.add_argument('--pre_arm', type=str, default="False",
+                       help='stage the next exposure after each readout, True or False')
+       parser.add_argument('--progressive_fetch', type=str, default="False",
+                       help='fetch the image while it is read out, True or False')
+       parser.add_argument('--max_fetches', type=int, default=MAX_FETCHES,
+                       help='number of controllers fetching at once, 0 for no limit')
+       parser.add_argument('--fits_writers', type=int, default=FITS_WRITERS,
+                       help='number of threads writing FITS files')
+       parser.add_argument('--fits_mode', type=str, default=FITS_MODE,
+                       help='FITS files written: amp (one per amp), controller or exposure (multi-extension)')
+       parser.add_argument('--write_behind', type=str, default="False",
+                       help='save the images in the background while fetching the next, True or False')
+       parser.add_argument('--save_queue_bytes', type=int, default=SAVE_QUEUE_BYTES,
+                       help='bytes of fetched images each controller may queue for saving')
+       parser.add_argument('--data_connection', type=str, default="False",
+                       help='fetch on a second connection to each controller, True or False')
 
 
 
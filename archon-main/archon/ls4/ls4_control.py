@@ -53,12 +53,15 @@ from archon.controller.ls4_logger import LS4_Logger
 from archon.controller.ls4_mainloop import Mainloop_Function as ML
 from archon.ls4.ls4_conf import LS4_Conf     
 from archon.ls4.ls4_camera import LS4_Camera
+from archon.ls4.ls4_fetch_scheduler import LS4_Fetch_Scheduler
+from archon.ls4.ls4_fits_writer import LS4_FITS_Writer
 from archon.ls4.ls4_status import LS4_Status
 from archon.tools import check_bool_value
 from archon.ls4.ls4_exp_modes import *
 from archon.ls4.ls4_mosaic import LS4_Mosaic
 from archon.tools import get_obsdate
 from archon.ls4.ls4_header import LS4_Header
+from archon.ls4 import MAX_FETCHES, FITS_WRITERS, SAVE_QUEUE_BYTES, FITS_MODE, FITS_MODES
 
 class LS4_Control:
 
@@ -130,6 +133,14 @@ class LS4_Control:
        self.sync_controllers = check_bool_value(self.ls4_conf['sync'],True)
        self.initial_clear= check_bool_value(self.ls4_conf['initial_clear'],True)
        self.initial_reboot= check_bool_value(self.ls4_conf['initial_reboot'],True)
+       self.ls4_conf['pre_arm'] = check_bool_value(self.ls4_conf.get('pre_arm',False),True)
+       self.ls4_conf['progressive_fetch'] = check_bool_value(self.ls4_conf.get('progressive_fetch',False),True)
+       self.ls4_conf['max_fetches'] = int(self.ls4_conf.get('max_fetches',MAX_FETCHES))
+       self.ls4_conf['fits_writers'] = int(self.ls4_conf.get('fits_writers',FITS_WRITERS))
+       self.ls4_conf['fits_mode'] = str(self.ls4_conf.get('fits_mode',FITS_MODE)).lower()
+       self.ls4_conf['write_behind'] = check_bool_value(self.ls4_conf.get('write_behind',False),True)
+       self.ls4_conf['save_queue_bytes'] = int(self.ls4_conf.get('save_queue_bytes',SAVE_QUEUE_BYTES))
+       self.ls4_conf['data_connection'] = check_bool_value(self.ls4_conf.get('data_connection',False),True)
 
 
        # init self.extra_info_header. It  records info added before
@@ -175,6 +186,10 @@ class LS4_Control:
           self.ls4_conf['idle_function'] = ML.FLUSH_FUNCTION
        else:
           error_msg = 'idle_function must be none,clear,or flush'
+
+     if error_msg is None:
+       if self.ls4_conf['fits_mode'] not in FITS_MODES:
+          error_msg = "fits_mode must be one of %s, not %s" % (FITS_MODES,self.ls4_conf['fits_mode'])
           
      if error_msg is not None:
        if self.ls4_logger is not None:
@@ -245,6 +260,19 @@ class LS4_Control:
        self.error(error_msg)
        raise RuntimeError(error_msg)
 
+     # the controllers share the network interface, so their fetches are
+     # scheduled together (see ls4_fetch_scheduler.py)
+     self.fetch_scheduler = LS4_Fetch_Scheduler(max_fetches=self.ls4_conf['max_fetches'],\
+                         ls4_logger=self.ls4_logger)
+
+     # the FITS files of all the controllers are written in one pool of threads,
+     # off the event loop (see ls4_fits_writer.py)
+     self.fits_writer = LS4_FITS_Writer(max_workers=self.ls4_conf['fits_writers'],\
+                         ls4_logger=self.ls4_logger)
+
+     # with fits_mode "exposure", each enabled controller saves its amps as one
+     # part of a file named after the image prefix of the exposure (fits_root)
+     num_parts = len([name for name in self.name_list if name in self.ls4_conf['enable_list']])
 
      self.enabled_cam_list=[]
      for index in range(0,self.num_controllers):
@@ -252,6 +280,8 @@ class LS4_Control:
          conf = self.ls4_conf_list[index]
          conf.update(self.ls4_conf)
          conf.update({'image_prefix':'%sC%d' % (self.ls4_conf['image_prefix'],index)})
+         conf.update({'fits_root':self.ls4_conf['image_prefix']})
+         conf.update({'fits_part':len(self.enabled_cam_list),'fits_parts':num_parts})
          conf.update({'ip':self.ip_list[index]})
          conf.update({'name':name})
          conf.update({'local_addr':(self.bind_list[index],self.port_list[index])})
@@ -264,8 +294,11 @@ class LS4_Control:
             try:
               self.ls4_list[index]=LS4_Camera(ls4_conf=conf,ls4_sync=self.ls4_sync,
                   command_args=self.ls4_sync.command_args,param_args=self.ls4_sync.param_args,
-                  fake=self.fake_controller)
+                  fake=self.fake_controller,fetch_scheduler=self.fetch_scheduler,
+                  fits_writer=self.fits_writer)
               self.enabled_cam_list.append(self.ls4_list[index])
+              if self.ls4_list[index].save_queue is not None:
+                 self.ls4_list[index].save_queue.on_update = self.update_save_status
             except Exception as e:
               error_msg = "Exception instantiating LS4_Camera for index %d: %s" %\
                      (index,e)
@@ -374,6 +407,15 @@ class LS4_Control:
       """
 
       self.ls4_status.update({'state':'stopping','comment':'stopping'})
+      try:
+        await self.flush_saves()
+      except Exception as e:
+        self.error("exception saving queued images: %s" % e)
+      results = await asyncio.gather(*(ls4_cam.stop_saves() for ls4_cam in self.enabled_cam_list),\
+                                     return_exceptions=True)
+      for e in results:
+        if isinstance(e, Exception):
+          self.error("exception stopping save queue: %s" % e)
       try:
         await self.update_cam_status()
         self.ls4_logger.info("########## %s: stopping controllers" % get_obsdate())
@@ -402,6 +444,71 @@ class LS4_Control:
       self.ls4_status.update(cam_status)
 
 
+  def update_save_status(self):
+      """ update the status keywords of the write-behind save queues: number of images
+          queued, MB queued, age (sec) of the oldest queued image and lag (sec) of the
+          last saved image (worst over all controllers), and number of failed saves
+      """
+
+      save_status = {'save_depth': 0, 'save_mb': 0.0, 'save_age': 0.0, 'save_lag': 0.0,
+                     'save_errors': 0}
+      for ls4_cam in self.enabled_cam_list:
+          if ls4_cam.save_queue is not None:
+             metrics = ls4_cam.save_queue.metrics()
+             save_status['save_depth'] += metrics['depth']
+             save_status['save_mb'] += metrics['bytes']/1.0e6
+             save_status['save_age'] = max(save_status['save_age'], metrics['age'])
+             save_status['save_lag'] = max(save_status['save_lag'], metrics['lag'])
+             save_status['save_errors'] += metrics['errors']
+
+      save_status['save_mb'] = round(save_status['save_mb'],1)
+      save_status['save_age'] = round(save_status['save_age'],3)
+      save_status['save_lag'] = round(save_status['save_lag'],3)
+      self.ls4_status.update(save_status)
+
+  async def flush_saves(self):
+      """ wait for the images queued for saving by all the controllers. Raise
+          RuntimeError if any failed.
+      """
+
+      results = await asyncio.gather(*(ls4_cam.flush_saves() for ls4_cam in self.enabled_cam_list),
+                                     return_exceptions=True)
+      self.update_save_status()
+      errors = ["%s" % e for e in results if isinstance(e, Exception)]
+      if len(errors) > 0:
+         raise RuntimeError("failed saving images: %s" % "; ".join(errors))
+
+  async def wait_saved(self, exp_num):
+      """ wait for the images of all the controllers with exposure number exp_num in
+          their names to be saved. Raise RuntimeError if any failed.
+      """
+
+      image_suffix = "_%05d"%exp_num + ".fits"
+      results = await asyncio.gather(*(ls4_cam.wait_saved(ls4_cam.ls4_conf['data_path']+"/"+\
+                          ls4_cam.ls4_conf['image_prefix'] + image_suffix)\
+                          for ls4_cam in self.enabled_cam_list), return_exceptions=True)
+      errors = ["%s" % e for e in results if isinstance(e, Exception)]
+      if len(errors) > 0:
+         raise RuntimeError("failed saving exposure %d: %s" % (exp_num, "; ".join(errors)))
+
+  def command_stats(self):
+      """ return, for each enabled controller, the latency histograms of its
+          commands by command type, its command timeouts by command type, and
+          its measured fetch rate
+      """
+
+      stats = {}
+      for ls4_cam in self.enabled_cam_list:
+          controller = ls4_cam.ls4_controller
+          if controller is not None:
+             stats[ls4_cam.name] = {
+                'buckets': controller.latency.buckets,
+                'latency': controller.latency.summary(),
+                'timeouts': dict(controller.timeouts.counts),
+                'fetch': self.fetch_scheduler.summary(ls4_cam.name),
+             }
+      return stats
+
   def get_image_list(self):
       """ get list of images from previously saved exposure """
 
@@ -989,6 +1096,7 @@ class LS4_Control:
         for ls4 in self.ls4_list:
             f = "%sC%d" % (self.ls4_conf['image_prefix'],index)
             ls4.update_conf('image_prefix',f)
+            ls4.update_conf('fits_root',fileroot)
             index += 1
 
       if (error_msg is None) and self.sync_controllers:
@@ -1049,6 +1157,9 @@ class LS4_Control:
 
       elif (error_msg is None) and exp_mode == exp_mode_next:
         self.info("awaiting exp_sequence threads for exp_mode_next")
+        # the images saved are those of the previous exposure, fetched while this
+        # one is acquired. Name them after it.
+        image_suffix = "_%05d"%(exp_num-1) + ".fits"
         try:
           await asyncio.gather(*(self.exp_sequence(exptime=exptime,ls4=self.ls4_list[index],\
                        ls4_conf= self.ls4_conf_list[index],acquire=True,suffix=image_suffix,\
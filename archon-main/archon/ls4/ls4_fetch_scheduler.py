@@ -0,0 +1,185 @@
+############################
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_fetch_scheduler.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Fetch_Scheduler class.
+#
+# The controllers of the camera share the network interface of the host, so
+# fetches from all of them at once each take as long as fetching them all in
+# turn, and the first frame is saved no sooner than the last. LS4_Control
+# shares one instance of LS4_Fetch_Scheduler between its LS4_Camera instances,
+# which ask it for a slot before each fetch.
+#
+# At most max_fetches fetches run at once (no limit if 0). Waiting fetches are
+# granted in order of deadline, the time their controller buffer could be
+# overwritten by a later exposure, and for equal deadlines, the fetch whose
+# save takes longest first, so that the last save ends as early as possible.
+# A fetch that would miss its deadline if it waited any longer is started at
+# once, over the limit.
+#
+# The scheduler measures the fetch rate (bytes/sec) and the save time of each
+# controller, to predict the fetch times.
+#
+################################
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from collections import Counter
+
+from archon.controller.ls4_logger import LS4_Logger
+from . import MAX_FETCHES, FETCH_RATE_SMOOTHING, FETCH_DEADLINE_MARGIN
+
+__all__ = ["LS4_Fetch_Scheduler"]
+
+
+class LS4_Fetch_Scheduler():
+    """ grant the fetches of the controllers, at most max_fetches at a time """
+
+    def __init__(self, max_fetches=MAX_FETCHES, ls4_logger=None,
+                 smoothing=FETCH_RATE_SMOOTHING, margin=FETCH_DEADLINE_MARGIN):
+        """ max_fetches is the number of fetches running at once (0 for no limit),
+            smoothing the weight of a new measurement in the fetch rates, and
+            margin the factor applied to predicted fetch times when checking
+            deadlines.
+        """
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Fetch_Scheduler")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.max_fetches = max_fetches
+        self.smoothing = smoothing
+        self.margin = margin
+
+        # measured fetch rate (bytes/sec), size of the last fetch (bytes), and
+        # last save time (sec) of each controller, by name
+        self.rates = {}
+        self.n_bytes = {}
+        self.save_times = {}
+
+        # number of fetches running, and heap of the waiting fetches:
+        # (deadline, -save time, sequence number, future, name)
+        self.n_active = 0
+        self._waiting = []
+        self._seq = itertools.count()
+
+        # number of fetches granted at once, after waiting, and over the limit
+        # to meet a deadline, and total time (sec) waited
+        self.counts = Counter()
+        self.wait_time = 0.0
+
+    def predict(self, name, n_bytes=None):
+        """ return the predicted time (sec) to fetch n_bytes (default: the size of
+            the last fetch) from controller name, or None if it is not known.
+        """
+
+        rate = self.rates.get(name)
+        if n_bytes is None:
+           n_bytes = self.n_bytes.get(name)
+        if rate is None or n_bytes is None:
+           return None
+        return n_bytes / rate
+
+    def record_fetch(self, name, n_bytes, period):
+        """ record a fetch of n_bytes from controller name that took period sec """
+
+        if period <= 0:
+           return
+        rate = n_bytes / period
+        if name in self.rates:
+           rate = self.rates[name] + self.smoothing * (rate - self.rates[name])
+        self.rates[name] = rate
+        self.n_bytes[name] = n_bytes
+
+    def record_save(self, name, period):
+        """ record the time (sec) to save a frame from controller name """
+
+        self.save_times[name] = period
+
+    @contextlib.asynccontextmanager
+    async def slot(self, name, deadline=None):
+        """ wait for a slot to fetch from controller name, before deadline (a
+            time.time() value, or None), and hold it in the context.
+        """
+
+        await self._acquire(name, deadline)
+        try:
+           yield
+        finally:
+           self._release()
+
+    async def _acquire(self, name, deadline):
+
+        if self.max_fetches <= 0 or (self.n_active < self.max_fetches and len(self._waiting) == 0):
+           self.n_active += 1
+           self.counts['immediate'] += 1
+           return
+
+        # wait at most until the latest time the fetch can start and still end
+        # before the deadline
+        timeout = None
+        predicted = self.predict(name)
+        if deadline is not None and predicted is not None:
+           timeout = max(0.0, deadline - self.margin * predicted - time.time())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (deadline if deadline is not None else float("inf"),
+                                       -self.save_times.get(name, 0.0),
+                                       next(self._seq), future, name))
+        self.debug("%s: waiting for a fetch slot (%d running, %d waiting)" %\
+                   (name, self.n_active, len(self._waiting)))
+
+        t_start = time.time()
+        try:
+          await asyncio.wait_for(asyncio.shield(future), timeout)
+          self.counts['waited'] += 1
+        except asyncio.TimeoutError:
+          if future.done():
+             self.counts['waited'] += 1
+          else:
+             # the heap entry is skipped once its future is cancelled
+             future.cancel()
+             self.n_active += 1
+             self.counts['forced'] += 1
+             self.warn("%s: starting fetch over the limit of %d to meet its deadline" %\
+                       (name, self.max_fetches))
+        except asyncio.CancelledError:
+          # a slot granted to a cancelled fetch is passed on
+          if future.done() and not future.cancelled():
+             self._release()
+          else:
+             future.cancel()
+          raise
+        finally:
+          self.wait_time += time.time() - t_start
+
+    def _release(self):
+
+        self.n_active -= 1
+        while len(self._waiting) > 0 and (self.max_fetches <= 0 or self.n_active < self.max_fetches):
+            __, __, __, future, name = heapq.heappop(self._waiting)
+            if future.done():
+               continue
+            self.n_active += 1
+            future.set_result(True)
+
+    def summary(self, name):
+        """ return the measured fetch rate (bytes/sec), predicted fetch time and
+            last save time (sec) of controller name
+        """
+
+        return {'rate': self.rates.get(name), 'predicted': self.predict(name),
+                'save_time': self.save_times.get(name)}
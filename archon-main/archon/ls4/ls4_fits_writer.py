@@ -0,0 +1,346 @@
+############################
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_fits_writer.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_FITS_Writer class.
+#
+# LS4_Camera.save_image writes one FITS file for each amplifier of each CCD.
+# Building the HDU and writing it to disk take tens of msec per file, which
+# would stall the asyncio loop that also polls the readouts of the other
+# controllers, runs the sync barriers, and serves the command and status ports.
+#
+# An instance of LS4_FITS_Writer writes the files in a bounded pool of threads
+# instead, and save_image awaits them, so the amplifiers of a controller, and
+# the controllers, are written in parallel. The file writes release the GIL, but
+# building the headers does not, so a few threads are enough: more threads only
+# compete with the event loop for the GIL. LS4_Control shares one instance
+# between its LS4_Camera instances.
+#
+# With fits_mode "controller" or "exposure" (see ls4_conf.py), save_image writes
+# one multi-extension FITS file instead: the keywords shared by all the amps go
+# in the primary header, which has no data, and each amp is an image extension
+# with its own keywords only. With "exposure", the controllers each add their
+# amps to one file per exposure (write_part), which is written once all of them
+# have, and keywords that differ between controllers go in the extensions.
+#
+# The keywords common to all the amps of an image are the same for each amp
+# file, so save_image has them rendered to FITS cards once (render), and each
+# amp file is written from those cards and the few cards of its amp
+# (write_cards), with no astropy HDU built for it.
+#
+# The data written are views of the host frame buffer of the controller, which
+# is only handed back for the next fetch once all the files are written.
+#
+################################
+
+import asyncio
+import concurrent.futures
+import functools
+from collections import OrderedDict
+
+import numpy
+
+from astropy.io import fits
+
+from archon.controller.ls4_logger import LS4_Logger
+from . import FITS_WRITERS, MEF_PART_TIMEOUT
+
+__all__ = ["LS4_FITS_Writer"]
+
+# header values rounded to msec
+ROUNDED_KEYS = ["actexpt","read_per","arm-lat","release-lat"]
+
+# number of exposure files written remembered, to catch parts added too late
+MEF_HISTORY = 100
+
+# FITS block size (bytes), card size (bytes), and bytes of data converted at once
+FITS_BLOCK = 2880
+FITS_CARD = 80
+FITS_DATA_CHUNK = 1024*1024
+
+
+def set_header(fits_header, header_info):
+    """ set the key/value pairs of header_info in fits_header """
+
+    for k in header_info:
+        key = k
+        if len(key.rstrip())>8:
+           key = "HIERARCH "+ key
+        value = header_info[k]
+        if isinstance(value,(float,)) and k in ROUNDED_KEYS:
+           value = round(value,3)
+        fits_header[key] = value
+
+
+def render_cards(header_info):
+    """ return the FITS cards (80-character card images, with no END card) of the
+        key/value pairs in header_info
+    """
+
+    fits_header = fits.Header()
+    set_header(fits_header, header_info)
+    return fits_header.tostring(endcard=False, padding=False)
+
+
+@functools.lru_cache(maxsize=16)
+def data_cards(shape, dtype_str):
+    """ return the FITS cards describing a primary array of the given shape and
+        numpy dtype, as astropy writes them, and the BZERO offset of unsigned
+        integer data, or of signed bytes (or None)
+    """
+
+    dtype = numpy.dtype(dtype_str)
+    if dtype.kind == 'f':
+       bitpix = -8 * dtype.itemsize
+    elif dtype.kind in 'iu':
+       bitpix = 8 * dtype.itemsize
+    else:
+       raise ValueError("data type %s can not be written to FITS" % dtype)
+
+    cards = [('SIMPLE', True, 'conforms to FITS standard'),
+             ('BITPIX', bitpix, 'array data type'),
+             ('NAXIS', len(shape), 'number of array dimensions')]
+    for axis in range(len(shape)):
+        cards.append(('NAXIS%d' % (axis + 1), shape[len(shape) - axis - 1]))
+    cards.append(('EXTEND', True))
+
+    # FITS bytes are unsigned, and wider integers signed
+    bzero = None
+    if dtype.kind == 'u' and dtype.itemsize > 1:
+       bzero = 1 << (bitpix - 1)
+    elif dtype.kind == 'i' and dtype.itemsize == 1:
+       bzero = -128
+    if bzero is not None:
+       cards += [('BSCALE', 1), ('BZERO', bzero)]
+
+    return fits.Header(cards).tostring(endcard=False, padding=False), bzero
+
+
+def write_fits_cards(image_name, data, cards, header_info):
+    """ write data to FITS file image_name, with a header made of the rendered
+        cards (see render_cards) followed by the key/value pairs in header_info.
+        The file is the same as astropy writes for a PrimaryHDU of data with all
+        the key/value pairs. Run in a thread of the writer pool.
+    """
+
+    structure, bzero = data_cards(data.shape, data.dtype.str)
+    header = structure + cards + render_cards(header_info) + "END".ljust(FITS_CARD)
+    header = header.ljust(-(-len(header) // FITS_BLOCK) * FITS_BLOCK)
+
+    # FITS data are big-endian. Unsigned integers are stored signed, and signed
+    # bytes unsigned, offset by bzero, which flips their sign bit
+    big_endian = data.dtype.newbyteorder('>')
+    rows = data.reshape(-1, data.shape[-1]) if data.ndim > 1 else data.reshape(1, -1)
+    chunk = max(1, FITS_DATA_CHUNK // max(1, rows[0].nbytes))
+
+    n_bytes = 0
+    with open(image_name, "wb") as fout:
+        fout.write(header.encode("ascii"))
+        for row in range(0, rows.shape[0], chunk):
+            block = rows[row:row + chunk]
+            if bzero is not None:
+               block = block ^ data.dtype.type(bzero)
+            block = block.astype(big_endian, copy=False)
+            fout.write(block.tobytes())
+            n_bytes += block.nbytes
+        fout.write(bytes(-n_bytes % FITS_BLOCK))
+
+
+def write_mef(image_name, primary_info, extensions):
+    """ write multi-extension FITS file image_name, with a primary header made of
+        the key/value pairs in primary_info, and no data, followed by an image
+        extension for each (extname, data, header_info) in extensions. Run in a
+        thread of the writer pool.
+    """
+
+    primary = fits.PrimaryHDU()
+    set_header(primary.header, primary_info)
+    primary.header['NEXTEND'] = len(extensions)
+
+    hdus = [primary]
+    for extname, data, header_info in extensions:
+        hdu = fits.ImageHDU(data, name=extname)
+        set_header(hdu.header, header_info)
+        hdus.append(hdu)
+
+    hdul = fits.HDUList(hdus)
+    hdul.writeto(image_name,overwrite=True)
+    hdul.close()
+
+
+def merge_parts(parts):
+    """ return the primary header info and the extensions of a file made of parts,
+        a list of (primary_info, extensions). The keys with the same value in the
+        primary_info of all the parts are kept in the primary header, and the
+        others are added to the header info of the extensions of their part.
+    """
+
+    primaries = [primary_info for primary_info, __ in parts]
+    shared = {k: v for k, v in primaries[0].items()
+              if all(k in p and p[k] == v for p in primaries[1:])}
+
+    merged = []
+    for primary_info, extensions in parts:
+        own = {k: v for k, v in primary_info.items() if k not in shared}
+        for extname, data, header_info in extensions:
+            h = dict(own)
+            h.update(header_info)
+            merged.append((extname, data, h))
+
+    return shared, merged
+
+
+class LS4_FITS_Writer():
+    """ write FITS files in a pool of at most max_workers threads """
+
+    def __init__(self, max_workers=FITS_WRITERS, ls4_logger=None):
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_FITS_Writer")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.max_workers = max(1, max_workers)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                              thread_name_prefix="fits_writer")
+
+        # number of files written
+        self.n_written = 0
+
+        # exposure files waiting for parts, by name, and the part numbers in each
+        # of the last files written, by name
+        self._mef_parts = {}
+        self._mef_written = OrderedDict()
+        self._mef_tasks = set()
+
+    async def render(self, header_info):
+        """ return the FITS cards of the key/value pairs in header_info, rendered
+            in the writer pool, for write_cards
+        """
+
+        loop = asyncio.get_running_loop()
+        try:
+           return await loop.run_in_executor(self.executor, render_cards, dict(header_info))
+        except Exception as e:
+           error_msg = "Exception rendering FITS header: %s" % e
+           self.error(error_msg)
+           raise RuntimeError(error_msg)
+
+    def write_cards(self, image_name, data, cards, header_info):
+        """ write data to FITS file image_name, with a header made of the FITS cards
+            returned by render, followed by the key/value pairs of header_info.
+            Return an awaitable done once the file is written. header_info is
+            copied at once, so the caller may change it before awaiting.
+        """
+
+        return self._write(write_fits_cards, image_name, data, cards, dict(header_info))
+
+    def write_mef(self, image_name, primary_info, extensions):
+        """ write multi-extension FITS file image_name, with the key/value pairs of
+            primary_info in its primary header, and an image extension for each
+            (extname, data, header_info) in extensions. Return an awaitable done
+            once the file is written. The header info is copied at once.
+        """
+
+        return self._write(write_mef, image_name, dict(primary_info),
+                [(extname, data, dict(header_info)) for extname, data, header_info in extensions])
+
+    async def _write(self, write_function, image_name, *args):
+
+        loop = asyncio.get_running_loop()
+        try:
+           await loop.run_in_executor(self.executor, write_function, image_name, *args)
+        except Exception as e:
+           error_msg = "Exception writing %s: %s" % (image_name, e)
+           self.error(error_msg)
+           raise RuntimeError(error_msg)
+
+        self.n_written += 1
+
+    async def write_part(self, image_name, part, n_parts, primary_info, extensions,
+                         timeout=MEF_PART_TIMEOUT):
+        """ add part number part, of n_parts, to multi-extension FITS file image_name,
+            and return once the file is written. primary_info and extensions are
+            as for write_mef. The file is written once all the parts are added, or
+            timeout sec after the first one, with the parts added by then, in order
+            of part number (see merge_parts for the headers).
+
+            A part added after its file was written is written to a file of its own,
+            named after image_name and the part number. A part whose number is
+            already in the file written starts a new file instead: the name is
+            reused by a new exposure.
+        """
+
+        if n_parts <= 1:
+           await self.write_mef(image_name, primary_info, extensions)
+           return
+
+        written = self._mef_written.get(image_name)
+        if written is not None and part not in written:
+           late_name = image_name.replace(".fits","") + "_p%02d.fits" % part
+           self.warn("part %d of %s added after the file was written, writing it to %s" %\
+                     (part, image_name, late_name))
+           written.add(part)
+           await self.write_mef(late_name, primary_info, extensions)
+           return
+        elif written is not None:
+           del self._mef_written[image_name]
+
+        loop = asyncio.get_running_loop()
+        entry = self._mef_parts.get(image_name)
+        if entry is None:
+           entry = {'n_parts': n_parts, 'parts': {}, 'future': loop.create_future(),
+                    'timeout': timeout}
+           entry['timer'] = loop.call_later(timeout, self._mef_timeout, image_name, entry)
+           self._mef_parts[image_name] = entry
+
+        entry['parts'][part] = (dict(primary_info),
+                [(extname, data, dict(header_info)) for extname, data, header_info in extensions])
+        if len(entry['parts']) >= entry['n_parts']:
+           self._start_mef(image_name, entry)
+
+        await asyncio.shield(entry['future'])
+
+    def _mef_timeout(self, image_name, entry):
+
+        if self._mef_parts.get(image_name) is entry:
+           self.warn("writing %s with %d of %d parts, after waiting %.1f sec for the others" %\
+                     (image_name, len(entry['parts']), entry['n_parts'], entry['timeout']))
+           self._start_mef(image_name, entry)
+
+    def _start_mef(self, image_name, entry):
+
+        entry['timer'].cancel()
+        del self._mef_parts[image_name]
+        self._mef_written[image_name] = set(entry['parts'])
+        if len(self._mef_written) > MEF_HISTORY:
+           self._mef_written.popitem(last=False)
+        task = asyncio.create_task(self._write_parts(image_name, entry))
+        self._mef_tasks.add(task)
+        task.add_done_callback(self._mef_tasks.discard)
+
+    async def _write_parts(self, image_name, entry):
+
+        future = entry['future']
+        try:
+           primary_info, extensions = merge_parts([entry['parts'][part] for part in sorted(entry['parts'])])
+           await self.write_mef(image_name, primary_info, extensions)
+           future.set_result(True)
+        except Exception as e:
+           future.set_exception(RuntimeError("%s" % e))
+           # the exception is raised by write_part
+           future.exception()
+
+    def shutdown(self):
+        """ wait for the files being written, and stop the threads """
+
+        self.executor.shutdown(wait=True)
@@ -205,27 +205,9 @@ class LS4_Header():
 
         else:
 
-          try:
-            assert amp_index is not None, "unspecified amp index"
-            assert ccd_location in ls4_ccd_map.ccd_map, "ccd location %s not found in ccd map" % ccd_location
-            assert amp_index in range(0,ls4_ccd_map.amps_per_ccd),\
-                    "amp_index [%d] out of range [0 to %d]" % (amp_index,ls4_ccd_map.amps_per_ccd)
-          except Exception as e:
-            self.error(e)
-            return 
-
-          # map to translate keyword in  ccd_info dictionary to keyword in header
-          key_map={"AMP_NAME":"AMP_NAMES","TAP_NAME":"TAP_NAMES",\
-                  "TAP_INDEX":"TAP_INDICES","TAP_SCALE":"TAP_SCALES",\
-                  "TAP_OFFSET":"TAP_OFFSETS"}
-
-          ccd_info = ls4_ccd_map.ccd_map[ccd_location]
-          h.update({"CCD_LOC":ccd_info["CCD_LOC"],"CCD_NAME":ccd_info["CCD_NAME"]})
-
-          for key in key_map:
-              k = key_map[key]
-              value = ccd_info[k][amp_index]
-              h.update({key:value})
+          h = self.get_amp_info(ls4_ccd_map=ls4_ccd_map,ccd_location=ccd_location,amp_index=amp_index)
+          if h is None:
+            return
 
 
         await self.lock.acquire()
@@ -235,3 +217,33 @@ class LS4_Header():
 
         #self.debug("%s: done setting header info " % self.name)
         return h
+
+    def get_amp_info(self,ls4_ccd_map=None,ccd_location=None,amp_index=None):
+
+        """ return the header entries specific to amp amp_index of the ccd at
+            ccd_location, from ls4_ccd_map, without adding them to self.header_info.
+            Return None if the ccd or amp is not found.
+        """
+
+        try:
+          assert amp_index is not None, "unspecified amp index"
+          assert ccd_location in ls4_ccd_map.ccd_map, "ccd location %s not found in ccd map" % ccd_location
+          assert amp_index in range(0,ls4_ccd_map.amps_per_ccd),\
+                  "amp_index [%d] out of range [0 to %d]" % (amp_index,ls4_ccd_map.amps_per_ccd)
+        except Exception as e:
+          self.error(e)
+          return
+
+        # map to translate keyword in  ccd_info dictionary to keyword in header
+        key_map={"AMP_NAME":"AMP_NAMES","TAP_NAME":"TAP_NAMES",\
+                "TAP_INDEX":"TAP_INDICES","TAP_SCALE":"TAP_SCALES",\
+                "TAP_OFFSET":"TAP_OFFSETS"}
+
+        ccd_info = ls4_ccd_map.ccd_map[ccd_location]
+        h = {"CCD_LOC":ccd_info["CCD_LOC"],"CCD_NAME":ccd_info["CCD_NAME"]}
+
+        for key in key_map:
+            k = key_map[key]
+            h[key] = ccd_info[k][amp_index]
+
+        return h
@@ -0,0 +1,199 @@
+############################
+# -*- coding: utf-8 -*-
+#
+# @Author: David Rabinowitz (david.rabinowitz@yale.edu)
+# @Date: 2025-07-14
+# @Filename: ls4_save_queue.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Python code defining the LS4_Save_Queue class.
+#
+# With write-behind saving (conf write_behind), LS4_Camera.fetch_and_save does not
+# wait for the fetched image to be written to disk. It queues the save in the
+# LS4_Save_Queue of the camera and returns, so that the next exposure can be
+# fetched while the previous one is still being written. A single task drains the
+# queue, in order.
+#
+# The fetched image stays in the host frame buffer of the controller until it is
+# saved (see ls4_frame_ring.py), so the queue is bounded by a memory budget: a
+# save is only queued once the bytes already queued leave room for it (one save
+# is always accepted). The fetch that queues it waits until then, which slows the
+# exposures down to the disk rate rather than running out of frame buffers.
+#
+#   .put(name, n_bytes, save) :  queue the coroutine function save, holding n_bytes
+#   .wait_saved(name) :          wait for the save queued as name
+#   .flush() :                   wait for all the queued saves
+#   .metrics() :                 queue depth, bytes, lag, and errors
+#
+################################
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from archon.controller.ls4_logger import LS4_Logger
+from . import SAVE_QUEUE_BYTES
+
+__all__ = ["LS4_Save_Queue"]
+
+# number of completed saves remembered for wait_saved
+SAVED_HISTORY = 100
+
+
+class LS4_Save_Queue():
+    """ queue of saves drained by a background task, within a memory budget """
+
+    def __init__(self, max_bytes=SAVE_QUEUE_BYTES, ls4_logger=None, on_update=None):
+        """ max_bytes is the memory budget of the queued saves. on_update, if given,
+            is called with no arguments each time a save is queued or done.
+        """
+
+        if ls4_logger is None:
+           self.ls4_logger = LS4_Logger(name="LS4_Save_Queue")
+        else:
+           self.ls4_logger = ls4_logger
+
+        self.info = self.ls4_logger.info
+        self.debug = self.ls4_logger.debug
+        self.warn= self.ls4_logger.warn
+        self.error= self.ls4_logger.error
+
+        self.max_bytes = max_bytes
+        self.on_update = on_update
+
+        # queued saves: (name, n_bytes, save, time queued), and bytes they hold
+        self._queue = deque()
+        self.n_bytes = 0
+        self._room = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._task = None
+
+        # future of each save queued or done recently, by name
+        self._futures = OrderedDict()
+
+        # number of saves done and failed, time (sec) from queuing to the end of
+        # the last save, time waited for room in the queue, and the last error
+        self.n_saved = 0
+        self.n_errors = 0
+        self.last_lag = 0.0
+        self.wait_time = 0.0
+        self.last_error = None
+
+    @property
+    def depth(self):
+        """ number of saves queued or running """
+
+        return len(self._queue)
+
+    async def put(self, name, n_bytes, save):
+        """ queue the coroutine function save, which saves image name held in
+            n_bytes of memory. Wait until the memory budget leaves room for it.
+            Return a future done once the image is saved.
+        """
+
+        t_start = time.time()
+        async with self._room:
+           await self._room.wait_for(lambda: len(self._queue) == 0 or \
+                                     self.n_bytes + n_bytes <= self.max_bytes)
+           t_wait = time.time() - t_start
+           self.wait_time += t_wait
+           if t_wait > 0.01:
+              self.warn("waited %7.3f sec for room to queue the save of %s" % (t_wait, name))
+
+           future = asyncio.get_running_loop().create_future()
+           self._futures[name] = future
+           self._futures.move_to_end(name)
+           while len(self._futures) > SAVED_HISTORY and next(iter(self._futures.values())).done():
+               self._futures.popitem(last=False)
+
+           self._queue.append((name, n_bytes, save, time.time(), future))
+           self.n_bytes += n_bytes
+
+        if self._task is None or self._task.done():
+           self._task = asyncio.create_task(self._drain())
+        self._wake.set()
+        self._updated()
+        return future
+
+    async def wait_saved(self, name):
+        """ wait for the save of image name, if queued, and raise its exception
+            if it failed
+        """
+
+        future = self._futures.get(name)
+        if future is not None:
+           await asyncio.shield(future)
+
+    async def flush(self):
+        """ wait for all the queued saves. Raise RuntimeError if any of them failed """
+
+        futures = [entry[4] for entry in self._queue]
+        if len(futures) == 0:
+           return
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        errors = [e for e in results if isinstance(e, Exception)]
+        if len(errors) > 0:
+           raise RuntimeError("%d of %d saves failed: %s" % (len(errors), len(futures), errors[0]))
+
+    def metrics(self):
+        """ return the number of saves queued, the bytes they hold, the age (sec) of
+            the oldest, the lag (sec) of the last save, and the number of saves done
+            and failed
+        """
+
+        age = 0.0
+        if len(self._queue) > 0:
+           age = time.time() - self._queue[0][3]
+        return {'depth': len(self._queue), 'bytes': self.n_bytes, 'age': age,
+                'lag': self.last_lag, 'saved': self.n_saved, 'errors': self.n_errors}
+
+    async def stop(self):
+        """ wait for the queued saves, then stop the task draining the queue """
+
+        try:
+           await self.flush()
+        finally:
+           if self._task is not None:
+              self._task.cancel()
+              try:
+                await self._task
+              except asyncio.CancelledError:
+                pass
+              self._task = None
+
+    async def _drain(self):
+
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+
+            while len(self._queue) > 0:
+                name, n_bytes, save, t_queued, future = self._queue[0]
+                try:
+                   await save()
+                   self.n_saved += 1
+                   if not future.done():
+                      future.set_result(True)
+                except Exception as e:
+                   self.n_errors += 1
+                   self.last_error = "%s" % e
+                   self.error("failed saving %s: %s" % (name, e))
+                   if not future.done():
+                      future.set_exception(e)
+                   # the exception is raised by wait_saved or flush, if called
+                   future.exception()
+
+                self.last_lag = time.time() - t_queued
+                async with self._room:
+                   self._queue.popleft()
+                   self.n_bytes -= n_bytes
+                   self._room.notify_all()
+                self._updated()
+
+    def _updated(self):
+
+        if self.on_update is not None:
+           try:
+             self.on_update()
+           except Exception as e:
+             self.warn("exception updating save status: %s" % e)
@@ -30,6 +30,9 @@
 # Member function "set_param(param,value)" uses the "asyncio.gather()" function to synchronously
 # run the "LS4Controller.set_param(index,param_value)" for all the controllers.
 #
+# Member function "set_params(params)" does the same for a dictionary of parameters, which
+# are set in one transaction by "LS4Controller.set_params(params)": the controllers pass
+# the sync barriers once for all the parameters rather than once per parameter.
 #
 ################################
 
@@ -208,3 +211,25 @@ class LS4_Sync():
           error_msg = "Exception setting param %s to %d: %e" % (param,value,e)
           self.error(error_msg)
           raise RuntimeError(error_msg)
+
+    async def set_params(
+        self,
+        params: dict[str, int] = None,
+        force: bool = False,
+    ):
+
+        """ set several parameters synchronously among controllers cabled together to allow
+            synchronous operation, in one transaction.
+            
+        """
+
+        assert params is not None, "params must be specified"
+
+        try:
+          await asyncio.gather(*(self.synced_controller_list[index].set_params(params=params,\
+                            force=force) for index in range(0,self.num_synced_controllers)))
+
+        except Exception as e:
+          error_msg = "Exception setting params %s: %s" % (params,e)
+          self.error(error_msg)
+          raise RuntimeError(error_msg)
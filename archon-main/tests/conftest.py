@@ -20,7 +20,11 @@ import pytest_asyncio
 
 from archon import config
 from archon.controller.controller import ArchonController
+from archon.controller.ls4_archon_sim import LS4_Archon_Sim
+from archon.controller.ls4_controller import LS4Controller
+from archon.controller.ls4_logger import LS4_Logger
 from archon.controller.maskbits import ControllerStatus
+from archon.ls4.ls4_sync import LS4_Sync
 
 
 CommandsType = Iterable[Tuple[str, Iterable[Union[str, bytes]]]]
@@ -112,6 +116,67 @@ async def controller(request, unused_tcp_port: int):
         await archon.stop()
 
 
+@pytest_asyncio.fixture()
+async def sim_controller(request):
+    """Starts an `.LS4Controller` connected to a simulated Archon reading out a frame.
+
+    Yields a tuple with the `.LS4_Archon_Sim` and the controller, once the readout
+    of a frame of 1024-pixel lines has been started. The keyword arguments of
+    ``@pytest.mark.sim`` are passed to `.LS4_Archon_Sim`, except ``lines``, the
+    number of lines read out (100 by default). Keyword arguments of
+    `.LS4Controller`, such as ``data_connection``, are passed with indirect
+    parametrization. Both are stopped once the test ends.
+    """
+
+    sim_kwargs = {"readout_time": 1.0, "rtt": 0.0, "service_time": 0.0}
+    marker = request.node.get_closest_marker("sim")
+    if marker is not None:
+        sim_kwargs.update(marker.kwargs)
+    lines = sim_kwargs.pop("lines", 100)
+
+    sim = LS4_Archon_Sim(**sim_kwargs)
+    sim.config = {0: f"LINECOUNT={lines}", 1: "PIXELCOUNT=64", 2: "TAPLINES=16",
+                  3: "PARAMETER0=ReadOut=0"}
+    await sim.start()
+
+    ls4_logger = LS4_Logger(name="test")
+    ls4_sync = LS4_Sync(num_synced_controllers=1, lead_index=0, ls4_logger=ls4_logger)
+    controller = LS4Controller(name="test", host=sim.host, port=sim.port,
+                               local_addr=("127.0.0.1", 0),
+                               param_args=ls4_sync.param_args,
+                               command_args=ls4_sync.command_args,
+                               ls4_events=ls4_sync.ls4_events,
+                               ls4_logger=ls4_logger, telemetry_interval=0,
+                               **getattr(request, "param", {}))
+    try:
+        await controller.start(reset=False, read_acf=False)
+
+        await controller.send_command("APPLYALL")
+        await controller.send_command("FASTLOADPARAM ReadOut 1")
+
+        yield sim, controller
+
+    finally:
+        await controller.stop()
+        await sim.stop()
+
+
+@pytest_asyncio.fixture()
+async def sim_buffer(sim_controller):
+    """Waits for the readout of `sim_controller` to fill a frame buffer.
+
+    Returns a tuple with the frame info and the number of the complete buffer.
+    """
+
+    __, controller = sim_controller
+    await asyncio.sleep(0.1)
+
+    frame = await controller.get_frame()
+    buffer_no = [n for n in [1, 2, 3] if frame[f"buf{n}complete"] == 1][0]
+
+    return frame, buffer_no
+
+
 async def start_archon(self, **kwargs):
     await ArchonController.start(self, reset=False, read_acf=False)
 
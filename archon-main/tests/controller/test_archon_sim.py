@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_archon_sim.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+
+import numpy
+
+from archon.controller.ls4_archon_sim import LS4_Archon_Sim
+
+
+async def command(reader, writer, cid, command_string):
+    writer.write(f">{cid:02X}{command_string}\n".encode())
+    return await reader.readuntil(b"\n")
+
+
+def parse(reply):
+    return dict(key.split("=", 1) for key in reply[3:].decode().split())
+
+
+async def test_archon_sim_commands():
+    sim = LS4_Archon_Sim(rtt=0.0, service_time=0.0)
+    await sim.start()
+    reader, writer = await asyncio.open_connection(sim.host, sim.port)
+
+    assert await command(reader, writer, 1, "WCONFIG0000PARAMETER0=IntCS=0") == b"<01\n"
+    assert await command(reader, writer, 2, "APPLYALL") == b"<02\n"
+    assert await command(reader, writer, 3, "RCONFIG0000") == b"<03PARAMETER0=IntCS=0\n"
+    assert await command(reader, writer, 4, "FASTLOADPARAM IntCS 50") == b"<04\n"
+    assert sim.params["INTCS"] == 50
+    assert await command(reader, writer, 5, "FASTLOADPARAM Bogus 1") == b"?05\n"
+    assert await command(reader, writer, 6, "NOTACOMMAND") == b"?06\n"
+
+    status = parse(await command(reader, writer, 7, "STATUS"))
+    assert status["POWER"] == "4"
+
+    writer.close()
+    await sim.stop()
+
+
+async def test_archon_sim_readout_fetch():
+    sim = LS4_Archon_Sim(readout_time=4.0, rtt=0.0, service_time=0.0)
+    sim.config = {0: "LINECOUNT=100", 1: "PIXELCOUNT=32", 2: "TAPLINES=16",
+                  3: "PARAMETER0=ReadOut=0"}
+    await sim.start()
+    reader, writer = await asyncio.open_connection(sim.host, sim.port)
+
+    await command(reader, writer, 1, "APPLYALL")
+    await command(reader, writer, 2, "FASTLOADPARAM ReadOut 1")
+
+    await asyncio.sleep(0.01)
+    frame = parse(await command(reader, writer, 3, "FRAME"))
+    wbuf = int(frame["WBUF"])
+    assert frame[f"BUF{wbuf}COMPLETE"] == "0"
+
+    await asyncio.sleep(0.2)
+    frame = parse(await command(reader, writer, 4, "FRAME"))
+    assert frame[f"BUF{wbuf}COMPLETE"] == "1"
+    assert frame[f"BUF{wbuf}LINES"] == "100"
+    assert frame[f"BUF{wbuf}WIDTH"] == "512"
+
+    n_bytes = 100 * 512 * 2
+    n_blocks = n_bytes // 1024
+    base = int(frame[f"BUF{wbuf}BASE"])
+    writer.write(f">05FETCH{base:08X}{n_blocks:08X}\n".encode())
+    reply = await reader.readexactly(n_blocks * 1028)
+    blocks = numpy.frombuffer(reply, dtype=numpy.uint8).reshape(n_blocks, 1028)
+    assert bytes(blocks[0, 0:4]) == b"<05:"
+    assert numpy.array_equal(blocks[:, 4:].reshape(-1), sim.buffer_data(wbuf, n_bytes))
+
+    writer.close()
+    await sim.stop()
@@ -10,7 +10,7 @@ import asyncio
 
 import pytest
 
-from archon.controller.command import ArchonCommand
+from archon.controller.command import ArchonCommand, parse_reply_header
 from archon.exceptions import ArchonUserWarning
 
 
@@ -70,3 +70,39 @@ async def test_command_get_replies():
 
     assert command.succeeded()
     assert len(replies) == 2
+
+
+@pytest.mark.parametrize(
+    "reply,header",
+    [
+        (b"<0APONG\n", ("<", 10, False)),
+        (b"?FF\n", ("?", 255, False)),
+        (b"<01:" + bytes(1024), ("<", 1, True)),
+        (b"<0a\n", None),
+        (b"!01\n", None),
+        (b"<0", None),
+    ],
+)
+def test_parse_reply_header(reply, header):
+    assert parse_reply_header(reply) == header
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [b"<05VALID=1 COUNT=2\n", b"?05\n", b"<05:" + bytes(range(256)) * 4],
+    ids=["text", "failed", "binary"],
+)
+async def test_command_process_parsed_reply(reply):
+    parsed = ArchonCommand("status", 5)
+    parsed.process_parsed_reply(reply, *parse_reply_header(reply))
+
+    command = ArchonCommand("status", 5)
+    command.process_reply(reply)
+
+    assert parsed.status == command.status
+    assert parsed.command_type == "STATUS"
+    assert parsed.replies[0].is_binary == command.replies[0].is_binary
+    if parsed.replies[0].is_binary:
+        assert parsed.replies[0].reply == reply[4:]
+    else:
+        assert parsed.replies[0].reply == command.replies[0].reply
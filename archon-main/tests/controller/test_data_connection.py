@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_data_connection.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+import time
+
+import numpy
+import pytest
+
+
+# 100 lines of 1024 pixels (200 blocks) take about 1 sec to fetch
+@pytest.mark.sim(bandwidth=200e3)
+@pytest.mark.parametrize("sim_controller", [{"data_connection": False},
+                                            {"data_connection": True}], indirect=True)
+async def test_data_connection_status_latency(sim_controller, sim_buffer):
+    sim, controller = sim_controller
+    frame, buffer_no = sim_buffer
+
+    # time to answer STATUS sent during a fetch
+    fetch = asyncio.create_task(controller.fetch(buffer_no=buffer_no, frame_info=frame))
+    await asyncio.sleep(0.2)
+    t_start = time.monotonic()
+    await controller._query_status()
+    latency = time.monotonic() - t_start
+    data = await fetch
+    image = sim.buffer_data(buffer_no, 100 * 1024 * 2).view("<u2").reshape(100, 1024)
+    assert numpy.array_equal(data, image)
+    controller.release_frame(buffer_no)
+
+    if controller.data_connection:
+        assert latency < 0.1
+    else:
+        # on the control connection, STATUS waits behind the binary reply
+        assert latency > 0.5
+
+
+@pytest.mark.sim(bandwidth=200e3)
+@pytest.mark.parametrize("sim_controller", [{"data_connection": True}], indirect=True)
+async def test_data_connection_fetch_resumes(sim_controller, sim_buffer):
+    sim, controller = sim_controller
+    frame, buffer_no = sim_buffer
+    listener = controller.listener
+
+    sim.inject_fetch_fault("drop", 50)
+    data = await controller.fetch(buffer_no=buffer_no, frame_info=frame)
+
+    image = sim.buffer_data(buffer_no, 100 * 1024 * 2).view("<u2").reshape(100, 1024)
+    assert numpy.array_equal(data, image)
+    assert controller.fetch_retries == 1
+    controller.release_frame(buffer_no)
+
+    # only the bulk-data connection was re-opened
+    assert controller.listener is listener and not listener.done()
+    assert controller.data_listener is not None and not controller.data_listener.done()
+    assert (await controller.get_frame())[f"buf{buffer_no}complete"] == 1
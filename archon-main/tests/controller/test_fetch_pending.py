@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_fetch_pending.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+from archon.controller.ls4_controller import LS4Controller
+from archon.controller.ls4_logger import LS4_Logger
+from archon.controller.maskbits import ControllerStatus
+from archon.ls4.ls4_sync import LS4_Sync
+
+
+async def test_fetch_pending_per_readout():
+    ls4_logger = LS4_Logger(name="test")
+    ls4_sync = LS4_Sync(num_synced_controllers=1, lead_index=0, ls4_logger=ls4_logger)
+    controller = LS4Controller(name="test", host="127.0.0.1", port=4242,
+                               param_args=ls4_sync.param_args,
+                               command_args=ls4_sync.command_args,
+                               ls4_events=ls4_sync.ls4_events,
+                               ls4_logger=ls4_logger, telemetry_interval=0)
+
+    # exposure N-1 is read out to buffer 1, and N to buffer 2 while N-1 is fetched
+    controller._set_fetch_pending(1)
+    readout_no = controller._fetch_pending.get(1)
+    controller._set_fetch_pending(2)
+
+    # the fetch of N-1 leaves N pending
+    controller._clear_fetch_pending(1, readout_no)
+    assert controller._fetch_pending == {2: 2}
+    assert controller.status & ControllerStatus.FETCH_PENDING
+
+    # a fetch of a buffer read out again since it started leaves the new readout
+    readout_no = controller._fetch_pending.get(2)
+    controller._set_fetch_pending(2)
+    controller._clear_fetch_pending(2, readout_no)
+    assert controller._fetch_pending == {2: 3}
+
+    controller._clear_fetch_pending(2, 3)
+    assert controller._fetch_pending == {}
+    assert not controller.status & ControllerStatus.FETCH_PENDING
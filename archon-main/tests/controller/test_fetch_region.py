@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_fetch_region.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import numpy
+
+from archon.controller.ls4_controller import region_block_ranges
+
+
+def test_region_block_ranges():
+    # 2 taps of 64 pixels in lines of 1024 pixels (2048 bytes, 2 blocks)
+    assert region_block_ranges([(0, 3, 0, 128)], 1024, 2, merge_blocks=0) == \
+        [(0, 1), (2, 3), (4, 5)]
+    # a region straddling a block boundary needs both blocks
+    assert region_block_ranges([(1, 2, 500, 520)], 1024, 2, merge_blocks=0) == [(2, 4)]
+    # close ranges are merged
+    assert region_block_ranges([(0, 3, 0, 128)], 1024, 2, merge_blocks=1) == [(0, 5)]
+    # overlapping rectangles share their blocks
+    assert region_block_ranges([(0, 1, 0, 64), (0, 1, 32, 128)], 1024, 2) == [(0, 1)]
+
+
+async def test_fetch_rects(sim_controller, sim_buffer):
+    sim, controller = sim_controller
+    frame, buffer_no = sim_buffer
+
+    rects = [(0, 100, 64, 192), (10, 20, 960, 1024)]
+    regions = await controller.fetch_rects(rects, buffer_no=buffer_no, window=4)
+
+    image = sim.buffer_data(buffer_no, 100 * 1024 * 2).view("<u2").reshape(100, 1024)
+    for (y0, y1, x0, x1), region in zip(rects, regions):
+        assert numpy.array_equal(region, image[y0:y1, x0:x1])
+
+    # one FETCH per line of the first region, the lines of the second are merged
+    assert 0 < sim.command_counts["FETCH"] <= 110
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_fetch_retry.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import numpy
+import pytest
+
+from archon.controller.ls4_controller import LS4ControllerError
+from archon.controller.ls4_params import LS4_BLOCK_SIZE, FETCH_MAX_RETRIES
+
+
+async def test_fetch_resumes_after_drops(sim_controller, sim_buffer):
+    sim, controller = sim_controller
+    frame, buffer_no = sim_buffer
+
+    # 100 lines of 1024 pixels are 200 blocks
+    sim.inject_fetch_fault("drop", 50)
+    sim.inject_fetch_fault("drop", 70)
+    data, __ = await controller.fetch(buffer_no=buffer_no, return_buffer=True)
+
+    image = sim.buffer_data(buffer_no, 100 * 1024 * 2).view("<u2").reshape(100, 1024)
+    assert numpy.array_equal(data, image)
+    assert controller.fetch_retries == 2
+    assert controller.reconnects == 2
+    assert sim.command_counts["FETCH"] == 3
+    controller.release_frame(buffer_no)
+
+    # the connection is usable after the fetch
+    assert (await controller.get_frame())[f"buf{buffer_no}complete"] == 1
+
+
+async def test_fetch_resumes_after_stall(sim_controller, sim_buffer):
+    sim, controller = sim_controller
+    frame, buffer_no = sim_buffer
+
+    sim.inject_fetch_fault("stall", 120)
+    data = numpy.zeros(200 * LS4_BLOCK_SIZE, dtype=numpy.uint8)
+    retries = await controller._fetch_resumable(buffer_no, frame[f"buf{buffer_no}base"],
+                                                200, data, stall_time=0.2)
+    assert retries == 1
+    assert numpy.array_equal(data, sim.buffer_data(buffer_no, 200 * LS4_BLOCK_SIZE))
+
+    # the retry budget is bounded
+    for __ in range(2):
+        sim.inject_fetch_fault("drop", 10)
+    with pytest.raises(LS4ControllerError):
+        await controller._fetch_resumable(buffer_no, frame[f"buf{buffer_no}base"],
+                                          200, data, max_retries=1)
+
+
+async def test_fetch_fails_unlocked(sim_controller, sim_buffer):
+    sim, controller = sim_controller
+    frame, buffer_no = sim_buffer
+    controller._set_fetch_pending(buffer_no)
+
+    commands = []
+    send_command = controller.send_command
+
+    def record_command(command_string, *args, **kwargs):
+        commands.append(command_string)
+        return send_command(command_string, *args, **kwargs)
+
+    controller.send_command = record_command
+
+    # every retry of the fetch is cut short
+    for __ in range(FETCH_MAX_RETRIES + 1):
+        sim.inject_fetch_fault("drop", 10)
+    with pytest.raises(LS4ControllerError):
+        await controller.fetch(buffer_no=buffer_no)
+
+    locks = [command for command in commands if command.startswith("LOCK")]
+    assert locks[0] == f"LOCK{buffer_no}"
+    assert locks[-1] == "LOCK0"
+    assert not await controller.is_fetching()
+    assert not await controller.is_fetch_pending()
+
+    # the buffer can be fetched again
+    data = await controller.fetch(buffer_no=buffer_no)
+    assert data.shape == (100, 1024)
+    controller.release_frame(buffer_no)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_frame_ring.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+
+import pytest
+
+from archon.controller.ls4_frame_ring import PAGE_SIZE, LS4_Frame_Ring, aligned_empty
+
+
+def test_aligned_empty():
+    data = aligned_empty(10000)
+    assert len(data) == 10000
+    assert data.ctypes.data % PAGE_SIZE == 0
+
+
+async def test_frame_ring_reuse():
+    ring = LS4_Frame_Ring()
+
+    frame_buffer = await ring.acquire(1, 4096)
+    data = frame_buffer.data
+    ring.hand_off(1)
+    ring.release(1)
+
+    frame_buffer = await ring.acquire(1, 2048)
+    assert frame_buffer.data is data
+    assert ring.allocations == 1
+
+    view = ring.receive_buffer(1028)
+    assert ring.receive_buffer(514).obj is view.obj
+    assert ring.allocations == 2
+
+
+async def test_frame_ring_wait_release():
+    ring = LS4_Frame_Ring()
+
+    await ring.acquire(2, 1024)
+    ring.hand_off(2)
+    assert ring.owners()[2] == "save"
+
+    with pytest.raises(RuntimeError):
+        await ring.acquire(2, 1024, timeout=0.01)
+
+    asyncio.get_running_loop().call_later(0.01, ring.release, 2)
+    frame_buffer = await ring.acquire(2, 1024, timeout=1)
+    assert frame_buffer.owner == "fetch"
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_latency.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+from archon.controller.ls4_latency import LS4_Latency
+
+
+def test_latency_histograms():
+    latency = LS4_Latency(name="ctrl1", buckets=[0.001, 0.01, 0.1])
+
+    for __ in range(98):
+        latency.record("STATUS", 0.0005)
+    latency.record("STATUS", 0.05)
+    latency.record("STATUS", 0.2)
+    latency.record("FRAME", 0.005)
+
+    summary = latency.summary()
+    assert list(summary) == ["FRAME", "STATUS"]
+    assert summary["STATUS"]["counts"] == [98, 0, 1, 1]
+    assert summary["STATUS"]["n"] == 100
+    assert summary["STATUS"]["p50"] == 0.001
+    assert summary["STATUS"]["p99"] == 0.1
+    assert summary["STATUS"]["max"] == 0.2
+    assert summary["FRAME"]["counts"] == [0, 1, 0, 0]
+    assert summary["FRAME"]["p99"] == 0.005
+
+
+def test_latency_slow_commands(mocker):
+    latency = LS4_Latency(name="ctrl1", slow_time=0.5, slow_times={"FETCH": 10.0})
+    warn = mocker.patch.object(latency, "warn")
+
+    latency.record("FETCH", 2.0)
+    latency.record("WCONFIG", 0.1)
+    assert warn.call_count == 0
+
+    latency.record("WCONFIG", 0.6, command=">01WCONFIG0000A=1")
+    assert warn.call_count == 1
+    assert ">01WCONFIG0000A=1" in warn.call_args[0][0]
+    assert latency.summary()["WCONFIG"]["slow"] == 1
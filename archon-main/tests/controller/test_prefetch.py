@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_prefetch.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import numpy
+import pytest
+
+
+@pytest.mark.sim(readout_time=5.0, lines=400)
+async def test_fetch_during_readout(sim_controller):
+    sim, controller = sim_controller
+
+    frame = await controller.readout_tracker.wait_start(max_wait=1.0)
+    wbuf = frame["wbuf"]
+    assert frame[f"buf{wbuf}complete"] == 0
+
+    # follow the readout as readout(progressive=True) does, counting the FETCHes
+    # sent before the buffer is complete
+    fetches_during_readout = []
+
+    # each FETCH is read into the binary reply buffer, without a reply per block
+    binary_replies = []
+    set_binary_reply_size = controller.set_binary_reply_size
+
+    def count_binary_replies(size):
+        binary_replies.append(size)
+        set_binary_reply_size(size)
+
+    controller.set_binary_reply_size = count_binary_replies
+
+    def on_progress(frame):
+        if frame[f"buf{wbuf}complete"] == 1:
+            fetches_during_readout.append(sim.command_counts["FETCH"])
+        controller._prefetch_progress(wbuf, frame)
+
+    controller._start_prefetch(wbuf, frame)
+    frame, done = await controller.readout_tracker.track(wbuf, 400, max_wait=5.0,
+                                                         on_progress=on_progress,
+                                                         progress_interval=0.02)
+    assert done
+    assert fetches_during_readout[0] > 0
+
+    n_fetch = sim.command_counts["FETCH"]
+    data, buffer_no = await controller.fetch(buffer_no=wbuf, return_buffer=True)
+    assert buffer_no == wbuf
+    image = sim.buffer_data(wbuf, 400 * 1024 * 2).view("<u2").reshape(400, 1024)
+    assert numpy.array_equal(data, image)
+
+    # the fetch only waited for the tail of the progressive fetch
+    assert sim.command_counts["FETCH"] - n_fetch <= 2
+    assert len(binary_replies) == sim.command_counts["FETCH"]
+    assert sum(binary_replies) == 400 * 2048 // 1024 * 1028
+    controller.release_frame(buffer_no)
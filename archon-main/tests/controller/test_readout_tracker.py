@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_readout_tracker.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import time
+
+from archon.controller.ls4_readout_tracker import LS4_Readout_Tracker
+
+
+def make_frame_source(total_lines, readout_time, stall_at=None, delay=0.0):
+    t_start = time.time() + delay
+
+    async def get_frame():
+        lines = max(0, int(total_lines * (time.time() - t_start) / readout_time))
+        if stall_at is not None:
+            lines = min(lines, stall_at)
+        complete = int(lines >= total_lines)
+        return {
+            "wbuf": 2,
+            "buf2lines": min(lines, total_lines),
+            "buf2pixels": 0,
+            "buf2complete": complete,
+        }
+
+    return get_frame
+
+
+async def test_readout_tracker_complete():
+    tracker = LS4_Readout_Tracker(make_frame_source(1000, 0.5))
+
+    frame = await tracker.wait_start(max_wait=1)
+    assert frame["wbuf"] == 2
+
+    t_start = time.time()
+    frame, done = await tracker.track(2, 1000, max_wait=5)
+    assert done
+    assert tracker.completed.is_set()
+    assert tracker.rate is not None and tracker.rate > 0
+    assert time.time() - t_start < 0.6
+    # far fewer polls than at a fixed 10 ms cadence
+    assert tracker.polls < 30
+
+
+async def test_readout_tracker_stall():
+    tracker = LS4_Readout_Tracker(make_frame_source(1000, 0.2, stall_at=500),
+                                  stall_time=0.1)
+
+    frame, done = await tracker.track(2, 1000, max_wait=5)
+    assert not done
+    assert not tracker.completed.is_set()
+    assert frame["buf2lines"] == 500
+
+
+async def test_readout_tracker_slow_start():
+    # no lines are written for longer than the stall time at the start
+    tracker = LS4_Readout_Tracker(make_frame_source(1000, 0.2, delay=0.3),
+                                  stall_time=0.1)
+
+    frame, done = await tracker.track(2, 1000, max_wait=5)
+    assert done
+    assert frame["buf2lines"] == 1000
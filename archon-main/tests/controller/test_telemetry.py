@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_telemetry.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+
+from archon.controller.ls4_telemetry import LS4_Telemetry
+
+
+def make_query(calls, delay=0.0):
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return {"n": len(calls)}
+
+    return query
+
+
+async def test_telemetry_max_age():
+    calls = []
+    telemetry = LS4_Telemetry(queries={"STATUS": make_query(calls)})
+
+    assert (await telemetry.get("STATUS", max_age=10))["n"] == 1
+    assert (await telemetry.get("STATUS", max_age=10))["n"] == 1
+    assert (await telemetry.get("STATUS", max_age=0))["n"] == 2
+    assert telemetry.hits["STATUS"] == 1
+    assert telemetry.misses["STATUS"] == 2
+
+    telemetry.invalidate()
+    assert (await telemetry.get("STATUS", max_age=10))["n"] == 3
+
+
+async def test_telemetry_coalesce():
+    calls = []
+    telemetry = LS4_Telemetry(queries={"FRAME": make_query(calls, delay=0.01)})
+
+    results = await asyncio.gather(*[telemetry.get("FRAME", max_age=1) for _ in range(5)])
+    assert len(calls) == 1
+    assert all(result["n"] == 1 for result in results)
+
+
+async def test_telemetry_poll():
+    calls = []
+    paused = False
+    telemetry = LS4_Telemetry(
+        queries={"STATUS": make_query(calls)},
+        intervals={"STATUS": 0.01},
+        paused=lambda: paused,
+    )
+
+    telemetry.start()
+    await asyncio.sleep(0.05)
+    assert len(calls) >= 2
+    assert (await telemetry.get("STATUS"))["n"] == len(calls)
+
+    paused = True
+    await asyncio.sleep(0.02)
+    n_calls = len(calls)
+    await asyncio.sleep(0.03)
+    assert len(calls) == n_calls
+
+    await telemetry.stop()
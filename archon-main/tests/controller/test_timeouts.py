@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_timeouts.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+import gc
+import weakref
+
+from archon.controller.command import ArchonCommand, ArchonCommandStatus
+from archon.controller.ls4_timeouts import LS4_Timeouts
+
+
+async def test_timeouts_expire_and_cancel():
+    timeouts = LS4_Timeouts()
+
+    slow = [ArchonCommand(f"WCONFIG{n:04X}A=1", n, timeout=0.05, timeouts=timeouts)
+            for n in range(1, 4)]
+    fast = ArchonCommand("STATUS", 10, timeout=0.05, timeouts=timeouts)
+    fast.process_reply(b"<0AVALID=1\n")
+    assert fast.status == ArchonCommandStatus.DONE
+
+    await asyncio.sleep(0.1)
+    assert all(cmd.status == ArchonCommandStatus.TIMEDOUT for cmd in slow)
+    assert fast.status == ArchonCommandStatus.DONE
+    assert timeouts.counts == {"WCONFIG": 3}
+    assert timeouts.pending() == 0
+    assert timeouts._handle is None
+
+
+async def test_timeouts_reset_on_reply():
+    timeouts = LS4_Timeouts()
+
+    cmd = ArchonCommand("FETCH0000000000000003", 1, expected_replies=3,
+                        timeout=0.05, timeouts=timeouts)
+    for __ in range(2):
+        await asyncio.sleep(0.03)
+        cmd.process_reply(b"<01:" + bytes(1024))
+    assert cmd.status == ArchonCommandStatus.RUNNING
+
+    await asyncio.sleep(0.08)
+    assert cmd.status == ArchonCommandStatus.TIMEDOUT
+    assert timeouts.counts == {"FETCH": 1}
+
+
+async def test_timeouts_cancel_drops_command():
+    timeouts = LS4_Timeouts()
+
+    cmd = ArchonCommand("STATUS", 1, timeout=10.0, timeouts=timeouts)
+    cmd.process_reply(b"<01VALID=1\n")
+    assert cmd.status == ArchonCommandStatus.DONE
+
+    # the heap entry stays until its deadline, without the command
+    ref = weakref.ref(cmd)
+    del cmd
+    gc.collect()
+    assert ref() is None
+    assert len(timeouts._heap) == 1
+    assert timeouts.pending() == 0
+
+    timeouts.stop()
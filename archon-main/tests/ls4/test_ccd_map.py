@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_ccd_map.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import json
+
+import numpy
+import pytest
+
+from archon.controller.ls4_logger import LS4_Logger
+from archon.ls4.ls4_ccd_map import LS4_CCD_Map
+
+
+# two CCDs, at locations A and E, read out through both amps
+TAPLINES = ["AD3L, 1, 4900", "AD4R, 1, 1000", "AD12L, 1, 5000", "AD11R, 1, 700"]
+PIXELS = 6
+LINES = 4
+
+
+def make_ccd_map(tmp_path, frame_mode):
+    map_file = tmp_path / "ccd_map.json"
+    map_file.write_text(json.dumps({"A": {"CCD_NAME": "S-003", "CCD_LOC": "ne_a"},
+                                    "E": {"CCD_NAME": "S-196", "CCD_LOC": "ne_e"}}))
+    ccd_map = LS4_CCD_Map(ls4_logger=LS4_Logger(name="test_ccd_map"),
+                          ls4_conf={"acf_file": "test.acf", "map_file": str(map_file),
+                                    "amp_direction": "both"})
+
+    config = {"PIXELCOUNT": str(PIXELS), "LINECOUNT": str(LINES),
+              "FRAMEMODE": str(frame_mode), "TAPLINES": str(len(TAPLINES))}
+    for tap_index, tapline in enumerate(TAPLINES):
+        config["TAPLINE%d" % tap_index] = tapline
+    ccd_map.update(acf_conf={"CONFIG": config})
+    return ccd_map
+
+
+@pytest.mark.parametrize("frame_mode", [0, 2])
+def test_amp_data(tmp_path, frame_mode):
+    ccd_map = make_ccd_map(tmp_path, frame_mode)
+    layout = ccd_map.layout
+    assert layout["FRAME_MODE"] == frame_mode
+
+    image_data = numpy.arange(numpy.prod(layout["SHAPE"]), dtype="<u2").reshape(layout["SHAPE"])
+    amp_data = ccd_map.get_amp_data(image_data)
+    assert sorted(amp_data) == [("A", "LEFT"), ("A", "RIGHT"), ("E", "LEFT"), ("E", "RIGHT")]
+
+    for (location, amp_name), data in amp_data.items():
+        tap_index = ccd_map.ccd_map[location]["TAP_INDICES"][
+            ccd_map.ccd_map[location]["AMP_NAMES"].index(amp_name)]
+        if frame_mode == 0:
+            expected = image_data[:, tap_index * PIXELS : (tap_index + 1) * PIXELS]
+        else:
+            # amp j of CCD i is in the j-th block of lines
+            y0 = (tap_index % 2) * LINES
+            x0 = (tap_index // 2) * PIXELS
+            expected = image_data[y0 : y0 + LINES, x0 : x0 + PIXELS]
+        assert data.shape == (LINES, PIXELS)
+        assert numpy.array_equal(data, expected)
+        assert numpy.shares_memory(data, image_data)
+
+        # the rectangle of the plan is the same as fetch_region uses
+        rects = ccd_map.get_region_rects(ccd_location=location, amp_name=amp_name)
+        assert rects == [layout["AMPS"][(location, amp_name)]["RECT"]]
+
+    # a frame buffer of another shape is sliced from the rectangles
+    larger = numpy.zeros((layout["SHAPE"][0] + 1, layout["SHAPE"][1]), dtype="<u2")
+    larger[0 : layout["SHAPE"][0]] = image_data
+    for key, data in ccd_map.get_amp_data(larger).items():
+        assert numpy.array_equal(data, amp_data[key])
+
+
+def test_unsupported_frame_mode(tmp_path):
+    ccd_map = make_ccd_map(tmp_path, 1)
+    assert ccd_map.layout is None
+    with pytest.raises(ValueError):
+        ccd_map.get_amp_data(numpy.zeros((LINES, PIXELS * 4), dtype="<u2"))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_exposure_sequence.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import os
+import platform
+import shutil
+import tempfile
+
+import pytest
+from astropy.io import fits
+
+from archon.controller.ls4_archon_sim import LS4_Archon_Sim
+from archon.controller.ls4_logger import LS4_Logger
+from archon.ls4.ls4_control import LS4_Control
+from archon.ls4.ls4_exp_modes import exp_mode_first, exp_mode_next, exp_mode_last, \
+    exp_mode_single
+
+
+CONF_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "..", "conf")
+
+
+def make_conf(data_path, num_exp, write_behind=False):
+
+    return {
+        "name_list": ["ctrl1"], "enable_list": ["ctrl1"], "leader": "ctrl1",
+        "ip_list": ["127.0.0.1"], "bind_list": ["127.0.0.1"], "port_list": [0],
+        "conf_path": CONF_PATH, "acf_list": ["northeast.acf"],
+        "map_list": ["northeast.json"], "data_path": data_path,
+        "image_prefix": "seq", "exptime": 0.0, "num_exp": num_exp,
+        "log_level": "WARN", "sync": True, "test": False, "save": "True",
+        "fake": False, "clear_time": 0.0, "power_down": False,
+        "initial_clear": False, "idle_function": "none", "exp_incr": 0.0,
+        "delay": 0.0, "shutter_mode": "open", "server_name": platform.node(),
+        "server_port": 5000, "status_port": 5001, "reset": False,
+        "initial_reboot": False, "amp_direction": "both", "telemetry_interval": 0.0,
+        "write_behind": write_behind, "init_count": 0,
+    }
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+async def test_exposure_sequence_saves_every_exposure(write_behind):
+    # the fetch of each exposure outlasts the readout of the next, which ends
+    # while the fetch is running. Each exposure has its own exposure time, to
+    # tell which one each file holds. The data path goes to the FITS headers, so
+    # it is kept short.
+    data_path = tempfile.mkdtemp(prefix="seq")
+    ls4_logger = LS4_Logger(name="test")
+    ls4_logger.set_level("WARN")
+    sim = LS4_Archon_Sim(readout_time=1.0, rtt=0.0, ls4_logger=ls4_logger)
+    sim.load_acf(os.path.join(CONF_PATH, "northeast.acf"))
+    await sim.start("127.0.0.1", 4242)
+
+    num_exp = 4
+    exptimes = [0.1 * (exp_num + 1) for exp_num in range(num_exp)]
+    ls4_ctrl = LS4_Control(logger=ls4_logger, init_conf=make_conf(data_path, num_exp, write_behind))
+    try:
+        await ls4_ctrl.initialize()
+        await ls4_ctrl.start()
+
+        for exp_num in range(num_exp):
+            exp_mode = exp_mode_first if exp_num == 0 else exp_mode_next
+            error_msg = await ls4_ctrl.expose(exptime=exptimes[exp_num], exp_num=exp_num,
+                                              enable_shutter=True, exp_mode=exp_mode)
+            assert error_msg is None
+        error_msg = await ls4_ctrl.expose(exptime=0.0, exp_num=num_exp - 1,
+                                          enable_shutter=True, exp_mode=exp_mode_last)
+        assert error_msg is None
+    finally:
+        await ls4_ctrl.stop(power_down=False)
+        await sim.stop()
+
+    # stopping saved the images, and stopped the write-behind save queue
+    save_queue = ls4_ctrl.enabled_cam_list[0].save_queue
+    assert (save_queue is not None) == write_behind
+    if save_queue is not None:
+        assert save_queue.depth == 0 and save_queue._task is None
+
+    # in exp_mode_next, the files are named after the exposure fetched, not
+    # the one started
+    saved = {name.rsplit("_", 1)[0] for name in os.listdir(data_path)}
+    assert saved == {"seqC0_%05d" % exp_num for exp_num in range(num_exp)}
+    for exp_num in range(num_exp):
+        header = fits.getheader(os.path.join(data_path, "seqC0_%05d_00.fits" % exp_num))
+        assert header["EXPTIME"] == pytest.approx(exptimes[exp_num])
+    shutil.rmtree(data_path)
+
+
+async def test_exposure_amp_headers():
+    # each amp file has the header info of its own amp, though the amps are
+    # written concurrently. The data path goes to the FITS headers, so it is
+    # kept short.
+    data_path = tempfile.mkdtemp(prefix="amp")
+    ls4_logger = LS4_Logger(name="test")
+    ls4_logger.set_level("WARN")
+    sim = LS4_Archon_Sim(readout_time=0.5, rtt=0.0, ls4_logger=ls4_logger)
+    sim.load_acf(os.path.join(CONF_PATH, "northeast.acf"))
+    await sim.start("127.0.0.1", 4242)
+
+    ls4_ctrl = LS4_Control(logger=ls4_logger, init_conf=make_conf(data_path, 1))
+    try:
+        await ls4_ctrl.initialize()
+        await ls4_ctrl.start()
+        error_msg = await ls4_ctrl.expose(exptime=0.0, exp_num=0,
+                                          enable_shutter=True, exp_mode=exp_mode_single)
+        assert error_msg is None
+        ccd_map = ls4_ctrl.enabled_cam_list[0].ls4_ccd_map.ccd_map
+    finally:
+        await ls4_ctrl.stop(power_down=False)
+        await sim.stop()
+
+    expected = [(ccd_info["CCD_LOC"], ccd_info["AMP_NAMES"][amp_index])
+                for ccd_info in ccd_map.values() for amp_index in range(2)]
+    for image_index, (ccd_loc, amp_name) in enumerate(expected):
+        header = fits.getheader(os.path.join(data_path, "seqC0_00000_%02d.fits" % image_index))
+        assert header["CCD_LOC"] == ccd_loc
+        assert header["AMP_NAME"] == amp_name
+        assert header["RELEASE-LAT"] >= 0.0
+    assert len(set(expected)) == len(expected)
+    shutil.rmtree(data_path)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_fetch_scheduler.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+import time
+
+from archon.ls4.ls4_fetch_scheduler import LS4_Fetch_Scheduler
+
+
+async def fetch(scheduler, name, order, duration=0.05, deadline=None):
+    async with scheduler.slot(name, deadline=deadline):
+        order.append((name, scheduler.n_active))
+        await asyncio.sleep(duration)
+
+
+async def test_fetch_scheduler_limit_and_order():
+    scheduler = LS4_Fetch_Scheduler(max_fetches=1)
+    scheduler.record_save("slow", 2.0)
+    scheduler.record_save("fast", 0.1)
+
+    order = []
+    first = asyncio.create_task(fetch(scheduler, "first", order))
+    await asyncio.sleep(0)
+    # for equal deadlines, the fetch whose save takes longest goes first
+    await asyncio.gather(first, fetch(scheduler, "fast", order), fetch(scheduler, "slow", order))
+
+    assert order == [("first", 1), ("slow", 1), ("fast", 1)]
+    assert scheduler.n_active == 0
+    assert scheduler.counts == {"immediate": 1, "waited": 2}
+
+
+async def test_fetch_scheduler_deadline():
+    scheduler = LS4_Fetch_Scheduler(max_fetches=1, margin=1.0)
+    scheduler.record_fetch("late", 1000, 0.1)
+    assert scheduler.predict("late") == 0.1
+
+    order = []
+    first = asyncio.create_task(fetch(scheduler, "first", order, duration=0.5))
+    await asyncio.sleep(0)
+    # "late" must start within 0.1 sec to end before its deadline, so it does not
+    # wait for "first" to end
+    await asyncio.gather(first, fetch(scheduler, "late", order, deadline=time.time() + 0.2))
+
+    assert order == [("first", 1), ("late", 2)]
+    assert scheduler.counts["forced"] == 1
+    assert scheduler.n_active == 0
+
+
+def test_fetch_scheduler_rates():
+    scheduler = LS4_Fetch_Scheduler(smoothing=0.5)
+    assert scheduler.predict("ctrl1") is None
+
+    scheduler.record_fetch("ctrl1", 1000, 1.0)
+    scheduler.record_fetch("ctrl1", 1000, 0.5)
+    assert scheduler.rates["ctrl1"] == 1500
+    assert scheduler.summary("ctrl1")["predicted"] == 1000 / 1500
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_fits_writer.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+import os
+
+import numpy
+import pytest
+from astropy.io import fits
+
+from archon.ls4.ls4_fits_writer import LS4_FITS_Writer
+
+
+async def test_fits_writer(tmp_path):
+    writer = LS4_FITS_Writer(max_workers=2)
+    frame = numpy.arange(64 * 32, dtype="<u2").reshape(64, 32)
+    header_info = {"ccd_name": "S-003", "actexpt": 1.23456, "exptime": 1.0}
+    cards = await writer.render(header_info)
+
+    # views of one frame buffer, written at once
+    names = [str(tmp_path / ("image_%02d.fits" % n)) for n in range(4)]
+    await asyncio.gather(*(writer.write_cards(name, frame[:, n * 8 : (n + 1) * 8], cards, {})
+                           for n, name in enumerate(names)))
+    assert writer.n_written == 4
+
+    for n, name in enumerate(names):
+        with fits.open(name) as hdul:
+            assert numpy.array_equal(hdul[0].data, frame[:, n * 8 : (n + 1) * 8])
+            assert hdul[0].header["CCD_NAME"] == "S-003"
+            assert hdul[0].header["ACTEXPT"] == 1.235
+    assert header_info["actexpt"] == 1.23456
+
+    with pytest.raises(RuntimeError):
+        await writer.write_cards(str(tmp_path / "missing" / "image.fits"), frame, cards, {})
+
+    writer.shutdown()
+
+
+async def test_fits_writer_header_copied(tmp_path):
+    writer = LS4_FITS_Writer(max_workers=2)
+    frame = numpy.zeros((8, 8), dtype="<u2")
+    cards = await writer.render({"exptime": 1.0})
+    amp_info = {}
+
+    # the amp info is updated for each amp before the files are written
+    writes = []
+    for n in range(4):
+        amp_info["amp_name"] = "AMP%d" % n
+        writes.append(writer.write_cards(str(tmp_path / ("image_%02d.fits" % n)), frame, cards,
+                                         amp_info))
+    await asyncio.gather(*writes)
+
+    for n in range(4):
+        assert fits.getheader(str(tmp_path / ("image_%02d.fits" % n)))["AMP_NAME"] == "AMP%d" % n
+
+    writer.shutdown()
+
+
+async def test_fits_writer_mef_parts(tmp_path):
+    writer = LS4_FITS_Writer(max_workers=2)
+    frame = numpy.arange(16 * 16, dtype="<u2").reshape(16, 16)
+
+    def part(name):
+        primary_info = {"exptime": 1.0, "name": name}
+        extensions = [("%s_%s" % (name.upper(), amp), frame[:, n * 8 : (n + 1) * 8],
+                       {"amp_name": amp}) for n, amp in enumerate(["LEFT", "RIGHT"])]
+        return primary_info, extensions
+
+    # the parts of the exposure file are added by two controllers
+    image_name = str(tmp_path / "image_00001.fits")
+    await asyncio.gather(writer.write_part(image_name, 1, 2, *part("ctrl2")),
+                         writer.write_part(image_name, 0, 2, *part("ctrl1")))
+    assert writer.n_written == 1
+
+    with fits.open(image_name) as hdul:
+        assert hdul[0].data is None
+        assert hdul[0].header["NEXTEND"] == 4
+        assert hdul[0].header["EXPTIME"] == 1.0
+        assert "NAME" not in hdul[0].header
+        assert [hdu.name for hdu in hdul[1:]] == ["CTRL1_LEFT", "CTRL1_RIGHT",
+                                                  "CTRL2_LEFT", "CTRL2_RIGHT"]
+        assert hdul["CTRL2_RIGHT"].header["NAME"] == "ctrl2"
+        assert hdul["CTRL2_RIGHT"].header["AMP_NAME"] == "RIGHT"
+        assert numpy.array_equal(hdul["CTRL1_RIGHT"].data, frame[:, 8:16])
+
+    # a missing part is given up after the timeout, and written alone if late
+    image_name = str(tmp_path / "image_00002.fits")
+    await writer.write_part(image_name, 0, 2, *part("ctrl1"), timeout=0.1)
+    with fits.open(image_name) as hdul:
+        assert len(hdul) == 3
+    await writer.write_part(image_name, 1, 2, *part("ctrl2"), timeout=0.1)
+    with fits.open(str(tmp_path / "image_00002_p01.fits")) as hdul:
+        assert hdul[1].name == "CTRL2_LEFT"
+
+    writer.shutdown()
+
+
+async def test_fits_writer_mef_name_reused(tmp_path):
+    writer = LS4_FITS_Writer(max_workers=2)
+    frame = numpy.zeros((8, 8), dtype="<u2")
+
+    def part(name, exptime):
+        return {"exptime": exptime}, [(name.upper(), frame, {"name": name})]
+
+    # a new exposure with the name of one already written gets a new file
+    image_name = str(tmp_path / "image_00001.fits")
+    for exptime in [1.0, 2.0]:
+        await asyncio.gather(writer.write_part(image_name, 0, 2, *part("ctrl1", exptime)),
+                             writer.write_part(image_name, 1, 2, *part("ctrl2", exptime)))
+        with fits.open(image_name) as hdul:
+            assert hdul[0].header["EXPTIME"] == exptime
+            assert [hdu.name for hdu in hdul[1:]] == ["CTRL1", "CTRL2"]
+    assert writer.n_written == 2
+    assert sorted(os.listdir(tmp_path)) == ["image_00001.fits"]
+
+    # and after a part of the last file was written late
+    await writer.write_part(image_name, 0, 2, *part("ctrl1", 3.0), timeout=0.1)
+    await writer.write_part(image_name, 1, 2, *part("ctrl2", 3.0), timeout=0.1)
+    await asyncio.gather(writer.write_part(image_name, 1, 2, *part("ctrl2", 4.0)),
+                         writer.write_part(image_name, 0, 2, *part("ctrl1", 4.0)))
+    with fits.open(image_name) as hdul:
+        assert hdul[0].header["EXPTIME"] == 4.0
+        assert len(hdul) == 3
+    assert sorted(os.listdir(tmp_path)) == ["image_00001.fits", "image_00001_p01.fits"]
+
+    writer.shutdown()
+
+
+@pytest.mark.parametrize("dtype", ["i1", "u1", "<u2", "<u4", "<i2", "<f4", ">u2"])
+async def test_fits_writer_cards(tmp_path, dtype):
+    writer = LS4_FITS_Writer(max_workers=2)
+    frame = numpy.arange(64 * 32).reshape(64, 32).astype(dtype)
+    shared_info = {"exptime": 1.0, "actexpt": 1.23456, "a_long_keyword": "value"}
+    amp_info = {"CCD_LOC": "NE_A", "AMP_NAME": "LEFT", "TAP_INDEX": 0}
+
+    # the shared cards are rendered once, and each amp adds its own
+    cards = await writer.render(shared_info)
+    await writer.write_cards(str(tmp_path / "cards.fits"), frame[:, 8:16], cards, amp_info)
+
+    # the same file written by astropy, with the keys longer than 8 characters
+    # as HIERARCH cards, and actexpt rounded to msec
+    hdu = fits.PrimaryHDU(frame[:, 8:16])
+    for key, value in [("exptime", 1.0), ("actexpt", 1.235),
+                       ("HIERARCH a_long_keyword", "value"), ("CCD_LOC", "NE_A"),
+                       ("AMP_NAME", "LEFT"), ("HIERARCH TAP_INDEX", 0)]:
+        hdu.header[key] = value
+    hdu.writeto(str(tmp_path / "astropy.fits"))
+
+    assert (tmp_path / "cards.fits").read_bytes() == (tmp_path / "astropy.fits").read_bytes()
+    with fits.open(str(tmp_path / "cards.fits")) as hdul:
+        hdul.verify("exception")
+        assert numpy.array_equal(hdul[0].data, frame[:, 8:16])
+
+    writer.shutdown()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# @Filename: test_save_queue.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+
+import asyncio
+
+import pytest
+
+from archon.ls4.ls4_save_queue import LS4_Save_Queue
+
+
+def make_save(name, saved, duration=0.05, fail=False):
+
+    async def save():
+        await asyncio.sleep(duration)
+        if fail:
+            raise OSError("disk full")
+        saved.append(name)
+
+    return save
+
+
+async def test_save_queue_order_and_budget():
+    updates = []
+    queue = LS4_Save_Queue(max_bytes=200, on_update=lambda: updates.append(queue.depth))
+    saved = []
+
+    # the third save waits for room in the queue
+    await queue.put("image_0", 100, make_save("image_0", saved))
+    await queue.put("image_1", 100, make_save("image_1", saved))
+    assert queue.depth == 2 and queue.n_bytes == 200
+    put = asyncio.create_task(queue.put("image_2", 100, make_save("image_2", saved)))
+    await asyncio.sleep(0.02)
+    assert not put.done() and saved == []
+
+    await put
+    assert saved == ["image_0"]
+
+    await queue.wait_saved("image_1")
+    assert saved == ["image_0", "image_1"]
+
+    await queue.flush()
+    assert saved == ["image_0", "image_1", "image_2"]
+    assert queue.metrics()["depth"] == 0 and queue.metrics()["saved"] == 3
+    assert queue.n_bytes == 0
+    assert queue.wait_time > 0
+    assert max(updates) == 2 and updates[-1] == 0
+
+    # one save is always accepted, even over the budget
+    await queue.put("image_3", 1000, make_save("image_3", saved))
+    await queue.stop()
+    assert saved[-1] == "image_3"
+
+
+async def test_save_queue_errors():
+    queue = LS4_Save_Queue(max_bytes=1000)
+    saved = []
+
+    await queue.put("image_0", 100, make_save("image_0", saved, fail=True))
+    await queue.put("image_1", 100, make_save("image_1", saved))
+
+    with pytest.raises(OSError):
+        await queue.wait_saved("image_0")
+    await queue.wait_saved("image_1")
+    assert saved == ["image_1"]
+    assert queue.metrics()["errors"] == 1
+
+    await queue.put("image_2", 100, make_save("image_2", saved, fail=True))
+    with pytest.raises(RuntimeError):
+        await queue.flush()
+
+    # unknown images are not waited for
+    await queue.wait_saved("image_9")
+    await queue.stop()
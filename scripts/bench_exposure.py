@@ -0,0 +1,389 @@
+#!/home/ls4/observer_venv/bin/python
+# -*- coding: utf-8 -*-
+#
+# @Filename: bench_exposure.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# End-to-end benchmark of LS4_Control.expose: a sequence of N exposures taken
+# as by LS4_Control's go(), with exp_mode_first for the first exposure,
+# exp_mode_next for the others, and exp_mode_last to fetch the final one. With
+# --single, each exposure is taken with exp_mode_single instead.
+#
+# The controllers are either the fake controllers of LS4Controller (--fake),
+# or simulated Archons (ls4_archon_sim.py), one per controller, listening on
+# 127.0.0.1, 127.0.0.2, ... at port 4242, so that the TCP and FETCH code of
+# LS4Controller is exercised. The simulators are loaded with the ACF files
+# from --conf_path. With --nic_bandwidth, their FETCH replies share the
+# bandwidth of one host interface.
+#
+# For each controller, and for each phase (expose, readout, fetch, save) timed
+# by the TimePeriod timers of LS4_Camera, the benchmark reports the p50, p95
+# and p99 times, and the number of frames per hour. It also reports the lag of
+# the asyncio event loop and the peak resident memory of the process. With
+# --output, the results are saved as JSON, to compare runs. The benchmark fails
+# if the images of any exposure are not saved.
+#
+# usage: bench_exposure.py [--num_exp 10] [--exptime 1] [--fake] [--single] [--output results.json]
+#
+################################
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy
+
+from archon.controller.ls4_archon_sim import LS4_Archon_Sim, LS4_Sim_Link
+from archon.controller.ls4_logger import LS4_Logger
+from archon.ls4 import ls4_fits_writer
+from archon.ls4.ls4_control import LS4_Control
+from archon.ls4.ls4_exp_modes import exp_mode_first, exp_mode_next, exp_mode_last, \
+    exp_mode_single
+
+NAMES = ["ctrl1", "ctrl2", "ctrl3", "ctrl4"]
+ACF_LIST = ["northeast.acf", "southeast.acf", "northwest.acf", "southwest.acf"]
+MAP_LIST = ["northeast.json", "southeast.json", "northwest.json", "southwest.json"]
+PHASES = ["expose", "readout", "fetch", "save"]
+ARCHON_PORT = 4242
+
+
+class LoopLag():
+    """ measure how late the event loop wakes up a task sleeping every interval sec """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(loop.time() - t - self.interval)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+class PhaseTimes():
+    """ collect the periods of the TimePeriod timers of each LS4_Camera """
+
+    def __init__(self, cams):
+        self.cams = cams
+        self.samples = {cam.ls4_conf["name"]: {phase: [] for phase in PHASES} for cam in cams}
+        self.last_end = {name: {phase: None for phase in PHASES} for name in self.samples}
+
+    def update(self):
+        """ record the periods of the timers that ended since the last update """
+
+        for cam in self.cams:
+            name = cam.ls4_conf["name"]
+            for phase in PHASES:
+                period = cam.timing[phase]
+                # end_time is only a float once the period has ended
+                if self.last_end[name][phase] == "recorded":
+                    continue
+                if isinstance(period.end_time, float) and period.end_time > 0 and \
+                   period.end_time != self.last_end[name][phase]:
+                    self.last_end[name][phase] = period.end_time
+                    self.samples[name][phase].append(period.period)
+
+    def record_saves(self):
+        """ record the period of each save as it ends. With write-behind, the saves
+            end between exposures, and one may start as soon as the previous ends.
+        """
+
+        for cam in self.cams:
+            name = cam.ls4_conf["name"]
+            self.last_end[name]["save"] = "recorded"
+            cam.save_image = self._recorded_save(cam, cam.save_image, self.samples[name]["save"])
+
+    @staticmethod
+    def _recorded_save(cam, save_image, samples):
+
+        async def recorded_save(*args, **kwargs):
+            await save_image(*args, **kwargs)
+            samples.append(cam.timing["save"].period)
+
+        return recorded_save
+
+
+def percentiles(values):
+    """ return a dictionary with the number, p50, p95, p99 and max of values """
+
+    if len(values) == 0:
+        return {"n": 0}
+    p50, p95, p99 = numpy.percentile(values, [50, 95, 99])
+    return {"n": len(values), "p50": float(p50), "p95": float(p95),
+            "p99": float(p99), "max": float(numpy.max(values))}
+
+
+def make_conf(args, data_path, n_controllers):
+
+    names = NAMES[0:n_controllers]
+    if args.fake:
+        ip_list = ["127.0.0.1"] * n_controllers
+    else:
+        ip_list = ["127.0.0.%d" % (index + 1) for index in range(n_controllers)]
+
+    return {
+        "name_list": names, "enable_list": names, "leader": names[0],
+        "ip_list": ip_list, "bind_list": ["127.0.0.1"] * n_controllers,
+        "port_list": [0] * n_controllers,
+        "conf_path": args.conf_path, "acf_list": ACF_LIST[0:n_controllers],
+        "map_list": MAP_LIST[0:n_controllers], "data_path": data_path,
+        "image_prefix": "bench", "exptime": args.exptime, "num_exp": args.num_exp,
+        "log_level": args.log_level, "sync": True, "test": False,
+        "save": args.save, "fake": args.fake, "clear_time": 0.0,
+        "power_down": False, "initial_clear": False, "idle_function": "none",
+        "exp_incr": 0.0, "delay": 0.0, "shutter_mode": "open",
+        "server_name": platform.node(), "server_port": 5000, "status_port": 5001,
+        "reset": False, "initial_reboot": False, "amp_direction": "both",
+        "telemetry_interval": args.telemetry_interval, "pre_arm": args.pre_arm,
+        "progressive_fetch": args.progressive_fetch, "max_fetches": args.max_fetches,
+        "data_connection": args.data_connection, "fits_writers": args.fits_writers,
+        "write_behind": args.write_behind, "fits_mode": args.fits_mode,
+        "init_count": 0,
+    }
+
+
+async def run_sequence(args, ls4_ctrl, phase_times):
+    """ take num_exp exposures as LS4_Control's go() does. Return the elapsed time. """
+
+    t_start = time.time()
+    if args.single:
+        for exp_num in range(args.num_exp):
+            error_msg = await ls4_ctrl.expose(exptime=args.exptime, exp_num=exp_num,
+                                              enable_shutter=True, exp_mode=exp_mode_single)
+            if error_msg is not None:
+                raise RuntimeError("exposure %d failed: %s" % (exp_num, error_msg))
+            phase_times.update()
+        await ls4_ctrl.flush_saves()
+        phase_times.update()
+        return time.time() - t_start
+
+    for exp_num in range(args.num_exp):
+        exp_mode = exp_mode_first if exp_num == 0 else exp_mode_next
+        error_msg = await ls4_ctrl.expose(exptime=args.exptime, exp_num=exp_num,
+                                          enable_shutter=True, exp_mode=exp_mode)
+        if error_msg is not None:
+            raise RuntimeError("exposure %d failed: %s" % (exp_num, error_msg))
+        phase_times.update()
+
+    error_msg = await ls4_ctrl.expose(exptime=args.exptime, exp_num=args.num_exp - 1,
+                                      enable_shutter=True, exp_mode=exp_mode_last)
+    if error_msg is not None:
+        raise RuntimeError("last exposure failed: %s" % error_msg)
+    await ls4_ctrl.flush_saves()
+    phase_times.update()
+
+    return time.time() - t_start
+
+
+def missing_images(args, data_path):
+    """ return the names of the images of the sequence not found in data_path.
+        The images of each exposure are one file per amp, per controller, or per
+        exposure, depending on fits_mode.
+    """
+
+    missing = []
+    for exp_num in range(args.num_exp):
+        if args.fits_mode == "exposure":
+            names = ["bench_%05d.fits" % exp_num]
+        elif args.fits_mode == "controller":
+            names = ["benchC%d_%05d.fits" % (index, exp_num) for index in range(args.controllers)]
+        else:
+            names = ["benchC%d_%05d_*.fits" % (index, exp_num) for index in range(args.controllers)]
+        missing += [name for name in names if len(glob.glob(os.path.join(data_path, name))) == 0]
+
+    return missing
+
+
+def slow_disk(delay):
+    """ make each FITS file, single or multi-extension, take delay sec longer to
+        write, in the writer thread
+    """
+
+    for name in ["write_fits_cards", "write_mef"]:
+        write = getattr(ls4_fits_writer, name)
+
+        def slow_write(*args, write=write):
+            time.sleep(delay)
+            write(*args)
+
+        setattr(ls4_fits_writer, name, slow_write)
+
+
+async def main(args):
+
+    ls4_logger = LS4_Logger(name="bench")
+    ls4_logger.set_level(args.log_level)
+
+    if args.disk_delay_ms > 0:
+        slow_disk(args.disk_delay_ms * 1e-3)
+
+    data_path = args.data_path or tempfile.mkdtemp(prefix="bench_exposure_")
+    conf = make_conf(args, data_path, args.controllers)
+
+    sims = []
+    link = None
+    if args.nic_bandwidth > 0:
+        link = LS4_Sim_Link(args.nic_bandwidth * 1e6)
+    if not args.fake:
+        for index in range(args.controllers):
+            sim = LS4_Archon_Sim(readout_time=args.readout_time,
+                                 bandwidth=args.bandwidth * 1e6,
+                                 rtt=args.rtt_ms * 1e-3,
+                                 link=link,
+                                 ls4_logger=ls4_logger)
+            sim.load_acf(os.path.join(args.conf_path, ACF_LIST[index]))
+            await sim.start(conf["ip_list"][index], ARCHON_PORT)
+            sims.append(sim)
+
+    ls4_ctrl = LS4_Control(logger=ls4_logger, init_conf=conf)
+    await ls4_ctrl.initialize()
+    await ls4_ctrl.start()
+
+    phase_times = PhaseTimes(ls4_ctrl.enabled_cam_list)
+    lag = LoopLag()
+    lag.start()
+    if args.write_behind:
+        phase_times.record_saves()
+    try:
+        elapsed = await run_sequence(args, ls4_ctrl, phase_times)
+    finally:
+        await lag.stop()
+        await ls4_ctrl.stop(power_down=False)
+        for sim in sims:
+            await sim.stop()
+
+    results = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+        "host": platform.node(),
+        "python": sys.version.split()[0],
+        "settings": vars(args),
+        "elapsed": elapsed,
+        "loop_lag": percentiles(lag.lags),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "controllers": {},
+        "missing": missing_images(args, data_path) if args.save else [],
+    }
+
+    for name, samples in phase_times.samples.items():
+        n_frames = len(samples["save"]) if args.save else len(samples["fetch"])
+        results["controllers"][name] = {
+            "frames": n_frames,
+            "frames_per_hour": 3600 * n_frames / elapsed,
+            "phases": {phase: percentiles(samples[phase]) for phase in PHASES},
+        }
+
+    print("%d exposures in %8.3f sec, loop lag p99 %7.4f max %7.4f sec, peak RSS %8.1f MB" %
+          (args.num_exp, elapsed, results["loop_lag"].get("p99", 0.0),
+           results["loop_lag"].get("max", 0.0), results["peak_rss_mb"]))
+    print("%-6s %8s  " % ("ctrl", "frame/hr") +
+          "  ".join(["%-23s" % ("%s p50/p95/p99" % phase) for phase in PHASES]))
+    for name, result in results["controllers"].items():
+        line = "%-6s %8.1f  " % (name, result["frames_per_hour"])
+        for phase in PHASES:
+            p = result["phases"][phase]
+            if p["n"] > 0:
+                line += "%7.3f/%7.3f/%7.3f  " % (p["p50"], p["p95"], p["p99"])
+            else:
+                line += "%-23s  " % "-"
+        print(line)
+
+    # a phase without times is reported as such, rather than left out
+    for phase in PHASES:
+        names = [name for name, result in results["controllers"].items()
+                 if result["phases"][phase]["n"] == 0]
+        if len(names) > 0:
+            reason = " (exposures of 0 sec are not timed)" if phase == "expose" and \
+                     args.exptime <= 0 else ""
+            print("no %s times for %s%s" % (phase, ", ".join(names), reason))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print("results saved to %s" % args.output)
+
+    if len(results["missing"]) > 0:
+        raise RuntimeError("%d images of %d exposures not saved to %s: %s" %
+                           (len(results["missing"]), args.num_exp, data_path,
+                            ", ".join(results["missing"])))
+
+
+if __name__ == "__main__":
+
+    conf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "conf")
+
+    parser = argparse.ArgumentParser(description="benchmark LS4_Control exposure sequences")
+    parser.add_argument("--num_exp", type=int, default=10,
+                        help="number of exposures in the sequence")
+    parser.add_argument("--exptime", type=float, default=1.0,
+                        help="exposure time (sec). Exposures of 0 sec are not timed")
+    parser.add_argument("--controllers", type=int, default=4,
+                        help="number of controllers (1 to 4)")
+    parser.add_argument("--fake", action="store_true",
+                        help="use the fake controllers rather than simulated Archons")
+    parser.add_argument("--single", action="store_true",
+                        help="take each exposure with exp_mode_single (acquire, then fetch)")
+    parser.add_argument("--save", type=str, default="True",
+                        help="save the images, True or False")
+    parser.add_argument("--pre_arm", type=str, default="False",
+                        help="stage the next exposure after each readout, True or False")
+    parser.add_argument("--progressive_fetch", type=str, default="False",
+                        help="fetch the images during the readout, True or False")
+    parser.add_argument("--write_behind", type=str, default="False",
+                        help="save the images in the background while fetching the next, True or False")
+    parser.add_argument("--disk_delay_ms", type=float, default=0.0,
+                        help="simulated extra time (msec) to write each FITS file, for a slow disk")
+    parser.add_argument("--fits_writers", type=int, default=2,
+                        help="number of threads writing FITS files")
+    parser.add_argument("--fits_mode", type=str, default="amp",
+                        help="FITS files written: amp, controller or exposure")
+    parser.add_argument("--data_connection", type=str, default="False",
+                        help="fetch on a second connection to each controller, True or False")
+    parser.add_argument("--telemetry_interval", type=float, default=1.0,
+                        help="cadence (sec) of controller status polling")
+    parser.add_argument("--readout_time", type=float, default=5.0,
+                        help="simulated time to read out a full frame (sec)")
+    parser.add_argument("--bandwidth", type=float, default=100.0,
+                        help="simulated network bandwidth (MB/sec)")
+    parser.add_argument("--nic_bandwidth", type=float, default=0.0,
+                        help="simulated bandwidth (MB/sec) of the host interface shared by "
+                             "the controllers, 0 if not shared")
+    parser.add_argument("--max_fetches", type=int, default=2,
+                        help="number of controllers fetching at once, 0 for no limit")
+    parser.add_argument("--rtt_ms", type=float, default=0.2,
+                        help="simulated network round-trip time (msec)")
+    parser.add_argument("--conf_path", type=str, default=os.path.normpath(conf_path),
+                        help="directory of the ACF and CCD map files")
+    parser.add_argument("--data_path", type=str, default=None,
+                        help="directory for the images (default: a new temporary directory)")
+    parser.add_argument("--log_level", type=str, default="WARN",
+                        help="logging level")
+    parser.add_argument("--output", type=str, default=None,
+                        help="JSON file for the results")
+    args = parser.parse_args()
+    args.save = args.save.lower() in ["true", "1", "yes"]
+    args.pre_arm = args.pre_arm.lower() in ["true", "1", "yes"]
+    args.progressive_fetch = args.progressive_fetch.lower() in ["true", "1", "yes"]
+    args.data_connection = args.data_connection.lower() in ["true", "1", "yes"]
+    args.write_behind = args.write_behind.lower() in ["true", "1", "yes"]
+    assert 1 <= args.controllers <= len(NAMES), "controllers must be 1 to %d" % len(NAMES)
+    asyncio.run(main(args))
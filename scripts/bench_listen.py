@@ -0,0 +1,125 @@
+#!/home/ls4/observer_venv/bin/python
+# -*- coding: utf-8 -*-
+#
+# @Filename: bench_listen.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Microbenchmark of the receive path for binary FETCH replies.
+#
+# A synthetic FETCH reply (n_blocks blocks of "<xx:" + 1024 bytes) is fed
+# to an asyncio.StreamReader, and then read back into a Numpy frame:
+#
+#   before: one readexactly(1024) per block, appended to the 4-byte prefix
+#           and copied into the reply bytearray, prefixes removed with
+#           bytes.replace() (as ArchonCommandReply does) and frombuffer.
+#
+#   after:  LS4Controller._listen, which reads the reply into the
+#           preallocated buffer in large chunks, and the prefix-free
+#           (n_blocks, 1024) view of the buffer.
+#
+# usage: bench_listen.py [--mbytes 64] [--repeat 5] [--chunk 65536]
+#
+################################
+
+import argparse
+import asyncio
+import time
+import types
+
+import numpy
+
+from archon.controller.ls4_controller import LS4Controller
+from archon.controller.ls4_frame_ring import LS4_Frame_Ring
+from archon.controller.ls4_params import LS4_BLOCK_SIZE
+
+BLOCK = LS4_BLOCK_SIZE + 4
+
+
+def make_reply(n_blocks):
+    """ return a binary FETCH reply with n_blocks blocks for command id 0x01 """
+
+    data = numpy.random.randint(0, 65535, size=n_blocks * LS4_BLOCK_SIZE // 2,
+                                dtype=numpy.uint16)
+    blocks = numpy.empty((n_blocks, BLOCK), dtype=numpy.uint8)
+    blocks[:, 0:4] = numpy.frombuffer(b"<01:", dtype=numpy.uint8)
+    blocks[:, 4:] = data.view(numpy.uint8).reshape(n_blocks, LS4_BLOCK_SIZE)
+    return blocks.tobytes(), data
+
+
+def make_reader(reply, chunk):
+    """ return a StreamReader holding the reply, fed in chunks of the given size """
+
+    reader = asyncio.StreamReader(limit=2**30)
+    for i in range(0, len(reply), chunk):
+        reader.feed_data(reply[i : i + chunk])
+    reader.feed_eof()
+    return reader
+
+
+async def before(reply, chunk, n_bytes):
+
+    reader = make_reader(reply, chunk)
+    binary_reply = bytearray(len(reply))
+    n_binary = 0
+
+    t_start = time.perf_counter()
+    while n_binary < len(binary_reply):
+        line = await reader.readexactly(4)
+        line += await reader.readexactly(1024)
+        binary_reply[n_binary : n_binary + 1028] = line
+        n_binary += 1028
+    raw = bytes(binary_reply).replace(b"<01:", b"")
+    arr = numpy.frombuffer(raw[0:n_bytes], dtype="<u2")
+    return time.perf_counter() - t_start, arr
+
+
+async def after(reply, chunk, n_bytes):
+
+    reader = make_reader(reply, chunk)
+
+    # only the attributes used by _listen are needed
+    controller = LS4Controller.__new__(LS4Controller)
+    controller._client = types.SimpleNamespace(reader=reader)
+    controller._binary_notify_at = 0
+    controller._binary_event = asyncio.Event()
+    controller.warn = print
+    controller.frame_ring = LS4_Frame_Ring()
+    controller.route_reply = lambda line: None
+    controller.set_binary_reply_size(len(reply))
+    payload = controller._binary_payload
+
+    t_start = time.perf_counter()
+    await controller._listen()
+    arr = payload.reshape(-1)[0:n_bytes].view("<u2")
+    return time.perf_counter() - t_start, arr
+
+
+async def main(args):
+
+    n_blocks = int(args.mbytes * 2**20) // LS4_BLOCK_SIZE
+    n_bytes = n_blocks * LS4_BLOCK_SIZE
+    reply, data = make_reply(n_blocks)
+
+    print("reply: %d blocks, %7.1f MB of pixel data, stream chunks of %d bytes" %
+          (n_blocks, n_bytes / 2**20, args.chunk))
+
+    for label, func in [("before", before), ("after", after)]:
+        rates = []
+        for __ in range(args.repeat):
+            dt, arr = await func(reply, args.chunk, n_bytes)
+            assert numpy.array_equal(arr, data), "%s: pixel data mismatch" % label
+            rates.append(n_bytes / 2**20 / dt)
+        print("%-6s  best %8.1f MB/s  median %8.1f MB/s" %
+              (label, max(rates), float(numpy.median(rates))))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="benchmark binary FETCH reply parsing")
+    parser.add_argument("--mbytes", type=float, default=64.0,
+                        help="size of the pixel data in MB")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of repetitions of each path")
+    parser.add_argument("--chunk", type=int, default=65536,
+                        help="size of the chunks fed to the stream reader")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,188 @@
+#!/home/ls4/observer_venv/bin/python
+# -*- coding: utf-8 -*-
+#
+# @Filename: bench_reply_demux.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Microbenchmark of the routing of replies to their commands, over a stream of
+# replies recorded from the simulated Archon of ls4_archon_sim.py: a burst of
+# WCONFIG, FASTLOADPARAM, STATUS, FRAME and SYSTEM commands, and a FETCH whose
+# binary blocks are split as _listen splits them when no binary buffer is set.
+#
+#   before: notify() schedules a process_message task for each reply, which
+#           matches the reply header with a regular expression, and the
+#           command parses the reply again (ArchonCommandReply).
+#
+#   after:  LS4Controller.route_reply, called by _listen for each reply, which
+#           reads the header byte by byte (parse_reply_header) and passes it on
+#           to the command with the reply.
+#
+# With --record, the reply stream is saved to a file, and with --replay, a
+# saved stream is used instead of the simulator.
+#
+# usage: bench_reply_demux.py [--repeat 5] [--record file | --replay file]
+#
+################################
+
+import argparse
+import asyncio
+import inspect
+import pickle
+import re
+import time
+from collections import Counter
+
+import numpy
+
+from archon.controller.command import ArchonCommand
+from archon.controller.ls4_archon_sim import LS4_Archon_Sim
+from archon.controller.ls4_controller import LS4Controller
+from archon.controller.ls4_logger import LS4_Logger
+
+FETCH_BLOCKS = 256
+
+
+def make_commands(n_wconfig=2000, n_params=200, n_queries=100):
+    """ return the command strings of the recorded burst """
+
+    commands = ["WCONFIG%04XMOD%d/PARAM%d=%d" % (n, n % 12 + 1, n, n) for n in range(n_wconfig)]
+    commands.append("APPLYALL")
+    commands += ["FASTLOADPARAM P%d %d" % (n % 10, n) for n in range(n_params)]
+    for n in range(n_queries):
+        commands += ["STATUS", "FRAME"]
+        if n % 10 == 0:
+            commands.append("SYSTEM")
+    commands.append("FETCH%08X%08X" % (0, FETCH_BLOCKS))
+    return commands
+
+
+async def record():
+    """ return the commands and the replies of a burst sent to the simulator """
+
+    ls4_logger = LS4_Logger(name="bench")
+    ls4_logger.set_level("WARN")
+    sim = LS4_Archon_Sim(rtt=0.0, service_time=0.0, ls4_logger=ls4_logger)
+    sim.config = {n: "PARAMETER%d=P%d=0" % (n, n) for n in range(10)}
+    await sim.start()
+    reader, writer = await asyncio.open_connection(sim.host, sim.port)
+
+    commands = make_commands()
+    replies = []
+    for n, command in enumerate(commands):
+        cid = n % 256
+        writer.write((">%02X%s\n" % (cid, command)).encode())
+        n_replies = FETCH_BLOCKS if command.startswith("FETCH") else 1
+        for __ in range(n_replies):
+            # split the stream as _listen does without a binary buffer
+            line = await reader.readexactly(4)
+            if line[-1] == ord(b":"):
+                line += await reader.readexactly(1024)
+            elif line[-1] != ord(b"\n"):
+                line += await reader.readuntil(b"\n")
+            replies.append(line)
+
+    writer.close()
+    await sim.stop()
+    return commands, replies
+
+
+def make_running(commands):
+    """ return a running command for each command of the burst, by id """
+
+    running = []
+    for n, command in enumerate(commands):
+        expected = FETCH_BLOCKS if command.startswith("FETCH") else 1
+        running.append(ArchonCommand(command, n % 256, expected_replies=expected))
+    return running
+
+
+async def before(commands, replies):
+
+    async def process_message(line):
+        match = re.match(b"^[<|?]([0-9A-F]{2})", line)
+        if match is None:
+            return
+        command_id = int(match[1], 16)
+        if command_id not in running_commands:
+            return
+        running_commands[command_id].process_reply(line)
+
+    running = make_running(commands)
+    index = 0
+
+    t_start = time.perf_counter()
+    for line in replies:
+        # the burst reuses command ids, so the commands are made current in turn
+        command_id = running[index].command_id
+        running_commands = {command_id: running[index]}
+        # notify() inspects the callback and schedules it as a task
+        inspect.getfullargspec(process_message)
+        await asyncio.create_task(process_message(line))
+        if running[index].done():
+            index += 1
+    dt = time.perf_counter() - t_start
+
+    assert all(command.succeeded() for command in running), "before: commands failed"
+    return dt
+
+
+async def after(commands, replies):
+
+    # only the attributes used by route_reply are needed
+    controller = LS4Controller.__new__(LS4Controller)
+    controller.reply_counts = Counter()
+    controller.invalid_replies = 0
+    controller.unmatched_replies = 0
+    controller.warn = print
+
+    running = make_running(commands)
+    index = 0
+
+    t_start = time.perf_counter()
+    for line in replies:
+        command_id = running[index].command_id
+        controller._LS4Controller__running_commands = {command_id: running[index]}
+        controller.route_reply(line)
+        if running[index].done():
+            index += 1
+    dt = time.perf_counter() - t_start
+
+    assert all(command.succeeded() for command in running), "after: commands failed"
+    assert sum(controller.reply_counts.values()) == len(replies)
+    return dt
+
+
+async def main(args):
+
+    if args.replay is not None:
+        with open(args.replay, "rb") as f:
+            commands, replies = pickle.load(f)
+    else:
+        commands, replies = await record()
+        if args.record is not None:
+            with open(args.record, "wb") as f:
+                pickle.dump((commands, replies), f)
+
+    n_binary = sum(1 for line in replies if line[3:4] == b":")
+    print("reply stream: %d commands, %d replies (%d binary), %7.1f kB" %
+          (len(commands), len(replies), n_binary, sum(len(line) for line in replies) / 1e3))
+
+    for label, func in [("before", before), ("after", after)]:
+        rates = []
+        for __ in range(args.repeat):
+            dt = await func(commands, replies)
+            rates.append(len(replies) / dt)
+        print("%-6s  best %10.0f replies/s  median %10.0f replies/s" %
+              (label, max(rates), float(numpy.median(rates))))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="benchmark the routing of replies")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of repetitions of each path")
+    parser.add_argument("--record", type=str, default=None,
+                        help="file to save the recorded reply stream")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="file of a saved reply stream to use")
+    asyncio.run(main(parser.parse_args()))
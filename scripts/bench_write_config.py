@@ -0,0 +1,92 @@
+#!/home/ls4/observer_venv/bin/python
+# -*- coding: utf-8 -*-
+#
+# @Filename: bench_write_config.py
+# @License: BSD 3-clause (http://www.opensource.org/licenses/BSD-3-Clause)
+#
+# Benchmark of LS4Controller.write_config: lines/sec for the serial upload
+# (window = 1) and the pipelined upload (window > 1) of an ACF file.
+#
+# The controller talks to the simulated Archon of ls4_archon_sim.py, which
+# processes commands one at a time, each taking --service_us microseconds,
+# and delays every reply by the round-trip time --rtt_ms, so pipelining gains
+# what it would on the real network. Every upload is a full one (CLEARCONFIG
+# and all lines), not a differential one.
+#
+# usage: bench_write_config.py [--acf file.acf] [--lines 4000] [--windows 1,8,32,64]
+#
+################################
+
+import argparse
+import asyncio
+import time
+
+from archon.controller.ls4_archon_sim import LS4_Archon_Sim
+from archon.controller.ls4_controller import LS4Controller
+from archon.controller.ls4_logger import LS4_Logger
+from archon.ls4.ls4_sync import LS4_Sync
+
+
+def make_acf(n_lines):
+    """ return a synthetic ACF with n_lines configuration lines """
+
+    lines = ["[CONFIG]"]
+    for n in range(n_lines):
+        lines.append("MOD%d\\PARAM%d=%d" % (n % 12 + 1, n, n))
+    return "\n".join(lines) + "\n"
+
+
+async def main(args):
+
+    service = args.service_us * 1e-6
+    rtt = args.rtt_ms * 1e-3
+
+    ls4_logger = LS4_Logger(name="bench")
+    ls4_logger.set_level("WARN")
+
+    sim = LS4_Archon_Sim(rtt=rtt, service_time=service, ls4_logger=ls4_logger)
+    await sim.start()
+
+    if args.acf is not None:
+        acf = args.acf
+        n_lines = sum(1 for line in open(acf) if "=" in line)
+    else:
+        acf = make_acf(args.lines)
+        n_lines = args.lines
+
+    ls4_sync = LS4_Sync(num_synced_controllers=1, lead_index=0, ls4_logger=ls4_logger)
+    controller = LS4Controller(name="bench", host=sim.host, port=sim.port,
+                               local_addr=("127.0.0.1", 0),
+                               param_args=ls4_sync.param_args,
+                               command_args=ls4_sync.command_args,
+                               ls4_events=ls4_sync.ls4_events,
+                               ls4_logger=ls4_logger)
+    await controller.start(reset=False, read_acf=False)
+
+    print("ACF lines: %d  service time: %7.1f us  rtt: %7.3f ms" %
+          (n_lines, args.service_us, args.rtt_ms))
+
+    for window in [int(w) for w in args.windows.split(",")]:
+        t_start = time.perf_counter()
+        await controller.write_config(input=acf, window=window, differential=False)
+        dt = time.perf_counter() - t_start
+        print("window %4d  %8.3f sec  %10.1f lines/sec" % (window, dt, n_lines / dt))
+
+    await controller.stop()
+    await sim.stop()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="benchmark ACF upload with write_config")
+    parser.add_argument("--acf", type=str, default=None,
+                        help="ACF file to upload (default: synthetic file)")
+    parser.add_argument("--lines", type=int, default=4000,
+                        help="number of lines of the synthetic ACF")
+    parser.add_argument("--windows", type=str, default="1,8,32,64",
+                        help="comma-separated list of upload windows")
+    parser.add_argument("--service_us", type=float, default=20.0,
+                        help="time for the controller to process one command (usec)")
+    parser.add_argument("--rtt_ms", type=float, default=0.2,
+                        help="network round-trip time (msec)")
+    asyncio.run(main(parser.parse_args()))
@@ -213,6 +213,32 @@ def subtract_row_bias(data=None,pre_x=0,post_x=0,pre_y=0,post_y=0,amp_name=None)
 
     return data1,avg,rms
 
+# keywords describing the data of an image extension, not copied to the
+# header of the mosaic
+EXTENSION_KEYS = ['XTENSION','BITPIX','NAXIS','NAXIS1','NAXIS2','PCOUNT','GCOUNT',
+                  'BSCALE','BZERO','EXTNAME']
+
+def amp_hdus(hdu_list):
+  """ return the indices of the amp images in hdu_list: the image extensions of a
+      multi-extension file (fits_mode controller or exposure), or else the
+      primary HDU (one file per amp)
+  """
+  if len(hdu_list) == 1:
+     return [0]
+  return [i for i in range(1,len(hdu_list)) if hdu_list[i].data is not None]
+
+def amp_header(hdu_list,index):
+  """ return the header of amp image index of hdu_list, including the keywords of
+      the primary header of a multi-extension file
+  """
+  if index == 0:
+     return hdu_list[0].header
+  im_head = hdu_list[0].header.copy()
+  for card in hdu_list[index].header.cards:
+     if card.keyword not in EXTENSION_KEYS:
+        im_head[card.keyword] = card.value
+  return im_head
+
 def assemble_mosaic(conf=None):
   im_list = conf['images']
   im_list_dark = None
@@ -229,9 +255,9 @@ def assemble_mosaic(conf=None):
 
   im = im_list[0]
   hdu_list = fits.open(im)
-  im_head = hdu_list[0].header
-  width=im_head['NAXIS1']
-  height=im_head['NAXIS2']
+  shape = (hdu_list[amp_hdus(hdu_list)[0]].data).shape
+  height=shape[0]
+  width=shape[1]
   prescan_x = 6
   postscan_x = width - prescan_x - 1024
   prescan_y = 0
@@ -241,16 +267,22 @@ def assemble_mosaic(conf=None):
 
   mos_data=np.zeros(shape=[ccds_per_col*height,ccds_per_row*amps_per_ccd*width],dtype=np.ushort)
 
-  shape = (hdu_list[0].data).shape
   im_index = 0
   bias_prev = None
   rms_prev = None
 
   for im in im_list:
-     hdu_list = fits.open(im,mode='update')
-     im_data_raw = hdu_list[0].data
+   hdu_list = fits.open(im,mode='update')
+   dark_hdu_list = None
+   if im_list_dark is not None:
+      im_dark = im_list_dark[im_index]
+      dark_hdu_list = fits.open(im_dark)
+      im_index += 1
+
+   for hdu_index in amp_hdus(hdu_list):
+     im_data_raw = hdu_list[hdu_index].data
      im_dark_data_raw = None
-     im_head = hdu_list[0].header
+     im_head = amp_header(hdu_list,hdu_index)
      assert im_data_raw.shape == shape,\
              "image %s has shape(%s) inconsitent with first image(%s)" %\
                    (im,im_data_raw.shape,shape)
@@ -263,14 +295,11 @@ def assemble_mosaic(conf=None):
      assert ccd_name in ccd_map.keys(),"ccd_name %s not in ccd_map" % ccd_name
      assert amp_name in ['LEFT','RIGHT'],"amp_name %s must be LEFT or RIGHT" % amp_name
 
-     if im_list_dark is not None:
-        im_dark = im_list_dark[im_index]
-        hdu_list = fits.open(im_dark)
-        im_dark_data_raw = hdu_list[0].data
+     if dark_hdu_list is not None:
+        im_dark_data_raw = dark_hdu_list[hdu_index].data
         assert im_dark_data_raw.shape == shape,\
              "dark image %s has shape(%s) inconsitent with first image(%s)" %\
                    (im_dark,im_dark_data_raw.shape,shape)
-        im_index += 1
 
      # flip meaning of Right and Left
      if amp_name == 'RIGHT':
@@ -328,6 +357,7 @@ def assemble_mosaic(conf=None):
            i1 = i + 1
            kw=header_kwds[index]+str(i1)
            im_head[kw]=wcs_val[index][i]
+           hdu_list[hdu_index].header[kw]=wcs_val[index][i]
 
 
      # fits has problem with comment keyword
@@ -339,8 +369,10 @@ def assemble_mosaic(conf=None):
      except Exception as e:
        print ("error fixing comment : %s" % e)
 
-     hdu_list.flush()
-     hdu_list.close()
+   hdu_list.flush()
+   hdu_list.close()
+   if dark_hdu_list is not None:
+      dark_hdu_list.close()
   write_fits(mos_data,im_head,conf['output'])
 
 def namelist(s):